@@ -1,5 +1,6 @@
 """Entry point for running the Regional Cohort Component Model."""
 
+import argparse
 import logging
 
 import python.utils as utils
@@ -10,37 +11,118 @@ from python.calculate_population import (
     calculate_population,
     integerize_population,
 )
+from python.checkpoint import (
+    get_etl_run_id,
+    is_rates_bundle_stored,
+    load_checkpoint,
+    load_final_checkpoint,
+    load_rates_bundle,
+    rates_bundle_path,
+    save_checkpoint,
+    save_etl_run,
+    save_rates_bundle,
+    wipe_checkpoints,
+)
 from python.etl import run_etl
 from python.input_modules.active_duty_military import get_active_duty_military
-from python.input_modules.base_yr import get_base_yr_2020
-from python.input_modules.birth_rates import get_birth_rates
+from python.input_modules.base_yr import get_base_yr, is_base_yr_stored
 from python.input_modules.death_rates import get_death_rates
-from python.input_modules.formation_rates import get_formation_rates
-from python.input_modules.hh_characteristics_rates import get_hh_characteristic_rates
 from python.input_modules.migration_rates import get_migration_rates
+from python.prefetch import prefetch_inputs
 
 logger = logging.getLogger(__name__)
 
 
-# Remove any existing output files from previous runs ------------------------
-utils.wipe_output_files()
+# Parse command line arguments -----------------------------------------------
+parser = argparse.ArgumentParser(description="Run the Regional Cohort Component Model.")
+parser.add_argument(
+    "--rebuild-base-year",
+    action="store_true",
+    help="rebuild the base year population instead of re-using the stored artifact",
+)
+parser.add_argument(
+    "--from-rates-bundle",
+    action="store_true",
+    help="start the annual cycle after the launch year from the stored rates bundle",
+)
+parser.add_argument(
+    "--resume-from",
+    type=int,
+    metavar="YEAR",
+    help="resume the annual cycle from the checkpoint of an increment year",
+)
+parser.add_argument(
+    "--extend",
+    action="store_true",
+    help="extend a completed run to the horizon year from its final checkpoint",
+)
+args = parser.parse_args()
+if sum([args.resume_from is not None, args.from_rates_bundle, args.extend]) > 1:
+    parser.error("--resume-from, --from-rates-bundle, and --extend cannot be combined")
+
+# Check the rates bundle exists before removing the outputs of previous runs
+if args.from_rates_bundle and not is_rates_bundle_stored():
+    parser.error(
+        "No rates bundle found for the launch year and inputs: "
+        + rates_bundle_path().name
+    )
+
+
+# Remove any existing output files and checkpoints from previous runs --------
+# Unless resuming or extending a previous run from a checkpoint
+if args.resume_from is None and not args.extend:
+    utils.wipe_output_files()
+    wipe_checkpoints()
+
+
+if args.resume_from is not None:
+    # Resume from the checkpoint of an increment year ------------------------
+    # The state entering the increment is restored and later outputs removed
+    pop_df, rates = load_checkpoint(yr=args.resume_from)
+    start_year = args.resume_from
 
+    # Prefetch inputs for the remaining increments up to the launch year
+    if start_year <= utils.LAUNCH_YEAR:
+        prefetched_rates = prefetch_inputs(
+            years=list(range(start_year, utils.LAUNCH_YEAR + 1)), base_yr=False
+        )
 
-# Initialize base year dataset -----------------------------------------------
-logger.info("Initializing base year")
+elif args.extend:
+    # Extend a completed run from its final checkpoint -----------------------
+    # New increments are appended to the outputs of the completed run
+    start_year, pop_df, rates = load_final_checkpoint()
+
+elif args.from_rates_bundle:
+    # Start after the launch year from the rates bundle ----------------------
+    # The launch year state, rates, and pre-launch outputs are restored
+    pop_df, rates = load_rates_bundle()
+    start_year = utils.LAUNCH_YEAR + 1
 
-# For launch years >= 2020 use the blended 2020 base year approach ----
-if utils.BASE_YEAR == 2020:
-    pop_df = get_base_yr_2020()
 else:
-    raise ValueError("Base years besides 2020 are not available.")
+    # Prefetch inputs not dependent on the projected population -------------
+    # Rates and queries from the base year up to the launch year run concurrently
+    # Base year queries are skipped if the stored base year is re-used
+    prefetched_rates = prefetch_inputs(
+        years=list(range(utils.BASE_YEAR, utils.LAUNCH_YEAR + 1)),
+        base_yr=args.rebuild_base_year or not is_base_yr_stored(),
+    )
+
+    # Initialize base year dataset -------------------------------------------
+    # Re-use the stored base year for the launch year vintage unless rebuilding
+    logger.info("Initializing base year")
+    pop_df = get_base_yr(rebuild=args.rebuild_base_year)
+    rates = {}
+    start_year = utils.BASE_YEAR
 
 
 # Begin Annual Cycle ---------------------------------------------------------
-# Loop increment years from base year to horizon year
-for increment in range(utils.BASE_YEAR, utils.HORIZON_YEAR + 1):
+# Loop increment years from the start year to horizon year
+for increment in range(start_year, utils.HORIZON_YEAR + 1):
     logger.info("Starting Increment: " + str(increment))
 
+    # Checkpoint the state entering the increment ----
+    save_checkpoint(yr=increment, pop_df=pop_df, rates=rates)
+
     # Break out active-duty military population from total population ----
     pop_df = get_active_duty_military(yr=increment, pop_df=pop_df)
 
@@ -48,17 +130,24 @@ for increment in range(utils.BASE_YEAR, utils.HORIZON_YEAR + 1):
     if increment <= utils.LAUNCH_YEAR:
         rates = {
             # Crude Birth Rates
-            "births": get_birth_rates(yr=increment),
+            "births": prefetched_rates[increment]["births"],
             # Crude Death Rates
-            "deaths": get_death_rates(yr=increment, pop_df=pop_df),
+            # Prefetched unless requiring the projected population
+            "deaths": (
+                prefetched_rates[increment]["deaths"]
+                if "deaths" in prefetched_rates[increment]
+                else get_death_rates(yr=increment, pop_df=pop_df)
+            ),
             # Crude Migration Rates
             "migration": get_migration_rates(yr=increment, pop_df=pop_df),
             # Crude Group Quarters and Household Formation Rates
-            "formation_gq_hh": get_formation_rates(yr=increment),
+            "formation_gq_hh": prefetched_rates[increment]["formation_gq_hh"],
             # Household Characteristics Rates
-            "hh_characteristics": get_hh_characteristic_rates(yr=increment),
+            "hh_characteristics": prefetched_rates[increment]["hh_characteristics"],
         }
 
+    # Held launch year migration rates are solved to the migration controls
+    # Within the annual cycle if provided
     else:
         if utils.MIGRATION_CONTROLS is not None:
             rates["migration"] = get_migration_rates(yr=increment, pop_df=pop_df)
@@ -75,12 +164,16 @@ for increment in range(utils.BASE_YEAR, utils.HORIZON_YEAR + 1):
     pop_df = pop_df.sort_values(by=["race", "sex", "age"]).reset_index(drop=True)
     pop_df = integerize_population(pop_df=pop_df)
 
-    # Write out calculated households/population and rates ----
+    # Write out calculated households/population ----
     utils.write_df(yr=increment, df=pop_df, fp=utils.OUTPUT_FOLDER / "population.csv")
-    utils.write_rates(yr=increment, rates=rates, fp=utils.OUTPUT_FOLDER / "rates.csv")
 
     # Calculate Components of Change and create new population ----
-    increment_data = increment_population(pop_df=pop_df, rates=rates)
+    # Migration rates are solved to the migration controls if provided
+    increment_data = increment_population(pop_df=pop_df, rates=rates, yr=increment)
+    rates["migration"] = increment_data["migration"]
+
+    # Write out rates ----
+    utils.write_rates(yr=increment, rates=rates, fp=utils.OUTPUT_FOLDER / "rates.csv")
 
     # Write out components of change ----
     utils.write_df(
@@ -91,8 +184,22 @@ for increment in range(utils.BASE_YEAR, utils.HORIZON_YEAR + 1):
 
     # Set population for next increment and finish annual cycle ----
     pop_df = increment_data["population"].copy()  # type: ignore
+
+    # Save the launch year state and rates as a rates bundle ----
+    if increment == utils.LAUNCH_YEAR:
+        save_rates_bundle(pop_df=pop_df, rates=rates)
+# Checkpoint the final state so the run can be extended to a later horizon ----
+save_checkpoint(yr=utils.HORIZON_YEAR + 1, pop_df=pop_df, rates=rates)
 logger.info("Completed")
 
 if utils.LOAD_TO_DATABASE:
     # Run the ETL process
-    run_etl()
+    # When extending, only the new increments are added to the loaded run
+    etl_run_id = get_etl_run_id() if args.extend else None
+    if args.extend and etl_run_id is None:
+        logger.warning("Completed run was not loaded to database, loading all years")
+    save_etl_run(
+        run_id=run_etl(
+            run_id=etl_run_id, first_year=start_year if args.extend else None
+        )
+    )
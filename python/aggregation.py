@@ -0,0 +1,205 @@
+"""Streaming summaries of Monte Carlo replicates with bounded memory."""
+
+import numpy as np
+
+# Quantiles estimated for each cell of the summary tables
+QUANTILES = [0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95]
+
+
+class P2Quantiles:
+    """Streaming quantile estimates using the P-Square algorithm.
+
+    The P-Square algorithm (Jain and Chlamtac, 1985) estimates a quantile
+    from a stream of observations without storing them, keeping five markers
+    whose heights approximate the minimum, the quantile, the maximum, and the
+    quantiles halfway in between. Marker heights are adjusted with a
+    piecewise-parabolic formula as observations arrive. Markers are held as
+    arrays such that the quantiles of many cells are updated at once, using
+    memory proportional to the number of cells and quantiles only.
+
+    Attributes:
+        probs (np.ndarray): Quantile probabilities of shape (quantile,)
+        size (int): Number of cells of each observation
+        count (int): Number of observations received
+
+    Methods:
+        update(x): Update the markers with an observation of each cell
+        result(): Get the quantile estimates of each cell
+    """
+
+    def __init__(self, probs: list[float], size: int) -> None:
+        """Initialize the markers for quantile probabilities and cells."""
+        self.probs = np.asarray(probs, dtype=float)
+        self.size = size
+        self.count = 0
+
+        # Marker heights and positions of shape (quantile, cell, marker)
+        # Set from the first five observations
+        self._initial = []
+        self._heights = None
+        self._positions = None
+
+        # Desired marker positions and their increments of shape
+        # (quantile, 1, marker), which are the same for all cells
+        p = self.probs[:, np.newaxis, np.newaxis]
+        self._desired = np.concatenate(
+            [np.zeros_like(p), 2 * p, 4 * p, 2 + 2 * p, np.full_like(p, 4)], axis=2
+        )
+        self._increments = np.concatenate(
+            [np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)], axis=2
+        )
+
+    def update(self, x: np.ndarray) -> None:
+        """Update the markers with an observation of each cell.
+
+        Args:
+            x (np.ndarray): Observation of each cell of shape (cell,)
+        """
+        x = np.asarray(x, dtype=float).reshape(-1)
+        self.count += 1
+
+        # Initialize the markers with the sorted first five observations
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                heights = np.sort(np.stack(self._initial, axis=1), axis=1)
+                self._heights = np.repeat(heights[np.newaxis], len(self.probs), axis=0)
+                self._positions = np.broadcast_to(
+                    np.arange(5, dtype=float), self._heights.shape
+                ).copy()
+                self._initial = []
+            return
+
+        q, n = self._heights, self._positions
+        x = np.broadcast_to(x, q.shape[:2])
+
+        # Extend the extreme markers and find the cell of the observation
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        k = (x[..., np.newaxis] >= q[..., 1:4]).sum(axis=2)
+
+        # Increment the positions of markers above the observation
+        n += np.arange(5) > k[..., np.newaxis]
+        self._desired = self._desired + self._increments
+
+        # Adjust the heights of the middle markers if off their desired position
+        for i in [1, 2, 3]:
+            d = self._desired[..., i] - n[..., i]
+            move = ((d >= 1) & (n[..., i + 1] - n[..., i] > 1)) | (
+                (d <= -1) & (n[..., i - 1] - n[..., i] < -1)
+            )
+            if not move.any():
+                continue
+            s = np.sign(d)
+
+            # Piecewise-parabolic prediction of the marker height
+            parabolic = q[..., i] + s / (n[..., i + 1] - n[..., i - 1]) * (
+                (n[..., i] - n[..., i - 1] + s)
+                * (q[..., i + 1] - q[..., i])
+                / (n[..., i + 1] - n[..., i])
+                + (n[..., i + 1] - n[..., i] - s)
+                * (q[..., i] - q[..., i - 1])
+                / (n[..., i] - n[..., i - 1])
+            )
+
+            # Linear prediction used where the parabolic prediction is not
+            # Between the heights of the adjacent markers
+            q_adjacent = np.where(s > 0, q[..., i + 1], q[..., i - 1])
+            n_adjacent = np.where(s > 0, n[..., i + 1], n[..., i - 1])
+            linear = q[..., i] + s * (q_adjacent - q[..., i]) / (n_adjacent - n[..., i])
+
+            q[..., i] = np.where(
+                move,
+                np.where(
+                    (q[..., i - 1] < parabolic) & (parabolic < q[..., i + 1]),
+                    parabolic,
+                    linear,
+                ),
+                q[..., i],
+            )
+            n[..., i] += np.where(move, s, 0)
+
+    def result(self) -> np.ndarray:
+        """Get the quantile estimates of each cell.
+
+        Returns:
+            np.ndarray: Quantile estimates of shape (quantile, cell), calculated
+                exactly from the observations if fewer than five were received
+
+        Raises:
+            ValueError: If no observations were received
+        """
+        if self.count == 0:
+            raise ValueError("No observations received")
+        if self._heights is None:
+            return np.quantile(np.stack(self._initial), self.probs, axis=0)
+
+        return self._heights[..., 2].copy()
+
+
+class StreamingSummary:
+    """Running summaries of the cells of batches of replicates.
+
+    Keeps the running mean and variance of each cell, merging batches using
+    the parallel algorithm of Chan, Golub, and LeVeque, and P-Square quantile
+    estimates of each cell (see P2Quantiles). Memory used depends on the
+    number of cells and quantiles only and not on the number of replicates.
+
+    Attributes:
+        shape (tuple[int, ...]): Shape of the cells of a replicate
+        count (int): Number of replicates received
+
+    Methods:
+        update(batch): Update the summaries with a batch of replicates
+        mean(): Get the mean of each cell
+        std(): Get the sample standard deviation of each cell
+        quantiles(): Get the quantile estimates of each cell
+    """
+
+    def __init__(
+        self, shape: tuple[int, ...], quantiles: list[float] = QUANTILES
+    ) -> None:
+        """Initialize the summaries for the shape of the cells of a replicate."""
+        self.shape = tuple(shape)
+        self.count = 0
+
+        size = int(np.prod(self.shape))
+        self._mean = np.zeros(size)
+        self._m2 = np.zeros(size)
+        self._quantiles = P2Quantiles(probs=quantiles, size=size)
+
+    def update(self, batch: np.ndarray) -> None:
+        """Update the summaries with a batch of replicates.
+
+        Args:
+            batch (np.ndarray): Replicates of shape (replicate, *shape)
+        """
+        batch = np.asarray(batch, dtype=float).reshape(batch.shape[0], -1)
+        n = batch.shape[0]
+
+        # Merge the mean and sum of squared differences of the batch
+        mean = batch.mean(axis=0)
+        m2 = ((batch - mean) ** 2).sum(axis=0)
+        delta = mean - self._mean
+        total = self.count + n
+        self._mean += delta * n / total
+        self._m2 += m2 + delta**2 * self.count * n / total
+        self.count = total
+
+        if len(self._quantiles.probs) > 0:
+            for x in batch:
+                self._quantiles.update(x)
+
+    def mean(self) -> np.ndarray:
+        """Get the mean of each cell."""
+        return self._mean.reshape(self.shape)
+
+    def std(self) -> np.ndarray:
+        """Get the sample standard deviation of each cell, NaN for a single
+        replicate."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(self._m2 / (self.count - 1)).reshape(self.shape)
+
+    def quantiles(self) -> np.ndarray:
+        """Get the quantile estimates of each cell of shape (quantile, *shape)."""
+        return self._quantiles.result().reshape(-1, *self.shape)
@@ -1,12 +1,13 @@
 """Methods to increment through the annual cycle."""
 
-# TODO: (10-feature) Add function to allow for control totals at each increment for in/out migration.
-
 import numpy as np
 import pandas as pd
 
 import python.utils as utils
 
+from python.cohort_engine import CohortGrid
+from python.input_modules.migration_rates import solve_migration_rates
+
 generator = np.random.default_rng(utils.RANDOM_SEED)
 
 
@@ -109,7 +110,9 @@ def calculate_deaths(pop_df: pd.DataFrame, rate: pd.DataFrame) -> pd.DataFrame:
     return df[["race", "sex", "age", "deaths"]]
 
 
-def calculate_migration(pop_df: pd.DataFrame, rate: pd.DataFrame) -> pd.DataFrame:
+def calculate_migration(
+    pop_df: pd.DataFrame, rate: pd.DataFrame, controls: dict | None = None
+) -> pd.DataFrame:
     """Calculate migration by race, sex, and single year of age.
 
     Migration rates are applied to the survived civilian population. Note that
@@ -123,6 +126,9 @@ def calculate_migration(pop_df: pd.DataFrame, rate: pd.DataFrame) -> pd.DataFram
             the total population and calculated deaths
         rate (pd.DataFrame): Migration rates by race, sex, and single year of
             age
+        controls (dict | None): Control totals used to integerize the ins and
+            outs, preserving the sum of the rounded values where None.
+            Defaults to None
 
     Returns:
         pd.DataFrame: In/Out Migration by race, sex, and single year of age
@@ -152,9 +158,14 @@ def calculate_migration(pop_df: pd.DataFrame, rate: pd.DataFrame) -> pd.DataFram
         .reset_index(drop=True)
     )
 
-    # TODO: Consider controlling to migration controls here if provided for almost perfect match
-    df["ins"] = utils.integerize_1d(data=df["ins"], control=None, generator=generator)
-    df["outs"] = utils.integerize_1d(data=df["outs"], control=None, generator=generator)
+    # Integerize to the migration controls if provided
+    controls = {"ins": None, "outs": None} if controls is None else controls
+    df["ins"] = utils.integerize_1d(
+        data=df["ins"], control=controls["ins"], generator=generator
+    )
+    df["outs"] = utils.integerize_1d(
+        data=df["outs"], control=controls["outs"], generator=generator
+    )
 
     # Ensure Outs <= Survived Population after Integerization
     df["outs"] = utils.reallocate_integers(df=df, subset="outs", total="pop_civ_surv")
@@ -197,7 +208,170 @@ def create_newborns(pop_df: pd.DataFrame, male_pct: float) -> pd.DataFrame:
     return df[["race", "sex", "age", "pop"]]
 
 
-def increment_population(pop_df: pd.DataFrame, rates: dict,) -> dict[str, pd.DataFrame]:
+def _control_migration(
+    yr: int | None, pop_df: pd.DataFrame, rates: dict
+) -> tuple[pd.DataFrame, dict]:
+    """Solve migration rates against the survived civilian population if
+    migration controls are provided for the increment year.
+
+    Returns the migration rates to apply and the control totals used to
+    integerize the ins and outs, which are None if the increment year is not
+    controlled or the control total cannot be reached.
+    """
+    if (
+        yr is None
+        or utils.MIGRATION_CONTROLS is None
+        or yr not in utils.MIGRATION_CONTROLS.index
+    ):
+        return rates["migration"], {"ins": None, "outs": None}
+
+    migration, report = solve_migration_rates(
+        yr=yr, pop_df=pop_df, rates=rates["migration"]
+    )
+
+    return migration, {
+        k: round(row["control"]) if row["converged"] else None
+        for k, row in report.iterrows()
+    }
+
+
+def _reallocate(subset: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """Reallocate integers of a grid array such that it does not exceed a total.
+
+    Arrays are flattened in race, sex, and age order before reallocation to
+    match the record order used by the DataFrame based annual cycle.
+    """
+    return utils.reallocate_integers_1d(
+        subset=subset.reshape(-1), total=total.reshape(-1)
+    ).reshape(subset.shape)
+
+
+def increment_population_array(
+    pop_df: pd.DataFrame, rates: dict, male_pct: float = 0.512, yr: int | None = None
+) -> dict[str, pd.DataFrame]:
+    """Calculate components of change and create input population for next
+    increment using dense race, sex, and single year of age arrays.
+
+    The population, military population, and component rates are reshaped
+    onto a CohortGrid and aging, survival, births, migration, and the military
+    age shift are applied as array operations. Integerization is applied to
+    arrays flattened in race, sex, and age order in the same sequence as the
+    DataFrame based methods, so for a given random state the results match
+    those of the calculate_deaths, calculate_births, calculate_migration, and
+    create_newborns methods.
+
+    Args:
+        pop_df (pd.DataFrame): Population data broken down by race, sex, and
+            single year of age with the military population broken out from
+            the total population
+        rates (dict): Dictionary containing death, birth, and migration rates
+            by race, sex, and single year of age
+        male_pct (float): Percentage of newborns assign to male sex
+        yr (int | None): Increment year. If migration controls are provided
+            for the year, migration rates are solved against the survived
+            civilian population (see solve_migration_rates). Defaults to None
+
+    Returns:
+        dict[str, pd.DataFrame]: Dictionary with three DataFrame elements. The
+        first containing the components of change for the current population.
+        The second containing the input population for the next increment.
+        The third containing the migration rates applied.
+    """
+    grid = CohortGrid.from_df(pop_df)
+    pop = grid.to_array(pop_df, "pop")
+    pop_mil = grid.to_array(pop_df, "pop_mil")
+
+    # The survived civilian population ages +1 (capped at the maximum age)
+    # Before applying birth and migration rates
+    age_next = np.minimum(grid.ages + 1, grid.ages[-1])
+
+    # Calculate Deaths applying Death Rates to the Non-Military Population
+    # Ensure Deaths <= Non-Military Population after Integerization
+    pop_civ = pop - pop_mil
+    deaths = np.round(pop_civ * grid.to_array(rates["deaths"], "rate_death"))
+    deaths = utils.integerize_1d(
+        data=deaths.reshape(-1), control=None, generator=generator
+    ).reshape(grid.shape)
+    deaths = _reallocate(subset=deaths, total=pop_civ)
+
+    # Calculate Births applying Birth Rates to the Survived Population
+    # Ensure Births <= Survived Population after Integerization
+    pop_civ_surv = pop - pop_mil - deaths
+    rate_birth = grid.to_array(rates["births"], "rate_birth")
+    births = np.round(pop_mil * rate_birth + pop_civ_surv * rate_birth[..., age_next])
+    births = np.nan_to_num(births, nan=0)
+    births = utils.integerize_1d(
+        data=births.reshape(-1), control=None, generator=generator
+    ).reshape(grid.shape)
+    births = _reallocate(subset=births, total=pop - deaths)
+
+    # Solve Migration Rates against the Survived Civilian Population if controlled
+    migration, controls = _control_migration(
+        yr=yr,
+        pop_df=grid.to_df({"pop": pop, "pop_mil": pop_mil, "deaths": deaths}),
+        rates=rates,
+    )
+
+    # Calculate Migration applying Migration Rates to the Survived Civilian Population
+    # Ensure Outs <= Survived Civilian Population after Integerization
+    ins = np.round(pop_civ_surv * grid.to_array(migration, "rate_in")[..., age_next])
+    outs = np.round(pop_civ_surv * grid.to_array(migration, "rate_out")[..., age_next])
+    ins = utils.integerize_1d(
+        data=ins.reshape(-1), control=controls["ins"], generator=generator
+    ).reshape(grid.shape)
+    outs = utils.integerize_1d(
+        data=outs.reshape(-1), control=controls["outs"], generator=generator
+    ).reshape(grid.shape)
+    outs = _reallocate(subset=outs, total=pop_civ_surv)
+
+    # Calculate the newborn population for the next increment
+    births_race = births.sum(axis=(1, 2))[:, np.newaxis]
+    newborns = np.where(
+        grid.sexes == "M",
+        np.round(births_race * male_pct),
+        np.round(births_race * (1 - male_pct)),
+    )
+    newborns = utils.integerize_1d(
+        data=newborns.reshape(-1), control=None, generator=generator
+    ).reshape(newborns.shape)
+
+    # Create the incremented population
+    # Calculate total population and increment age
+    pop_aged = np.zeros(shape=grid.shape, dtype=pop.dtype)
+    pop_aged[..., 1:] = (pop - deaths + ins - outs)[..., :-1]
+    pop_aged[..., -1] += (pop - deaths + ins - outs)[..., -1]
+    pop_mil_aged = np.zeros(shape=grid.shape, dtype=pop_mil.dtype)
+    pop_mil_aged[..., 1:] = pop_mil[..., :-1]
+    pop_mil_aged[..., -1] += pop_mil[..., -1]
+
+    # Shift the Military Population back in age increment
+    # The Military Population is held constant
+    # Records are shifted in race, sex, and age order excluding age 0
+    pop_mil_shift = np.append(pop_mil_aged[..., 1:].reshape(-1)[1:], 0)
+    pop_mil_aged[..., 1:] = pop_mil_shift.reshape(pop_mil_aged[..., 1:].shape)
+
+    # Ensure the Military Population is not greater than the Population
+    pop_mil_aged[..., 1:] = _reallocate(
+        subset=pop_mil_aged[..., 1:], total=pop_aged[..., 1:]
+    )
+
+    # Add the newborns into the dataset setting their Military Population to 0
+    pop_aged[..., 0] = newborns
+    pop_mil_aged[..., 0] = 0
+
+    # Return the Components of Change and the incremented Population
+    return {
+        "components": grid.to_df(
+            {"deaths": deaths, "births": births, "ins": ins, "outs": outs}
+        ),
+        "population": grid.to_df({"pop": pop_aged, "pop_mil": pop_mil_aged}),
+        "migration": migration,
+    }
+
+
+def increment_population(
+    pop_df: pd.DataFrame, rates: dict, engine: str = "array", yr: int | None = None
+) -> dict[str, pd.DataFrame]:
     """Calculate components of change and create input population for next
     increment.
 
@@ -207,12 +381,24 @@ def increment_population(pop_df: pd.DataFrame, rates: dict,) -> dict[str, pd.Dat
             the total population
         rates (dict): Dictionary containing death, birth, and migration rates
             by race, sex, and single year of age
+        engine (str): Set to 'array' to use the dense array methods of
+            increment_population_array or 'pandas' to use the DataFrame
+            methods. Both produce the same results. Defaults to 'array'.
+        yr (int | None): Increment year. If migration controls are provided
+            for the year, migration rates are solved against the survived
+            civilian population (see solve_migration_rates). Defaults to None
 
     Returns:
-        dict[str, pd.DataFrame]: Dictionary with two DataFrame elements. The
+        dict[str, pd.DataFrame]: Dictionary with three DataFrame elements. The
         first containing the components of change for the current population.
         The second containing the input population for the next increment.
+        The third containing the migration rates applied.
     """
+    if engine == "array":
+        return increment_population_array(pop_df=pop_df, rates=rates, yr=yr)
+    elif engine != "pandas":
+        raise ValueError("Parameter 'engine': must be one of 'array' or 'pandas'.")
+
     # Calculate Components of Change; Deaths, Births, and Migration
     pop_df = pop_df.merge(
         right=calculate_deaths(pop_df, rate=rates["deaths"]),
@@ -226,8 +412,11 @@ def increment_population(pop_df: pd.DataFrame, rates: dict,) -> dict[str, pd.Dat
         on=["race", "sex", "age"],
     )
 
+    # Solve Migration Rates against the Survived Civilian Population if controlled
+    migration, controls = _control_migration(yr=yr, pop_df=pop_df, rates=rates)
+
     pop_df = pop_df.merge(
-        right=calculate_migration(pop_df=pop_df, rate=rates["migration"]),
+        right=calculate_migration(pop_df=pop_df, rate=migration, controls=controls),
         how="left",
         on=["race", "sex", "age"],
     )
@@ -263,4 +452,121 @@ def increment_population(pop_df: pd.DataFrame, rates: dict,) -> dict[str, pd.Dat
     return {
         "components": pop_df[["race", "sex", "age", "deaths", "births", "ins", "outs"]],
         "population": pop_inc[["race", "sex", "age", "pop", "pop_mil"]],
+        "migration": migration,
+    }
+
+
+def increment_replicates(
+    grid: CohortGrid,
+    pop: np.ndarray,
+    pop_mil: np.ndarray,
+    rates: dict[str, np.ndarray],
+    generator: np.random.Generator,
+    male_pct: float = 0.512,
+) -> dict[str, np.ndarray]:
+    """Calculate stochastic components of change and create input population
+    for next increment for a batch of Monte Carlo replicates.
+
+    Follows the dense array methods of increment_population_array, replacing
+    rounding and integerization with random draws for every replicate at
+    once. Deaths are binomial draws from the non-military population, births
+    are Poisson draws from the expected births of the survived population,
+    ins are Poisson draws and outs binomial draws from the survived civilian
+    population, and newborns are split by sex with binomial draws. Migration
+    rates are applied as provided, so migration controls are only met in
+    expectation.
+
+    Args:
+        grid (CohortGrid): Race, sex, and single year of age grid
+        pop (np.ndarray): Integer population of shape (replicate, race, sex,
+            age)
+        pop_mil (np.ndarray): Integer military population of shape
+            (replicate, race, sex, age)
+        rates (dict[str, np.ndarray]): Death ("rate_death"), birth
+            ("rate_birth"), in-migration ("rate_in"), and out-migration
+            ("rate_out") rates of shape (race, sex, age)
+        generator (np.random.Generator): A seeded random generator used for
+            the draws of the batch
+        male_pct (float): Percentage of newborns assign to male sex
+
+    Returns:
+        dict[str, np.ndarray]: Components of change ("deaths", "births",
+            "ins", "outs") and the input population ("pop") and military
+            population ("pop_mil") for the next increment, each of shape
+            (replicate, race, sex, age)
+    """
+    # The survived civilian population ages +1 (capped at the maximum age)
+    # Before applying birth and migration rates
+    age_next = np.minimum(grid.ages + 1, grid.ages[-1])
+
+    # Draw Deaths from the Non-Military Population
+    pop_civ = pop - pop_mil
+    deaths = generator.binomial(pop_civ, np.clip(rates["rate_death"], 0, 1))
+
+    # Draw Births from the expected Births of the Survived Population
+    # Ensure Births <= Survived Population
+    pop_civ_surv = pop_civ - deaths
+    births = np.nan_to_num(
+        pop_mil * rates["rate_birth"]
+        + pop_civ_surv * rates["rate_birth"][..., age_next],
+        nan=0,
+    )
+    births = generator.poisson(births)
+    births = np.minimum(births, pop - deaths)
+
+    # Draw Migration from the Survived Civilian Population
+    # Outs are binomial draws so Outs <= Survived Civilian Population
+    ins = generator.poisson(pop_civ_surv * rates["rate_in"][..., age_next])
+    outs = generator.binomial(
+        pop_civ_surv, np.clip(rates["rate_out"][..., age_next], 0, 1)
+    )
+
+    # Split the newborn population for the next increment by sex
+    births_race = births.sum(axis=(2, 3))
+    births_male = generator.binomial(births_race, male_pct)
+    newborns = np.where(
+        grid.sexes == "M",
+        births_male[..., np.newaxis],
+        (births_race - births_male)[..., np.newaxis],
+    )
+
+    # Create the incremented population
+    # Calculate total population and increment age
+    pop_net = pop - deaths + ins - outs
+    pop_aged = np.zeros(shape=pop.shape, dtype=pop.dtype)
+    pop_aged[..., 1:] = pop_net[..., :-1]
+    pop_aged[..., -1] += pop_net[..., -1]
+    pop_mil_aged = np.zeros(shape=pop_mil.shape, dtype=pop_mil.dtype)
+    pop_mil_aged[..., 1:] = pop_mil[..., :-1]
+    pop_mil_aged[..., -1] += pop_mil[..., -1]
+
+    # Shift the Military Population back in age increment
+    # The Military Population is held constant
+    # Records are shifted in race, sex, and age order excluding age 0
+    n = pop.shape[0]
+    pop_mil_shift = np.append(
+        pop_mil_aged[..., 1:].reshape(n, -1)[:, 1:], np.zeros((n, 1), int), axis=1
+    )
+    pop_mil_aged[..., 1:] = pop_mil_shift.reshape(pop_mil_aged[..., 1:].shape)
+
+    # Ensure the Military Population is not greater than the Population
+    # Only replicates where the Military Population exceeds the Population
+    for i in np.flatnonzero(
+        (pop_mil_aged[..., 1:] > pop_aged[..., 1:]).any(axis=(1, 2, 3))
+    ):
+        pop_mil_aged[i, ..., 1:] = _reallocate(
+            subset=pop_mil_aged[i, ..., 1:], total=pop_aged[i, ..., 1:]
+        )
+
+    # Add the newborns into the dataset setting their Military Population to 0
+    pop_aged[..., 0] = newborns
+    pop_mil_aged[..., 0] = 0
+
+    return {
+        "deaths": deaths,
+        "births": births,
+        "ins": ins,
+        "outs": outs,
+        "pop": pop_aged,
+        "pop_mil": pop_mil_aged,
     }
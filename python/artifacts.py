@@ -0,0 +1,87 @@
+"""Store and re-use model artifacts keyed by the inputs they depend on."""
+
+import datetime
+import hashlib
+import json
+import logging
+import pathlib
+from typing import Callable
+
+import pandas as pd
+
+import python.utils as utils
+
+logger = logging.getLogger(__name__)
+
+# Artifacts are stored next to the model outputs
+ARTIFACT_FOLDER = utils.OUTPUT_FOLDER / "artifacts"
+
+
+def fingerprint(metadata: dict) -> str:
+    """Get a hash of the metadata describing the inputs of an artifact.
+
+    Args:
+        metadata (dict): JSON serializable description of the inputs an
+            artifact depends on (e.g. launch year and source fingerprints)
+
+    Returns:
+        str: SHA-256 hex digest of the metadata
+    """
+    return hashlib.sha256(
+        json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def artifact_path(name: str, metadata: dict) -> pathlib.Path:
+    """Get the Parquet file of an artifact, named with its fingerprint."""
+    return ARTIFACT_FOLDER / (name + "_" + fingerprint(metadata)[:16] + ".parquet")
+
+
+def load_or_build(
+    name: str,
+    metadata: dict,
+    build: Callable[[], pd.DataFrame],
+    rebuild: bool = False,
+) -> pd.DataFrame:
+    """Load an artifact if stored for the same inputs, otherwise build it.
+
+    Artifacts are stored as Parquet files in the artifact folder alongside a
+    JSON file of their metadata, where the file names contain the fingerprint
+    of the metadata. An artifact is therefore only re-used when all the
+    inputs described by its metadata match.
+
+    Args:
+        name (str): Name of the artifact
+        metadata (dict): JSON serializable description of the inputs the
+            artifact depends on
+        build (Callable[[], pd.DataFrame]): Function building the artifact
+        rebuild (bool): If True, build and overwrite a stored artifact.
+            Defaults to False
+
+    Returns:
+        pd.DataFrame: The artifact
+    """
+    fp = artifact_path(name, metadata)
+
+    if fp.is_file() and not rebuild:
+        logger.info(f"Using stored {name} artifact: {fp.name}")
+        return pd.read_parquet(fp)
+
+    df = build()
+
+    ARTIFACT_FOLDER.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(fp, index=False)
+    with open(fp.with_suffix(".json"), "w") as file:
+        json.dump(
+            {
+                **metadata,
+                "fingerprint": fingerprint(metadata),
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            },
+            file,
+            indent=2,
+            default=str,
+        )
+    logger.info(f"Stored {name} artifact: {fp.name}")
+
+    return df
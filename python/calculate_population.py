@@ -30,6 +30,16 @@ FIELD_MAP = {
     "HH Workers 3+": {"col": "workers3", "control": "workers3", "group": "households"},
 }
 
+# Groupings of HH fields with complete coverage of total households
+# Such that their summation must match the total households
+HH_FIELD_GROUPS = {
+    "HH Size": {"cols": ["size1", "size2", "size3"], "total": "hh"},
+    "HH Workers": {
+        "cols": ["workers0", "workers1", "workers2", "workers3"],
+        "total": "hh",
+    },
+}
+
 
 def apply_controls(yr: int, pop_df: pd.DataFrame) -> pd.DataFrame:
     """Control the calculated population, group quarters, households, and
@@ -163,30 +173,154 @@ def calculate_population(
     ]
 
 
+def get_constraints() -> list[dict]:
+    """Build the integerization constraint hierarchy from the FIELD_MAP and
+    the HH_FIELD_GROUPS.
+
+    Each constraint contains the columns it applies to, the total constraining
+    the columns, and whether the columns must not exceed ("exceeds") or sum to
+    ("equals") the total within each record. Totals are a list of columns
+    where the first column is reduced by any subsequent columns (e.g. the
+    total ["pop", "hh"] is the total population less the total households).
+    Constraints are ordered such that totals are integerized before the
+    columns they constrain and columns sharing a total are grouped together.
+
+    Returns:
+        list[dict]: Constraints in integerization order
+    """
+    # The totals (pop, hh) are the first members of their groups in FIELD_MAP
+    totals = {}
+    for k, v in FIELD_MAP.items():
+        totals.setdefault(v["group"], v["col"])
+    grouped = [col for v in HH_FIELD_GROUPS.values() for col in v["cols"]]
+
+    # The total population is the root of the hierarchy
+    # Total households may not exceed the total population
+    constraints = [
+        {"cols": [totals["population"]], "total": None, "option": None},
+        {
+            "cols": [totals["households"]],
+            "total": [totals["population"]],
+            "option": "exceeds",
+        },
+    ]
+
+    for k, v in FIELD_MAP.items():
+        if v["col"] in totals.values() or v["col"] in grouped:
+            continue
+        # Although not identified as related in the field mapping
+        # Do not allow GQs + HHs > Total Population
+        elif v["col"] == "gq":
+            total = [totals["population"], totals["households"]]
+        else:
+            total = [totals[v["group"]]]
+
+        # Group columns sharing the same total
+        for constraint in constraints:
+            if constraint["total"] == total and constraint["option"] == "exceeds":
+                constraint["cols"].append(v["col"])
+                break
+        else:
+            constraints.append(
+                {"cols": [v["col"]], "total": total, "option": "exceeds"}
+            )
+
+    # Groupings of HH fields must match the total households
+    for k, v in HH_FIELD_GROUPS.items():
+        constraints.append(
+            {"cols": v["cols"], "total": [v["total"]], "option": "equals"}
+        )
+
+    return constraints
+
+
+def integerize_population_joint(pop_df: pd.DataFrame) -> pd.DataFrame:
+    """Integerize the calculated population, group quarters, households, and
+    household characteristics totals such that all constraints of the
+    constraint hierarchy are met in a single pass.
+
+    Following the constraint hierarchy from get_constraints, the total
+    population is integerized preserving its sum. Columns that may not exceed
+    a total are integerized using utils.integerize_capped_2d against the
+    (already integer) total, so rounding up cannot breach the total.
+    Groupings of HH fields are fit to the total households and integerized
+    using the controlled rounding of utils.integerize_group_2d, keeping both
+    the total households of each record and the sum of each field. No
+    reallocation passes are required.
+
+    Args:
+        pop_df (pd.DataFrame): Household/Population data by race, sex, and
+            single year of age, output from the calculate_population method
+
+    Returns:
+        pd.DataFrame: The integerized calculated population
+    """
+    for constraint in get_constraints():
+        cols = constraint["cols"]
+        values = pop_df[cols].to_numpy(dtype=np.float64)
+
+        # Integerize the root of the hierarchy preserving sum
+        if constraint["total"] is None:
+            pop_df[cols] = utils.integerize_2d(data=values, generator=generator)
+            continue
+
+        total = pop_df[constraint["total"][0]].to_numpy()
+        for col in constraint["total"][1:]:
+            total = total - pop_df[col].to_numpy()
+
+        # Integerize preserving sum without exceeding the total
+        if constraint["option"] == "exceeds":
+            pop_df[cols] = utils.integerize_capped_2d(
+                values=values, cap=total, generator=generator
+            )
+        # Fit and integerize the group such that its sum matches the total
+        elif constraint["option"] == "equals":
+            pop_df[cols] = utils.integerize_group_2d(
+                values=values, total=total, generator=generator
+            )
+
+    return pop_df
+
+
 def integerize_population(
     pop_df: pd.DataFrame,
+    method: str = "joint",
+    legacy: bool = False,
 ) -> pd.DataFrame:
     """Integerize the calculated population, group quarters, households, and
     household characteristics totals for each increment from the base year up
     to the horizon year.
 
-    Note that after integerization, fields are reallocated, preserving the
-    integer data type and sum, such that all constraints are respected.
+    By default the joint method of integerize_population_joint is used. With
+    the sequential method, fields are integerized and then reallocated,
+    preserving the integer data type and sum, such that all constraints are
+    respected.
 
     Args:
         pop_df (pd.DataFrame): Household/Population data by race, sex, and
             single year of age, output from the calculate_population method
+        method (str): Set to 'joint' or 'sequential'. Defaults to 'joint'
+        legacy (bool): If True, and using the sequential method, integerize
+            each field in turn reproducing the results of per-field
+            integerization. Defaults to False
 
     Returns:
         pd.DataFrame: The integerized calculated population
     """
-    for k, v in FIELD_MAP.items():
-        # Round fields to integer preserving sum
-        if pop_df[v["col"]].dtype.kind != "i":
-            pop_df[v["col"]] = utils.integerize_1d(
-                data=pop_df[v["col"]], control=None, generator=generator
-            )
+    if method == "joint":
+        return integerize_population_joint(pop_df=pop_df)
+    elif method != "sequential":
+        raise ValueError("Parameter 'method': must be one of 'joint' or 'sequential'.")
 
+    # Round fields to integer preserving sum in a single batched call
+    cols = [v["col"] for v in FIELD_MAP.values()]
+    cols = [col for col in cols if pop_df[col].dtype.kind != "i"]
+    if len(cols) > 0:
+        pop_df[cols] = utils.integerize_2d(
+            data=pop_df[cols], control=None, generator=generator, legacy=legacy
+        )
+
+    for k, v in FIELD_MAP.items():
         # Reallocate integers if values exceed totals
         if v["group"] == "households":
             # For total households the total population is the maximum
@@ -219,15 +353,7 @@ def integerize_population(
 
     # Adjust groupings of HH fields with complete coverage of total households
     # Such that their summation matches the total households
-    hh_field_groups = {
-        "HH Size": {"cols": ["size1", "size2", "size3"], "total": "hh"},
-        "HH Workers": {
-            "cols": ["workers0", "workers1", "workers2", "workers3"],
-            "total": "hh",
-        },
-    }
-
-    for k, v in hh_field_groups.items():
+    for k, v in HH_FIELD_GROUPS.items():
         pop_df[v["cols"]] = utils.reallocate_group_integers(
             df=pop_df, cols=v["cols"], total=v["total"]
         )
@@ -0,0 +1,531 @@
+"""Save and restore the state of the annual cycle."""
+
+import datetime
+import hashlib
+import json
+import logging
+import pathlib
+import shutil
+
+import pandas as pd
+
+import python.annual_cycle as annual_cycle
+import python.artifacts as artifacts
+import python.calculate_population as calculate_population
+import python.utils as utils
+
+from python.input_modules.migration_rates import (
+    get_launch_year_rates,
+    hold_launch_year_rates,
+)
+
+logger = logging.getLogger(__name__)
+
+# Version of the stored state format
+# Increment when the contents of saved states change to invalidate them
+STATE_VERSION = 1
+
+# Model output files carried by the rates bundle
+OUTPUT_FILES = ["population.csv", "components.csv", "rates.csv"]
+
+# Checkpoints of each increment are stored next to the model outputs
+CHECKPOINT_FOLDER = utils.OUTPUT_FOLDER / "checkpoints"
+
+# Database run the checkpointed outputs were loaded to
+ETL_RUN_FILE = CHECKPOINT_FOLDER / "etl_run.json"
+
+
+def get_rng_states() -> dict:
+    """Get the states of the module-level random generators.
+
+    Returns:
+        dict: Bit generator states of the annual cycle and population
+            calculation random generators
+    """
+    return {
+        "annual_cycle": annual_cycle.generator.bit_generator.state,
+        "calculate_population": calculate_population.generator.bit_generator.state,
+    }
+
+
+def set_rng_states(states: dict) -> None:
+    """Set the states of the module-level random generators.
+
+    Args:
+        states (dict): Bit generator states as returned by get_rng_states
+    """
+    annual_cycle.generator.bit_generator.state = states["annual_cycle"]
+    calculate_population.generator.bit_generator.state = states["calculate_population"]
+
+
+def save_state(
+    folder: pathlib.Path,
+    frames: dict[str, pd.DataFrame],
+    manifest: dict,
+    files: list[pathlib.Path] | None = None,
+) -> None:
+    """Save a state of the annual cycle to a folder.
+
+    Each DataFrame is stored as a Parquet file and described, along with any
+    copied files, in a JSON manifest file such that the state is
+    self-describing.
+
+    Args:
+        folder (pathlib.Path): Folder to save the state to, replacing any
+            existing state
+        frames (dict[str, pd.DataFrame]): DataFrames of the state by name
+        manifest (dict): JSON serializable description of the state
+        files (list[pathlib.Path] | None): Files copied into the state folder.
+            Defaults to None
+    """
+    files = [] if files is None else files
+
+    # Write to a temporary folder first so an interrupted save never leaves
+    # A partial state in place of a complete one
+    tmp = folder.with_name(folder.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    for name, df in frames.items():
+        df.to_parquet(tmp / (name + ".parquet"), index=False)
+    for fp in files:
+        shutil.copyfile(fp, tmp / fp.name)
+
+    with open(tmp / "manifest.json", "w") as file:
+        json.dump(
+            {
+                **manifest,
+                "state_version": STATE_VERSION,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "frames": list(frames),
+                "files": [fp.name for fp in files],
+            },
+            file,
+            indent=2,
+            default=str,
+        )
+
+    shutil.rmtree(folder, ignore_errors=True)
+    tmp.rename(folder)
+
+
+def load_state(folder: pathlib.Path) -> tuple[dict[str, pd.DataFrame], dict]:
+    """Load a state of the annual cycle saved by save_state.
+
+    Args:
+        folder (pathlib.Path): Folder the state was saved to
+
+    Returns:
+        tuple[dict[str, pd.DataFrame], dict]: DataFrames of the state by name
+            and the manifest describing the state
+
+    Raises:
+        FileNotFoundError: If no state is saved to the folder
+        ValueError: If the state was saved with a different state version
+    """
+    if not (folder / "manifest.json").is_file():
+        raise FileNotFoundError(f"No saved state found: {folder}")
+
+    with open(folder / "manifest.json", "r") as file:
+        manifest = json.load(file)
+    if manifest["state_version"] != STATE_VERSION:
+        raise ValueError(
+            f"Saved state version {manifest['state_version']} does not match "
+            f"the current state version {STATE_VERSION}: {folder}"
+        )
+
+    frames = {
+        name: pd.read_parquet(folder / (name + ".parquet"))
+        for name in manifest["frames"]
+    }
+
+    return frames, manifest
+
+
+def _file_fingerprint(fp: pathlib.Path) -> str:
+    """Get a SHA-256 hex digest of the contents of a file."""
+    with open(fp, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def get_rates_bundle_metadata() -> dict:
+    """Get the metadata describing the inputs of the pre-launch phase.
+
+    The base year up to the launch year depends on the model version, the
+    base and launch years, the random seed, the SANDAG Estimates controls of
+    the launch year vintage, the SQL files, and the local data files, but not
+    on the horizon year or the post-launch migration controls.
+
+    Returns:
+        dict: Metadata describing the inputs of the pre-launch phase
+    """
+    return {
+        "artifact": "rates_bundle",
+        "version": utils.VERSION,
+        "base_year": utils.BASE_YEAR,
+        "launch_year": utils.LAUNCH_YEAR,
+        "random_seed": utils.RANDOM_SEED,
+        "controls": utils.CONTROLS[str(utils.LAUNCH_YEAR)],
+        "sources": {
+            fp.relative_to(utils.SQL_FOLDER).as_posix(): utils.query_fingerprint(
+                fp.relative_to(utils.SQL_FOLDER).as_posix()
+            )
+            for fp in sorted(utils.SQL_FOLDER.rglob("*.sql"))
+            if "db_build" not in fp.parts
+        },
+        "data": {
+            fp.name: _file_fingerprint(fp)
+            for fp in sorted(utils.DATA_FOLDER.glob("*.csv"))
+        },
+    }
+
+
+def get_run_metadata(yr: int) -> dict:
+    """Get the metadata describing the inputs of the annual cycle before an
+    increment year.
+
+    Extends the inputs of the pre-launch phase with the migration controls of
+    the post-launch increments prior to the increment year, such that a
+    matching fingerprint guarantees continuing the annual cycle from the
+    increment year gives the same outputs as an uninterrupted run. Missing
+    migration controls and no controls prior to the increment year are
+    described identically.
+
+    Args:
+        yr (int): Increment year
+
+    Returns:
+        dict: Metadata describing the inputs of the annual cycle before the
+            increment year
+    """
+    migration_controls = {}
+    if utils.MIGRATION_CONTROLS is not None:
+        migration_controls = {
+            str(year): [float(row["ins"]), float(row["outs"])]
+            for year, row in utils.MIGRATION_CONTROLS.iterrows()
+            if utils.LAUNCH_YEAR < year < yr
+        }
+
+    return {
+        **get_rates_bundle_metadata(),
+        "artifact": "run",
+        "migration_controls": migration_controls,
+    }
+
+
+def rates_bundle_path() -> pathlib.Path:
+    """Get the folder of the rates bundle for the current inputs."""
+    return artifacts.ARTIFACT_FOLDER / (
+        "rates_bundle_"
+        + str(utils.LAUNCH_YEAR)
+        + "_"
+        + artifacts.fingerprint(get_rates_bundle_metadata())[:16]
+    )
+
+
+def is_rates_bundle_stored() -> bool:
+    """Check if the rates bundle is stored for the current inputs."""
+    return (rates_bundle_path() / "manifest.json").is_file()
+
+
+def save_rates_bundle(pop_df: pd.DataFrame, rates: dict) -> pathlib.Path:
+    """Save the launch year state of the annual cycle as a rates bundle.
+
+    The rates bundle holds the population entering the first post-launch
+    increment, the launch year rates, the states of the random generators,
+    and the model outputs from the base year up to the launch year, such that
+    the annual cycle can start after the launch year without re-running the
+    pre-launch phase or accessing the SQL instance.
+
+    Args:
+        pop_df (pd.DataFrame): Population entering the first post-launch
+            increment broken down by race, sex, and single year of age
+        rates (dict): Dictionary containing the launch year rates by race,
+            sex, and single year of age
+
+    Returns:
+        pathlib.Path: Folder of the rates bundle
+    """
+    metadata = get_rates_bundle_metadata()
+    folder = rates_bundle_path()
+
+    save_state(
+        folder=folder,
+        frames={"population": pop_df, **{"rates_" + k: v for k, v in rates.items()}},
+        manifest={
+            **metadata,
+            "fingerprint": artifacts.fingerprint(metadata),
+            "next_year": utils.LAUNCH_YEAR + 1,
+            "rates": list(rates),
+            "rng_states": get_rng_states(),
+        },
+        files=[utils.OUTPUT_FOLDER / fp for fp in OUTPUT_FILES],
+    )
+    logger.info(f"Saved rates bundle: {folder.name}")
+
+    return folder
+
+
+def load_rates_bundle() -> tuple[pd.DataFrame, dict]:
+    """Start the annual cycle after the launch year from the rates bundle.
+
+    The rates bundle matching the current inputs is loaded, the random
+    generators and launch year migration rates are restored, and the model
+    outputs from the base year up to the launch year are copied into the
+    output folder.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: Population entering the first post-launch
+            increment and the launch year rates
+
+    Raises:
+        FileNotFoundError: If no rates bundle exists for the current inputs
+    """
+    folder = rates_bundle_path()
+    if not is_rates_bundle_stored():
+        raise FileNotFoundError(
+            "No rates bundle found for the launch year and inputs: " + folder.name
+        )
+    frames, manifest = load_state(folder)
+
+    rates = {k: frames["rates_" + k] for k in manifest["rates"]}
+    set_rng_states(manifest["rng_states"])
+    hold_launch_year_rates(rates["migration"])
+    for name in manifest["files"]:
+        shutil.copyfile(folder / name, utils.OUTPUT_FOLDER / name)
+    logger.info(f"Loaded rates bundle: {folder.name}")
+
+    return frames["population"], rates
+
+
+def checkpoint_path(yr: int) -> pathlib.Path:
+    """Get the folder of the checkpoint for an increment year."""
+    return CHECKPOINT_FOLDER / str(yr)
+
+
+def wipe_checkpoints() -> int:
+    """Delete the checkpoints of a previous run and return count deleted."""
+    deleted = 0
+    if CHECKPOINT_FOLDER.exists():
+        for folder in CHECKPOINT_FOLDER.iterdir():
+            if folder.is_dir():
+                shutil.rmtree(folder)
+                deleted += 1
+    ETL_RUN_FILE.unlink(missing_ok=True)
+
+    logger.info("Deleted %s checkpoint(s) from %s", deleted, CHECKPOINT_FOLDER)
+    return deleted
+
+
+def save_checkpoint(yr: int, pop_df: pd.DataFrame, rates: dict) -> pathlib.Path:
+    """Save the state of the annual cycle entering an increment year.
+
+    The checkpoint holds the population entering the increment, the rates of
+    the previous increment (carried forward past the launch year), the held
+    launch year migration rates, and the states of the random generators.
+
+    Args:
+        yr (int): Increment year
+        pop_df (pd.DataFrame): Population entering the increment broken down
+            by race, sex, and single year of age
+        rates (dict): Dictionary containing the rates of the previous
+            increment by race, sex, and single year of age
+
+    Returns:
+        pathlib.Path: Folder of the checkpoint
+    """
+    frames = {"population": pop_df, **{"rates_" + k: v for k, v in rates.items()}}
+    launch_year_rates = get_launch_year_rates()
+    if launch_year_rates is not None:
+        frames["launch_year_migration"] = launch_year_rates
+
+    folder = checkpoint_path(yr)
+    save_state(
+        folder=folder,
+        frames=frames,
+        manifest={
+            "artifact": "checkpoint",
+            "year": yr,
+            "fingerprint": artifacts.fingerprint(get_rates_bundle_metadata()),
+            "config_fingerprint": artifacts.fingerprint(get_run_metadata(yr)),
+            "horizon_year": utils.HORIZON_YEAR,
+            "rates": list(rates),
+            "rng_states": get_rng_states(),
+        },
+    )
+    logger.debug(f"Saved checkpoint: {yr}")
+
+    return folder
+
+
+def truncate_output_files(yr: int) -> None:
+    """Remove the records of an increment year and later from the model output
+    files, keeping the remaining records unchanged."""
+    for name in OUTPUT_FILES:
+        fp = utils.OUTPUT_FOLDER / name
+        if fp.is_file():
+            with open(fp, "r") as file:
+                lines = file.readlines()
+            with open(fp, "w") as file:
+                file.writelines(
+                    lines[:1] + [x for x in lines[1:] if int(x.split(",")[0]) < yr]
+                )
+
+
+def _restore_checkpoint(
+    yr: int, frames: dict[str, pd.DataFrame], manifest: dict
+) -> tuple[pd.DataFrame, dict]:
+    """Restore the state of the annual cycle from a loaded checkpoint."""
+    rates = {k: frames["rates_" + k] for k in manifest["rates"]}
+    set_rng_states(manifest["rng_states"])
+    if "launch_year_migration" in frames:
+        hold_launch_year_rates(frames["launch_year_migration"])
+    truncate_output_files(yr)
+
+    return frames["population"], rates
+
+
+def load_checkpoint(yr: int) -> tuple[pd.DataFrame, dict]:
+    """Resume the annual cycle from the checkpoint of an increment year.
+
+    The random generators and held launch year migration rates are restored
+    and the records of the increment year and later are removed from the
+    model output files, such that continuing the annual cycle gives outputs
+    identical to an uninterrupted run.
+
+    Args:
+        yr (int): Increment year to resume from
+
+    Returns:
+        tuple[pd.DataFrame, dict]: Population entering the increment and the
+            rates of the previous increment
+
+    Raises:
+        FileNotFoundError: If no checkpoint exists for the increment year
+        ValueError: If the checkpoint was saved with different inputs from
+            the base year up to the launch year
+    """
+    frames, manifest = load_state(checkpoint_path(yr))
+    if manifest["fingerprint"] != artifacts.fingerprint(get_rates_bundle_metadata()):
+        raise ValueError(
+            f"Checkpoint {yr} was saved with different inputs from the base year "
+            "up to the launch year"
+        )
+
+    pop_df, rates = _restore_checkpoint(yr=yr, frames=frames, manifest=manifest)
+
+    # Outputs from the increment year on are re-projected, so no longer match
+    # Those loaded to the database
+    ETL_RUN_FILE.unlink(missing_ok=True)
+    logger.info(f"Resuming from checkpoint: {yr}")
+
+    return pop_df, rates
+
+
+def load_final_checkpoint() -> tuple[int, pd.DataFrame, dict]:
+    """Extend a completed run to the horizon year from its final checkpoint.
+
+    The latest checkpoint must have been saved after the horizon year
+    increment of a completed run and with the same inputs as the current
+    configuration, except for the horizon year and the migration controls of
+    the new increments. The random generators and held launch year migration
+    rates are restored, such that the new increments are appended to the
+    model output files as if the completed run had the later horizon year.
+
+    Returns:
+        tuple[int, pd.DataFrame, dict]: First new increment year, the
+            population entering the increment, and the rates of the previous
+            increment
+
+    Raises:
+        FileNotFoundError: If no checkpoints exist
+        ValueError: If the latest checkpoint is not the end of a completed
+            run, the horizon year is not later than the completed run, or the
+            checkpoint was saved with different inputs
+    """
+    years = []
+    if CHECKPOINT_FOLDER.exists():
+        years = sorted(
+            int(folder.name)
+            for folder in CHECKPOINT_FOLDER.iterdir()
+            if folder.name.isdigit() and (folder / "manifest.json").is_file()
+        )
+    if len(years) == 0:
+        raise FileNotFoundError(f"No checkpoints found: {CHECKPOINT_FOLDER}")
+
+    yr = years[-1]
+    frames, manifest = load_state(checkpoint_path(yr))
+    if yr != manifest["horizon_year"] + 1:
+        raise ValueError(
+            f"Checkpoint {yr} is not the end of a completed run with horizon year "
+            f"{manifest['horizon_year']}, resume the run from the checkpoint instead"
+        )
+    if utils.HORIZON_YEAR < yr:
+        raise ValueError(
+            f"Horizon year {utils.HORIZON_YEAR} must be later than the horizon "
+            f"year {manifest['horizon_year']} of the completed run"
+        )
+    if manifest.get("config_fingerprint") != artifacts.fingerprint(
+        get_run_metadata(yr)
+    ):
+        raise ValueError(
+            f"Checkpoint {yr} was saved with a different configuration than the "
+            "current configuration up to the completed horizon year"
+        )
+
+    pop_df, rates = _restore_checkpoint(yr=yr, frames=frames, manifest=manifest)
+    logger.info(f"Extending completed run from checkpoint: {yr}")
+
+    return yr, pop_df, rates
+
+
+def load_completed_run() -> tuple[pd.DataFrame, dict[int, dict]]:
+    """Load the post-launch inputs of the completed run from its checkpoints.
+
+    The final checkpoint must have been saved after the horizon year
+    increment with the same configuration as the current configuration.
+
+    Returns:
+        tuple[pd.DataFrame, dict[int, dict]]: Population entering the first
+            post-launch increment and the rates applied in each post-launch
+            increment year
+
+    Raises:
+        FileNotFoundError: If a checkpoint of the completed run is missing
+        ValueError: If the final checkpoint was saved with a different
+            configuration
+    """
+    yr = utils.HORIZON_YEAR + 1
+    _, manifest = load_state(checkpoint_path(yr))
+    if manifest.get("config_fingerprint") != artifacts.fingerprint(
+        get_run_metadata(yr)
+    ):
+        raise ValueError(
+            f"Checkpoint {yr} was saved with a different configuration than the "
+            "current configuration"
+        )
+
+    pop_df = load_state(checkpoint_path(utils.LAUNCH_YEAR + 1))[0]["population"]
+
+    # Checkpoints hold the rates applied in the previous increment
+    rates = {}
+    for increment in range(utils.LAUNCH_YEAR + 1, yr):
+        frames, manifest = load_state(checkpoint_path(increment + 1))
+        rates[increment] = {k: frames["rates_" + k] for k in manifest["rates"]}
+
+    return pop_df, rates
+
+
+def save_etl_run(run_id: int) -> None:
+    """Record the database run the checkpointed outputs were loaded to."""
+    CHECKPOINT_FOLDER.mkdir(parents=True, exist_ok=True)
+    with open(ETL_RUN_FILE, "w") as file:
+        json.dump({"run_id": run_id, "horizon_year": utils.HORIZON_YEAR}, file)
+
+
+def get_etl_run_id() -> int | None:
+    """Get the database run the checkpointed outputs were loaded to, if any."""
+    if not ETL_RUN_FILE.is_file():
+        return None
+    with open(ETL_RUN_FILE, "r") as file:
+        return json.load(file)["run_id"]
@@ -0,0 +1,106 @@
+"""Dense array representation of the race, sex, and single year of age cohorts."""
+
+import numpy as np
+import pandas as pd
+
+
+class CohortGrid:
+    """A dense race by sex by single year of age grid.
+
+    Population, active-duty military population, and component rates are held
+    as NumPy arrays of shape (race, sex, age). Race and sex categories are
+    sorted and ages run from 0 to the maximum age, so flattening an array in
+    C-order matches a DataFrame sorted by race, sex, and age. This allows the
+    annual cycle to operate on arrays while DataFrames only appear at the
+    input and output edges.
+
+    Attributes:
+        races (np.ndarray): Sorted race categories
+        sexes (np.ndarray): Sorted sex categories
+        ages (np.ndarray): Single years of age from 0 to the maximum age
+        shape (tuple[int, int, int]): Shape of arrays held on the grid
+        index (pd.MultiIndex): Race, sex, and age index of the flattened grid
+
+    Methods:
+        from_df(df): Create the grid from the categories present in a DataFrame
+        to_array(df, col, fill_value): Reshape a DataFrame column onto the grid
+        to_df(arrays): Create a DataFrame from arrays held on the grid
+    """
+
+    def __init__(self, races: list[str], sexes: list[str], max_age: int) -> None:
+        """Initialize the grid from race and sex categories and a maximum age."""
+        self.races = np.sort(np.asarray(races))
+        self.sexes = np.sort(np.asarray(sexes))
+        self.ages = np.arange(max_age + 1)
+        self.shape = (len(self.races), len(self.sexes), len(self.ages))
+        self.index = pd.MultiIndex.from_product(
+            [self.races, self.sexes, self.ages], names=["race", "sex", "age"]
+        )
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame) -> "CohortGrid":
+        """Create the grid from the race, sex, and age records of a DataFrame.
+
+        Args:
+            df (pd.DataFrame): Data broken down by race, sex, and single year of
+                age containing every record of the grid exactly once
+
+        Returns:
+            CohortGrid: The grid covering the records of the DataFrame
+
+        Raises:
+            ValueError: If the DataFrame does not cover the complete grid
+        """
+        grid = cls(
+            races=df["race"].unique(),
+            sexes=df["sex"].unique(),
+            max_age=int(df["age"].max()),
+        )
+
+        if (
+            len(df.index) != len(grid.index)
+            or df.duplicated(subset=["race", "sex", "age"]).any()
+        ):
+            raise ValueError(
+                "Records must cover each race, sex, and single year of age exactly once"
+            )
+
+        return grid
+
+    def to_array(
+        self, df: pd.DataFrame, col: str, fill_value: float = np.nan
+    ) -> np.ndarray:
+        """Reshape a DataFrame column onto the grid.
+
+        Args:
+            df (pd.DataFrame): Data broken down by race, sex, and single year of
+                age
+            col (str): Column name to reshape
+            fill_value (float): Value for grid records missing from the
+                DataFrame. Defaults to np.nan, matching a left merge
+
+        Returns:
+            np.ndarray: Column values of shape (race, sex, age)
+        """
+        return (
+            df.set_index(["race", "sex", "age"])[col]
+            .reindex(self.index, fill_value=fill_value)
+            .to_numpy()
+            .reshape(self.shape)
+        )
+
+    def to_df(self, arrays: dict[str, np.ndarray]) -> pd.DataFrame:
+        """Create a DataFrame sorted by race, sex, and age from grid arrays.
+
+        Args:
+            arrays (dict[str, np.ndarray]): Column names and arrays of shape
+                (race, sex, age)
+
+        Returns:
+            pd.DataFrame: Data broken down by race, sex, and single year of age
+        """
+        df = self.index.to_frame(index=False)
+        for col, values in arrays.items():
+            df[col] = np.asarray(values).reshape(-1)
+
+        return df
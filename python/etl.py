@@ -22,9 +22,14 @@ def get_run_id() -> int:
         return result + 1 if result else 1
 
 
-def insert_csv(run_id: int, fp: pathlib.Path, tbl: str) -> None:
-    """Insert output csv files into database."""
+def insert_csv(
+    run_id: int, fp: pathlib.Path, tbl: str, first_year: int | None = None
+) -> None:
+    """Insert output csv files into database, optionally only the records of
+    a year and later."""
     df = pd.read_csv(fp)
+    if first_year is not None:
+        df = df[df["year"] >= first_year].copy()
     df["run_id"] = run_id
 
     with utils.SQL_ENGINE.connect() as connection:
@@ -62,24 +67,53 @@ def insert_metadata(run_id: int) -> None:
         )
 
 
-def run_etl() -> None:
-    """Runs the ETL process loading data into the database."""
+def extend_metadata(run_id: int) -> None:
+    """Updates the horizon of an existing run and flags it as being loaded."""
+    with utils.SQL_ENGINE.connect() as connection:
+        with connection.begin():
+            connection.execute(
+                sql.text(
+                    "UPDATE metadata.run SET loaded = 0, horizon = :horizon "
+                    "WHERE run_id = :run_id"
+                ),
+                {"horizon": utils.HORIZON_YEAR, "run_id": run_id},
+            )
 
-    # Load the configuration to get the launch and horizon values
 
-    run_id = get_run_id()
+def run_etl(run_id: int | None = None, first_year: int | None = None) -> int:
+    """Runs the ETL process loading data into the database.
 
-    logger.info("Loading output files to database as [run_id]: " + str(run_id))
-    insert_metadata(run_id=run_id)
+    Args:
+        run_id (int | None): Existing run to add the records of the first
+            year and later to, used when extending a completed run to a later
+            horizon year. Defaults to None, loading all records as a new run
+        first_year (int | None): First year loaded to the existing run.
+            Defaults to None
 
+    Returns:
+        int: The run the output files were loaded to
+    """
     output_files = {
         "components": utils.OUTPUT_FOLDER / "components.csv",
         "population": utils.OUTPUT_FOLDER / "population.csv",
         "rates": utils.OUTPUT_FOLDER / "rates.csv",
     }
 
+    if run_id is None:
+        run_id = get_run_id()
+        first_year = None
+
+        logger.info("Loading output files to database as [run_id]: " + str(run_id))
+        insert_metadata(run_id=run_id)
+    else:
+        logger.info(
+            f"Loading output files from {first_year} to database as existing "
+            f"[run_id]: {run_id}"
+        )
+        extend_metadata(run_id=run_id)
+
     for k, v in output_files.items():
-        insert_csv(run_id=run_id, fp=v, tbl=k)
+        insert_csv(run_id=run_id, fp=v, tbl=k, first_year=first_year)
 
     with utils.SQL_ENGINE.connect() as connection:
         with connection.begin():
@@ -88,3 +122,5 @@ def run_etl() -> None:
                 {"run_id": run_id},
             )
     logger.info("Output data loaded to database.")
+
+    return run_id
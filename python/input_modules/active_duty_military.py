@@ -1,19 +1,108 @@
 """Generate active-duty military population by race, sex, and single year of age."""
 
+import threading
+
 import pandas as pd
-import sqlalchemy as sql
 
 import python.utils as utils
 
+# Active-duty military control sources loaded once per model run
+_MILITARY_CONTROLS = {}
+_MILITARY_CONTROLS_LOCK = threading.Lock()
+
+
+def _validate_controls(
+    df: pd.DataFrame, index: list[str], value: str, name: str
+) -> pd.Series:
+    """Index a control source by its keys after checking keys are unique and
+    control totals are provided and non-negative."""
+    if df.duplicated(subset=index).any():
+        raise ValueError(f"Duplicate {tuple(index)} records found in {name}")
+    if df[value].isna().any() or (df[value] < 0).any():
+        raise ValueError(f"{name} '{value}' must be provided and >= 0")
+
+    return df.set_index(index)[value].sort_index()
+
+
+def load_military_controls(years: list[int]) -> dict[str, pd.Series]:
+    """Load the active-duty military control sources once per model run.
+
+    The DMDC Location Report active-duty total is indexed by year and the
+    SDMAC Report active-duty population by (report, year, site). For
+    increment years prior to 2018, the 5-year ACS PUMS active-duty military
+    population for the State of California (pums_ca_mil.sql) is indexed by
+    year. Each source is read once and held for the model run, and the
+    sources are validated up front for each increment year, such that the
+    active-duty military step of each increment is a lookup.
+
+    Args:
+        years (list[int]): Increment years up to the launch year
+
+    Returns:
+        dict[str, pd.Series]: Active-duty military control totals for the
+            DMDC Location Report ("dmdc"), SDMAC Report ("sdmac"), and ACS
+            PUMS State of California ("pums_ca_mil")
+
+    Raises:
+        ValueError: If a control source is invalid or missing an increment
+            year
+    """
+    with _MILITARY_CONTROLS_LOCK:
+        if "dmdc" not in _MILITARY_CONTROLS:
+            _MILITARY_CONTROLS["dmdc"] = _validate_controls(
+                df=pd.read_csv(utils.DATA_FOLDER / "DMDC Website Location Report.csv"),
+                index=["year"],
+                value="active duty - total",
+                name="DMDC Location Report",
+            )
+        if "sdmac" not in _MILITARY_CONTROLS:
+            _MILITARY_CONTROLS["sdmac"] = _validate_controls(
+                df=pd.read_csv(utils.DATA_FOLDER / "SDMAC Report.csv"),
+                index=["report", "year", "site"],
+                value="active duty",
+                name="SDMAC Report",
+            )
+
+        # The ACS PUMS State of California total is only used prior to 2018
+        dmdc_years = [yr for yr in years if 2010 <= yr < 2018]
+        if len(dmdc_years) > 0 and "pums_ca_mil" not in _MILITARY_CONTROLS:
+            _MILITARY_CONTROLS["pums_ca_mil"] = _validate_controls(
+                df=utils.read_sql_file("pums_ca_mil.sql"),
+                index=["year"],
+                value="pop_ca_mil",
+                name="ACS 5-year PUMS",
+            )
+
+        controls = dict(_MILITARY_CONTROLS)
+
+    # Validate the control sources cover each increment year
+    for yr in years:
+        if 2010 <= yr < 2018:
+            if yr not in controls["pums_ca_mil"].index:
+                raise ValueError("Increment year not in ACS 5-year PUMS")
+            if yr not in controls["dmdc"].index:
+                raise ValueError("Increment year not in DMDC Location Report")
+        elif 2018 <= yr:
+            if (yr, yr, "All") not in controls["sdmac"].index:
+                raise ValueError("Increment year not in SDMAC Report dataset")
+        else:
+            raise ValueError("Invalid increment year.")
+
+    return controls
+
 
 def get_active_duty_military(
     yr: int,
     pop_df: pd.DataFrame,
+    replicates: bool = False,
 ) -> pd.DataFrame:
     """Get active-duty military population broken down by race, sex, and
     single year of age for the increment year. Note the active duty military
     population remains unchanged past the launch year.
 
+    If replicates are requested, each ACS PUMS replicate weight (see
+    utils.read_pums_sql) is scaled by the same external control.
+
     Note: There is concern about the plausibility of race, sex, age
     categories where the entire population is classified as active-duty
     military. If this becomes an issue in need of correction there are two
@@ -26,87 +115,58 @@ def get_active_duty_military(
         yr: Increment year
         pop_df (pd.DataFrame): Population data broken down by race, sex, and
             single year of age
+        replicates (bool): If True, set the active-duty military population
+            for each ACS PUMS replicate weight. Defaults to False
 
     Returns:
         pd.DataFrame: The total population data with active-duty military
-            population total broken down by race, sex, and single year of age
+            population total broken down by race, sex, and single year of age,
+            and by replicate (0 being the person weight) if replicates are
+            requested
     """
+    # Active-duty military population is set within replicate if requested
+    keys = ["replicate", "race", "sex", "age"] if replicates else ["race", "sex", "age"]
+
     # Active-duty military population set and controlled up to the launch year
     if yr <= utils.LAUNCH_YEAR:
-        # Load SQL queries and apply checks to datasets
-        with utils.SQL_ENGINE.connect() as connection:
-            # Load ACS PUMS persons
-            with open(utils.SQL_FOLDER / "pums_persons.sql", "r") as file:
-                pums_persons_df = pd.read_sql_query(
-                    sql.text(file.read()), connection, params={"yr": yr}
-                )
+        # Load ACS PUMS persons and apply checks to dataset
+        pums_persons_df = utils.read_pums_sql(
+            "pums_persons.sql", yr=yr, replicates=replicates
+        )
         if len(pums_persons_df.index) == 0:
             raise ValueError(str(yr) + ": not in ACS 5-year PUMS")
 
         # Merge the population dataset with the 5-year ACS PUMS
         # For the increment year to add active-duty military population
-        df = (
-            pop_df[["race", "sex", "age", "pop"]]
-            .merge(
-                right=pums_persons_df[["race", "sex", "age", "pop_mil"]],
-                how="left",
-                on=["race", "sex", "age"],
-            )
-            .fillna(0)
-        )
+        df = pop_df[["race", "sex", "age", "pop"]]
+        if replicates:
+            df = utils.expand_replicates(df)
+        df = df.merge(
+            right=pums_persons_df[[*keys, "pop_mil"]],
+            how="left",
+            on=keys,
+        ).fillna(0)
 
         # Scale the active-duty ACS PUMS population by external control total
-        # If increment year is prior to 2018 use DMDC Location Report
-        if 2010 <= yr < 2018:
-            # Load SQL queries and apply checks to datasets
-            with utils.SQL_ENGINE.connect() as connection:
-                # Load ACS Active-duty military for CA
-                with open(utils.SQL_FOLDER / "pums_ca_mil.sql", "r") as query:
-                    pums_ca_mil_df = pd.read_sql_query(query.read(), connection)
-                    if yr not in pums_ca_mil_df["year"].unique():
-                        raise ValueError("Increment year not in ACS 5-year PUMS")
-
-            # Load DMDC Location Report and apply checks to dataset
-            dmdc_location_report = pd.read_csv(
-                utils.DATA_FOLDER / "DMDC Website Location Report.csv"
-            )
+        controls = load_military_controls(years=[yr])
 
-            # Must have DMDC Location report for the increment year
-            if yr not in dmdc_location_report["year"].unique():
-                raise ValueError("Increment year not in DMDC Location Report")
-            else:
-                # Scale the active-duty ACS PUMS population such that the total for the
-                # State of California matches the active-duty total control from the
-                # DMDC Location Report for the increment year
-                scale_pop_mil_pct = (
-                    dmdc_location_report[dmdc_location_report["year"] == yr][
-                        "active duty - total"
-                    ].iloc[0]
-                    / pums_ca_mil_df[pums_ca_mil_df["year"] == yr]["pop_ca_mil"].iloc[0]
-                )
+        # If increment year is prior to 2018 use DMDC Location Report
+        # Scale the active-duty ACS PUMS population such that the total for the
+        # State of California matches the active-duty total control from the
+        # DMDC Location Report for the increment year
+        if yr < 2018:
+            scale_pop_mil_pct = controls["dmdc"][yr] / controls["pums_ca_mil"][yr]
 
         # If increment year is >= 2018
-        elif 2018 <= yr:
-            # Load SDMAC Report and apply checks to dataset
-            sdmac_report = pd.read_csv(utils.DATA_FOLDER / "SDMAC Report.csv")
-
-            # Must have SDMAC report for the increment year
-            if yr not in sdmac_report["report"].unique():
-                raise ValueError("Increment year not in SDMAC Report dataset")
-            else:
-                # Scale the active-duty ACS PUMS population such that the total for
-                # San Diego County matches the active-duty total control from the
-                # SDMAC report for the increment year
-                scale_pop_mil_pct = (
-                    sdmac_report[
-                        (sdmac_report["report"] == yr)
-                        & (sdmac_report["year"] == yr)
-                        & (sdmac_report["site"] == "All")
-                    ]["active duty"].iloc[0]
-                    / df["pop_mil"].sum()
-                )
+        # Scale the active-duty ACS PUMS population such that the total for
+        # San Diego County matches the active-duty total control from the
+        # SDMAC report for the increment year
         else:
-            raise ValueError("Invalid increment year.")
+            if replicates:
+                total = df.groupby("replicate")["pop_mil"].transform("sum")
+            else:
+                total = df["pop_mil"].sum()
+            scale_pop_mil_pct = controls["sdmac"][(yr, yr, "All")] / total
 
         df["pop_mil"] = df["pop_mil"] * scale_pop_mil_pct
 
@@ -115,10 +175,16 @@ def get_active_duty_military(
         # To categories where it is less than the total population using the
         # Distribution of active-duty military within categories where the
         # Active-duty military is less than the total population
-        df["pop_mil"] = utils.distribute_excess(df=df, subset="pop_mil", total="pop")
+        df["pop_mil"] = utils.distribute_excess(
+            df=df.assign(year=yr),
+            subset="pop_mil",
+            total="pop",
+            by=["year", "replicate"] if replicates else "year",
+        )
 
-        return df[["race", "sex", "age", "pop", "pop_mil"]]
+        return df[[*keys, "pop", "pop_mil"]]
 
     # Active-duty military population held constant past the launch year
     else:
-        return pop_df[["race", "sex", "age", "pop", "pop_mil"]]
+        df = pop_df[["race", "sex", "age", "pop", "pop_mil"]]
+        return utils.expand_replicates(df) if replicates else df
@@ -3,12 +3,80 @@
 import logging
 import numpy as np
 import pandas as pd
-import sqlalchemy as sql
 
+import python.artifacts as artifacts
 import python.utils as utils
 
 logger = logging.getLogger(__name__)
 
+# Version of the stored base year artifact
+# Increment when the base year methodology changes to invalidate stored artifacts
+BASE_YR_ARTIFACT_VERSION = 1
+
+# SQL files and query parameters used to generate the base year population
+BASE_YR_SOURCES = [
+    ("pums_persons.sql", {"yr": 2020, "replicates": 0}),
+    ("dof_estimates.sql", None),
+    ("dof_projections.sql", None),
+    ("census_p5.sql", None),
+]
+
+
+def get_base_yr_metadata() -> dict:
+    """Get the metadata describing the inputs of the base year population.
+
+    Returns:
+        dict: Artifact version, base year, launch year, and fingerprints of
+            the SQL files and query parameters used as sources
+    """
+    return {
+        "artifact": "base_yr",
+        "artifact_version": BASE_YR_ARTIFACT_VERSION,
+        "base_year": utils.BASE_YEAR,
+        "launch_year": utils.LAUNCH_YEAR,
+        "sources": {
+            file_name: utils.query_fingerprint(file_name, params)
+            for file_name, params in BASE_YR_SOURCES
+        },
+    }
+
+
+def is_base_yr_stored() -> bool:
+    """Check if the base year population is stored for the current inputs."""
+    return artifacts.artifact_path(
+        name="base_yr_" + str(utils.LAUNCH_YEAR), metadata=get_base_yr_metadata()
+    ).is_file()
+
+
+def get_base_yr(rebuild: bool = False) -> pd.DataFrame:
+    """Get the base year population data broken down by race, sex, and single
+    year of age, re-using the stored base year artifact where possible.
+
+    The base year population depends only on the launch year vintage and its
+    source datasets, so it is stored as an artifact next to the model outputs
+    and re-used by all runs with the same launch year and source fingerprints
+    (SQL files and query parameters). Note changes to the data on the SQL
+    server are not detected, a rebuild must be forced instead.
+
+    Args:
+        rebuild (bool): If True, rebuild the base year population and
+            overwrite the stored artifact. Defaults to False
+
+    Returns:
+        pd.DataFrame: Base year population data broken down by race, sex, and
+            single year of age
+    """
+    # For launch years >= 2020 use the blended 2020 base year approach
+    if utils.BASE_YEAR == 2020:
+        return artifacts.load_or_build(
+            name="base_yr_" + str(utils.LAUNCH_YEAR),
+            metadata=get_base_yr_metadata(),
+            build=get_base_yr_2020,
+            rebuild=rebuild,
+        )
+    else:
+        raise ValueError("Base years besides 2020 are not available.")
+
 
 def get_base_yr_2020() -> pd.DataFrame:
     """Generate base year 2020 population data broken down by race, sex, and
@@ -27,53 +95,38 @@ def get_base_yr_2020() -> pd.DataFrame:
         pd.Dataframe: Base year 2020 population data broken down by race,
             sex, and single year of age
     """
-    # Load SQL queries and apply checks to datasets
-    with utils.SQL_ENGINE.connect() as connection:
-        # Load ACS PUMS persons
-        with open(utils.SQL_FOLDER / "pums_persons.sql", "r") as file:
-            pums_persons_df = pd.read_sql_query(
-                sql.text(file.read()), connection, params={"yr": 2020}
-            )
-            if len(pums_persons_df.index) == 0:
-                raise ValueError("2020: not in ACS 5-year PUMS")
-
-        # Load DOF Estimates
-        with open(utils.SQL_FOLDER / "dof_estimates.sql", "r") as file:
-            dof_estimates_df = pd.read_sql_query(sql.text(file.read()), connection)
-            if (
-                utils.LAUNCH_YEAR
-                not in dof_estimates_df["vintage"].astype(int).unique()
-            ):
-                raise ValueError("Launch year not in DOF Estimates")
-
-        # Load DOF Projections
-        with open(utils.SQL_FOLDER / "dof_projections.sql", "r") as file:
-            dof_projections_df = pd.read_sql_query(sql.text(file.read()), connection)
-            dof_projections_yr = utils.LAUNCH_YEAR
-            if 2020 not in dof_projections_df["year"].unique():
-                raise ValueError("2020: not in DOF Projections")
-            # If projections have not been released for the launch year
-            # Use the most recent projection from the DOF and warn the user
-            elif (
-                utils.LAUNCH_YEAR
-                not in dof_projections_df["vintage"].astype(int).unique()
-            ):
-
-                dof_projections_yr = max(
-                    dof_projections_df["vintage"][
-                        dof_projections_df["vintage"] <= utils.LAUNCH_YEAR
-                    ].astype(int)
-                )
-
-                logger.warning(
-                    """DOF projection unavailable for launch year. Default to most recent
-                    DOF projection vintage year: """
-                    + str(dof_projections_yr)
-                )
-
-        # Load 2020 Census P5 table
-        with open(utils.SQL_FOLDER / "census_p5.sql", "r") as file:
-            census_p5_df = pd.read_sql_query(sql.text(file.read()), connection)
+    # Load ACS PUMS persons
+    pums_persons_df = utils.read_pums_sql("pums_persons.sql", yr=2020)
+    if len(pums_persons_df.index) == 0:
+        raise ValueError("2020: not in ACS 5-year PUMS")
+
+    # Load DOF Estimates
+    dof_estimates_df = utils.read_sql_file("dof_estimates.sql")
+    if utils.LAUNCH_YEAR not in dof_estimates_df["vintage"].astype(int).unique():
+        raise ValueError("Launch year not in DOF Estimates")
+
+    # Load DOF Projections
+    dof_projections_df = utils.read_sql_file("dof_projections.sql")
+    dof_projections_yr = utils.LAUNCH_YEAR
+    if 2020 not in dof_projections_df["year"].unique():
+        raise ValueError("2020: not in DOF Projections")
+    # If projections have not been released for the launch year
+    # Use the most recent projection from the DOF and warn the user
+    elif utils.LAUNCH_YEAR not in dof_projections_df["vintage"].astype(int).unique():
+
+        dof_projections_yr = max(
+            dof_projections_df["vintage"][
+                dof_projections_df["vintage"] <= utils.LAUNCH_YEAR
+            ].astype(int)
+        )
+
+        logger.warning(
+            """DOF projection unavailable for launch year. Default to most recent
+            DOF projection vintage year: """ + str(dof_projections_yr)
+        )
+
+    # Load 2020 Census P5 table
+    census_p5_df = utils.read_sql_file("census_p5.sql")
 
     # Create a blended estimate of the total population distribution for 2020
     # From the 5-year ACS PUMS persons file and the CA DOF population projections
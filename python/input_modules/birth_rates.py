@@ -3,7 +3,6 @@
 import logging
 import pandas as pd
 import numpy as np
-import sqlalchemy as sql
 
 import python.utils as utils
 
@@ -29,27 +28,17 @@ def get_birth_rates(yr: int) -> pd.DataFrame:
     # Birth rates calculated from base year up to the launch year
     if yr <= utils.LAUNCH_YEAR:
 
-        with utils.SQL_ENGINE.connect() as con:
-
-            # Load CDC WONDER data from database for the specific year only
-            with open(
-                utils.SQL_FOLDER / "fertility" / "cdc_wonder_fertility.sql"
-            ) as file:
-                births = pd.read_sql_query(
-                    sql=sql.text(file.read()), con=con, params={"year": yr}
-                )
-                logger.info("CDC WONDER fertility data loaded from database")
-
-            # Load inflation factors
-            with open(
-                utils.SQL_FOLDER / "fertility" / "cdc_wonder_fertility_inflation.sql"
-            ) as file:
-                inflation_factor = pd.read_sql_query(
-                    sql=sql.text(file.read()), con=con, params={"year": yr}
-                )
-                logger.info(
-                    "CDC WONDER fertility inflation factors loaded from database"
-                )
+        # Load CDC WONDER data from database for the specific year only
+        births = utils.read_sql_file(
+            "fertility/cdc_wonder_fertility.sql", params={"year": yr}
+        )
+        logger.info("CDC WONDER fertility data loaded from database")
+
+        # Load inflation factors
+        inflation_factor = utils.read_sql_file(
+            "fertility/cdc_wonder_fertility_inflation.sql", params={"year": yr}
+        )
+        logger.info("CDC WONDER fertility inflation factors loaded from database")
 
         # Calculate inflated rates for individual ages
         result = (
@@ -63,39 +52,17 @@ def get_birth_rates(yr: int) -> pd.DataFrame:
             ]
         )
 
-        # Pivot by location to get county, state, national as separate columns
-        pivoted = (
-            result.pivot_table(
-                index=["age", "race", "sex", "hispanic_origin"],
-                columns="location",
-                values=["rate_birth"],
-                aggfunc="first",
-            )
-            .pipe(lambda df: df.set_axis(["_".join(col) for col in df.columns], axis=1))
-            .reset_index()
-        )
-
-        # Retrieve fields
-        county, state, national = (
-            pivoted.get("rate_birth_San Diego County", pd.Series(dtype=float)),
-            pivoted.get("rate_birth_California", pd.Series(dtype=float)),
-            pivoted.get("rate_birth_United States", pd.Series(dtype=float)),
-        )
-
         # Create Substitution methodology for null values based on geographic hierarchy
         # County > State > National
-        pivoted["rate_birth"] = np.where(
-            (county.notna()) & (county > 0),
-            county,
-            np.where(
-                (state.notna()) & (state > 0),
-                state,
-                np.where(
-                    (national.notna()) & (national > 0),
-                    national,
-                    np.nan,
-                ),
-            ),
+        pivoted = utils.resolve_geography(
+            df=result,
+            index=["age", "race", "sex", "hispanic_origin"],
+            value="rate_birth",
+            hierarchy=["San Diego County", "California", "United States"],
+        )
+        logger.info(
+            "Birth rate geographies used: "
+            + str(pivoted["source"].value_counts(dropna=False).to_dict())
         )
 
         # Finalize combined dataset
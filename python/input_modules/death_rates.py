@@ -5,113 +5,143 @@ import scipy
 
 import numpy as np
 import pandas as pd
-import sqlalchemy as sql
 
 import python.utils as utils
 
 logger = logging.getLogger(__name__)
 
 
-def load_cdc_wonder(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
-    """Load CDC WONDER mortality file from SQL and transform into a standardized DataFrame.
+# First year of the CDC WONDER 2018+ product where San Diego County population
+# Is replaced with the CCM population, such that death rates depend on the
+# Projected population
+SD_POPULATION_YEAR = 2022
 
-    This function loads mortality data from SQL and replaces San Diego County population
-    with CCM population for the 2018+ product to fill in missing population values for
-    the county, and then inflates deaths using the inflation factor calculated from the
-    number of "Not Stated" deaths.
+
+def substitute_sd_population(
+    cdc_wonder: pd.DataFrame, pop_df: pd.DataFrame
+) -> pd.DataFrame:
+    """Replace San Diego County population in CDC WONDER with CCM population.
+
+    Population is suppressed at the county level in the 2018+ CDC WONDER
+    product, so San Diego County population is replaced with the CCM
+    population for single years of age (0-84) and the sum of the CCM
+    population for ages 85-99 for the 85+ age group.
 
     Args:
+        cdc_wonder (pd.DataFrame): CDC WONDER mortality data for a single year
         pop_df (pd.DataFrame): Population DataFrame to merge with CDC WONDER data.
-        year (int): The year to load data for.
 
     Returns:
-        pd.DataFrame: Processed DataFrame with no missing or 'Not Stated' values.
+        pd.DataFrame: CDC WONDER mortality data with San Diego County population
+            replaced
     """
-
-    with utils.SQL_ENGINE.connect() as con:
-
-        # Load CDC WONDER data from database for the specific year only
-        with open(utils.SQL_FOLDER / "mortality" / "cdc_wonder_mortality.sql") as file:
-            cdc_wonder = utils.read_sql_query_fallback(
-                max_lookback=1,
-                sql=sql.text(file.read()),
-                con=con,
-                params={"year": year},
-            )
-            # Convert age to integer type
-            cdc_wonder["age"] = cdc_wonder["age"].astype(float)
-            logger.info("CDC WONDER mortality data loaded from database:")
-
-        # Load inflation factors
-        with open(
-            utils.SQL_FOLDER / "mortality" / "cdc_wonder_mortality_inflation.sql"
-        ) as file:
-            inflation_factor = utils.read_sql_query_fallback(
-                max_lookback=1,
-                sql=sql.text(file.read()),
-                con=con,
-                params={"year": year},
+    # Separate SYA (ages 0-84) and TYA (age 85) records
+    sya_records = cdc_wonder[cdc_wonder["age"] < 85].copy()
+    tya_records = cdc_wonder[cdc_wonder["age"] == 85].copy()
+
+    # For SYA records (ages 0-84), use direct age match
+    if len(sya_records) > 0:
+        sya_records = (
+            sya_records.merge(
+                pop_df[["age", "sex", "race", "pop"]],
+                on=["age", "sex", "race"],
+                how="left",
+                suffixes=("", "_ccm"),
             )
-            logger.info("CDC WONDER mortality inflation factors loaded from database:")
-
-    # For years >= 2022 (2018+ product), merge SD County deaths with CCM population
-    if year >= 2022 and pop_df is not None:
-
-        # Separate SYA (ages 0-84) and TYA (age 85) records
-        sya_records = cdc_wonder[cdc_wonder["age"] < 85].copy()
-        tya_records = cdc_wonder[cdc_wonder["age"] == 85].copy()
-
-        # For SYA records (ages 0-84), use direct age match
-        if len(sya_records) > 0:
-            sya_records = (
-                sya_records.merge(
-                    pop_df[["age", "sex", "race", "pop"]],
-                    on=["age", "sex", "race"],
-                    how="left",
-                    suffixes=("", "_ccm"),
+            .assign(
+                pop=lambda x: np.where(
+                    x["location"] == "San Diego County",
+                    x["pop_ccm"].fillna(x["pop"]),
+                    x["pop"],
                 )
-                .assign(
-                    pop=lambda x: np.where(
-                        x["location"] == "San Diego County",
-                        x["pop_ccm"].fillna(x["pop"]),
-                        x["pop"],
-                    )
-                )
-                .drop(columns=["pop_ccm"])
             )
+            .drop(columns=["pop_ccm"])
+        )
 
-        # For TYA records (age 85 = ages 85-99), sum population across age range
-        if len(tya_records) > 0:
-            pop_85plus = (
-                pop_df.loc[pop_df["age"].between(85, 99)][["sex", "race", "pop"]]
-                .groupby(["sex", "race"], as_index=False)["pop"]
-                .sum()
-                .assign(age=85)
-            )
+    # For TYA records (age 85 = ages 85-99), sum population across age range
+    if len(tya_records) > 0:
+        pop_85plus = (
+            pop_df.loc[pop_df["age"].between(85, 99)][["sex", "race", "pop"]]
+            .groupby(["sex", "race"], as_index=False)["pop"]
+            .sum()
+            .assign(age=85)
+        )
 
-            tya_records = (
-                tya_records.merge(
-                    pop_85plus,
-                    on=["age", "sex", "race"],
-                    how="left",
-                    suffixes=("", "_ccm"),
-                )
-                .assign(
-                    pop=lambda x: np.where(
-                        x["location"] == "San Diego County",
-                        x["pop_ccm"].fillna(x["pop"]),
-                        x["pop"],
-                    )
+        tya_records = (
+            tya_records.merge(
+                pop_85plus,
+                on=["age", "sex", "race"],
+                how="left",
+                suffixes=("", "_ccm"),
+            )
+            .assign(
+                pop=lambda x: np.where(
+                    x["location"] == "San Diego County",
+                    x["pop_ccm"].fillna(x["pop"]),
+                    x["pop"],
                 )
-                .drop(columns=["pop_ccm"])
             )
+            .drop(columns=["pop_ccm"])
+        )
+
+    # Combine back together
+    return pd.concat([sya_records, tya_records], ignore_index=True)
+
 
-        # Combine back together
-        cdc_wonder = pd.concat([sya_records, tya_records], ignore_index=True)
+def load_cdc_wonder_batch(
+    years: list[int], pop_dfs: dict[int, pd.DataFrame] | None = None
+) -> pd.DataFrame:
+    """Load CDC WONDER mortality data for multiple years and transform into a
+    standardized DataFrame.
+
+    This function loads mortality data from SQL for each year and replaces San
+    Diego County population with CCM population for the 2018+ product (years
+    >= SD_POPULATION_YEAR with a population provided) to fill in missing
+    population values for the county. Deaths are then inflated for all years
+    at once using the inflation factor calculated from the number of "Not
+    Stated" deaths.
 
-    # Inflate deaths and calculate rates for all ages
+    Args:
+        years (list[int]): The years to load data for.
+        pop_dfs (dict[int, pd.DataFrame] | None): Population DataFrames by year
+            to merge with CDC WONDER data. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Processed DataFrame with no missing or 'Not Stated' values.
+    """
+    pop_dfs = {} if pop_dfs is None else pop_dfs
+
+    cdc_wonder, inflation_factor = [], []
+    for year in years:
+        # Load CDC WONDER data from database for the specific year
+        df = utils.read_sql_file(
+            "mortality/cdc_wonder_mortality.sql", params={"year": year}, max_lookback=1
+        )
+        # Convert age to integer type
+        df["age"] = df["age"].astype(float)
+
+        # For years >= 2022 (2018+ product), merge SD County deaths with CCM population
+        if year >= SD_POPULATION_YEAR and pop_dfs.get(year) is not None:
+            df = substitute_sd_population(cdc_wonder=df, pop_df=pop_dfs[year])
+        cdc_wonder.append(df)
+
+        # Load inflation factors
+        inflation_factor.append(
+            utils.read_sql_file(
+                "mortality/cdc_wonder_mortality_inflation.sql",
+                params={"year": year},
+                max_lookback=1,
+            )
+        )
+    logger.info("CDC WONDER mortality data loaded from database:")
+
+    # Inflate deaths and calculate rates for all years and ages
     final = (
-        pd.merge(cdc_wonder, inflation_factor, on=["year", "location", "sex"])
+        pd.merge(
+            pd.concat(cdc_wonder, ignore_index=True),
+            pd.concat(inflation_factor, ignore_index=True),
+            on=["year", "location", "sex"],
+        )
         .assign(
             deaths=lambda x: x["deaths"] * x["inflation_factor"],
             rates=lambda x: np.where(
@@ -124,7 +154,27 @@ def load_cdc_wonder(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
     return final
 
 
-def deaths_recode(deaths: int, pop: int) -> float:
+def load_cdc_wonder(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
+    """Load CDC WONDER mortality file from SQL and transform into a standardized DataFrame.
+
+    This function loads mortality data from SQL and replaces San Diego County population
+    with CCM population for the 2018+ product to fill in missing population values for
+    the county, and then inflates deaths using the inflation factor calculated from the
+    number of "Not Stated" deaths. See load_cdc_wonder_batch.
+
+    Args:
+        pop_df (pd.DataFrame): Population DataFrame to merge with CDC WONDER data.
+        year (int): The year to load data for.
+
+    Returns:
+        pd.DataFrame: Processed DataFrame with no missing or 'Not Stated' values.
+    """
+    return load_cdc_wonder_batch(years=[year], pop_dfs={year: pop_df})
+
+
+def deaths_recode(
+    deaths: np.ndarray | pd.Series, pop: np.ndarray | pd.Series
+) -> np.ndarray:
     """Recode CDC WONDER zero death and suppressed values.
 
     This function is used as the final methodology for substituting missing rates where
@@ -136,108 +186,85 @@ def deaths_recode(deaths: int, pop: int) -> float:
             - If 0 < population <= 4, return 1 (minimum imputation for small population)
             - If population == 0, return 0
 
+        Population is truncated to an integer before applying the logic. The
+        logic is applied to whole columns at once, returning NaN where the
+        population is missing.
+
         Args:
-            deaths (int): The total number of deaths (may be 0, NaN, or a positive
-                integer).
-            pop (int): The total population.
+            deaths (np.ndarray | pd.Series): The total number of deaths (may be 0,
+                NaN, or a positive integer).
+            pop (np.ndarray | pd.Series): The total population.
 
         Returns:
-            float: The recoded (possibly imputed) number of deaths.
+            np.ndarray: The recoded (possibly imputed) number of deaths.
     """
-
-    pop = int(pop)  # floor function on floats
-    if deaths == 0:
-        if pop > 0:
-            return 1
-        else:
-            return 0
-    elif pd.isna(deaths):
-        if pop > 4:
-            return 4.5
-        elif pop > 0:
-            return 1
-        else:
-            return 0
-    else:
-        return float(deaths)
+    deaths = np.asarray(deaths, dtype=np.float64)
+    pop = np.trunc(np.asarray(pop, dtype=np.float64))  # floor function on floats
+
+    return np.select(
+        condlist=[
+            np.isnan(pop),
+            (deaths == 0) & (pop > 0),
+            deaths == 0,
+            np.isnan(deaths) & (pop > 4),
+            np.isnan(deaths) & (pop > 0),
+            np.isnan(deaths),
+        ],
+        choicelist=[np.nan, 1, 0, 4.5, 1, 0],
+        default=deaths,
+    )
 
 
-def load_local_files(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
-    """Load files from a directory for a specific year and combine them by product.
+def load_local_files_batch(
+    years: list[int], pop_dfs: dict[int, pd.DataFrame] | None = None
+) -> pd.DataFrame:
+    """Load CDC WONDER mortality data for multiple years and combine them by product.
 
     This function performs the geography substitution, supplementing data from a higher
-    geography when data is missing or suppressed.
+    geography when data is missing or suppressed, for all years at once.
 
     Args:
-        pop_df (pd.DataFrame): Population dataframe from CCM for 2018+ product
-            population estimates.
-        year (int): The year to load data for.
+        years (list[int]): The years to load data for.
+        pop_dfs (dict[int, pd.DataFrame] | None): Population DataFrames by year
+            from CCM for 2018+ product population estimates. Defaults to None.
 
     Returns:
         pd.DataFrame: A single DataFrame for ages 0-85 with mortality rates.
     """
+    df = load_cdc_wonder_batch(years=years, pop_dfs=pop_dfs)
 
-    # Use unified load_cdc_wonder function with year parameter
-    df = load_cdc_wonder(pop_df, year)
-
-    if df.empty:
-        raise ValueError(f"No CDC WONDER data found for year {year}")
-
-    # Pivot by location to get county, state, national as separate columns
-    pivoted = (
-        df.pivot_table(
-            index=["year", "age", "race", "sex"],
-            columns="location",
-            values=["rates", "deaths", "pop"],
-            aggfunc="first",
-        )
-        .pipe(lambda df: df.set_axis(["_".join(col) for col in df.columns], axis=1))
-        .reset_index()
-    )
-
-    # Retrieve fields
-    county, state, national, nat_deaths, nat_pop = (
-        pivoted.get("rates_San Diego County", pd.Series(dtype=float)),
-        pivoted.get("rates_California", pd.Series(dtype=float)),
-        pivoted.get("rates_United States", pd.Series(dtype=float)),
-        pivoted.get("deaths_United States", pd.Series(dtype=float)),
-        pivoted.get("pop_United States", pd.Series(dtype=float)),
-    )
+    missing = set(years) - set(df["year"].unique())
+    if df.empty or missing:
+        raise ValueError(f"No CDC WONDER data found for year(s) {sorted(missing)}")
 
     # Impute missing or zero rates for national
-    national_impute = np.where(
-        (nat_pop.notna()) & (nat_pop > 0),
-        np.vectorize(deaths_recode)(nat_deaths, nat_pop) / nat_pop,
+    df["rates_imputed"] = np.where(
+        (df["location"] == "United States") & (df["pop"] > 0),
+        deaths_recode(df["deaths"], df["pop"]) / df["pop"],
         np.nan,
     )
 
     # For NHPI, use State > National
     # Mix of NHPI county and state level data causes discontinuity in rates
-    pivoted["rates"] = np.where(
-        pivoted["race"] == "Native Hawaiian or Other Pacific Islander alone",
-        np.where(
-            (state.notna()) & (state > 0),
-            state,
-            np.where(
-                (national.notna()) & (national > 0),
-                national,
-                national_impute,
-            ),
-        ),
-        # For all other races: County > State > National hierarchy
-        np.where(
-            (county.notna()) & (county > 0),
-            county,
-            np.where(
-                (state.notna()) & (state > 0),
-                state,
-                np.where(
-                    (national.notna()) & (national > 0),
-                    national,
-                    national_impute,
-                ),
-            ),
-        ),
+    # For all other races: County > State > National hierarchy
+    pivoted = utils.resolve_geography(
+        df=df,
+        index=["year", "age", "race", "sex"],
+        value="rates",
+        hierarchy=["San Diego County", "California", "United States"],
+        overrides={
+            "race": {
+                "Native Hawaiian or Other Pacific Islander alone": [
+                    "California",
+                    "United States",
+                ]
+            }
+        },
+        impute="rates_imputed",
+    )
+    logger.info(
+        "Death rate geographies used: "
+        + str(pivoted["source"].value_counts(dropna=False).to_dict())
     )
 
     # Finalize combined dataset
@@ -250,6 +277,41 @@ def load_local_files(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
     return df
 
 
+def load_local_files(pop_df: pd.DataFrame, year: int) -> pd.DataFrame:
+    """Load files from a directory for a specific year and combine them by product.
+
+    This function performs the geography substitution, supplementing data from a higher
+    geography when data is missing or suppressed. See load_local_files_batch.
+
+    Args:
+        pop_df (pd.DataFrame): Population dataframe from CCM for 2018+ product
+            population estimates.
+        year (int): The year to load data for.
+
+    Returns:
+        pd.DataFrame: A single DataFrame for ages 0-85 with mortality rates.
+    """
+    return load_local_files_batch(years=[year], pop_dfs={year: pop_df})
+
+
+def _group_series(df: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+    """Sort mortality rates into contiguous (sex, race, year) series by age.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing mortality rates with columns
+            'age', 'rates', 'sex', 'race', and 'year'
+
+    Returns:
+        tuple[pd.DataFrame, np.ndarray]: The sorted DataFrame and the start
+            position of each series with the total number of rows appended
+    """
+    df = df.sort_values(by=["sex", "race", "year", "age"], kind="stable")
+    group = df.groupby(["sex", "race", "year"], sort=False).ngroup().to_numpy()
+    bounds = np.flatnonzero(np.diff(group, prepend=-1, append=-1))
+
+    return df, bounds
+
+
 def smooth_rates(input_df: pd.DataFrame, s: int, k: int) -> pd.DataFrame:
     """Smooth mortality rates using spline interpolation.
 
@@ -259,6 +321,10 @@ def smooth_rates(input_df: pd.DataFrame, s: int, k: int) -> pd.DataFrame:
     natural logarithm of the rates to ensure non-negativity and better handle
     the exponential nature of mortality rates.
 
+    The DataFrame is sorted and grouped once, with each series fit on its
+    contiguous block of ages and all smoothed rates written back in a single
+    assignment.
+
     Args:
         input_df (pd.DataFrame): DataFrame containing mortality rates with
             columns 'age', 'rates', 'sex', 'race', and 'year'.
@@ -279,7 +345,6 @@ def smooth_rates(input_df: pd.DataFrame, s: int, k: int) -> pd.DataFrame:
 
     Example:
         >>> df_smooth = smooth_rates(df, s=5, k=2)
-        >>> df_custom = smooth_rates(df, s=10, k=3, group_cols=["year", "region"])
     """
     # Validate required columns
     required_cols = ["age", "rates", "sex", "race", "year"]
@@ -297,25 +362,21 @@ def smooth_rates(input_df: pd.DataFrame, s: int, k: int) -> pd.DataFrame:
     # Avoid overwriting the original DataFrame
     df = input_df.copy()
 
-    for sex in df["sex"].unique():
-        for race in df["race"].unique():
-            for year in df["year"].unique():
-                mask = (df["sex"] == sex) & (df["race"] == race) & (df["year"] == year)
-
-                # Get subset and sort by age
-                subset = df.loc[mask, ["age", "rates"]].copy()
-                subset = subset.sort_values("age")
+    # Group once into contiguous series sorted by age
+    sorted_df, bounds = _group_series(df)
+    ages = sorted_df["age"].to_numpy(dtype=np.float64)
+    log_rates = np.log(sorted_df["rates"].to_numpy(dtype=np.float64))
 
-                # Fit spline to log rates
-                spline = scipy.interpolate.make_splrep(
-                    subset["age"], np.log(subset["rates"]), s=s, k=k
-                )
-
-                # Evaluate spline to get smoothed rates
-                smoothed_rates = np.exp(scipy.interpolate.splev(subset["age"], spline))
+    # Fit spline to log rates of each series
+    smoothed = np.empty_like(log_rates)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        spline = scipy.interpolate.make_splrep(
+            ages[start:end], log_rates[start:end], s=s, k=k
+        )
+        smoothed[start:end] = scipy.interpolate.splev(ages[start:end], spline)
 
-                # Update rates in the DataFrame using boolean indexing
-                df.loc[subset.index, "rates"] = smoothed_rates
+    # Update rates in the DataFrame using the sorted index
+    df.loc[sorted_df.index, "rates"] = np.exp(smoothed)
 
     return df
 
@@ -357,9 +418,9 @@ def process_life_rates(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def get_death_rates(
-    yr: int,
-    pop_df: pd.DataFrame,
+def get_death_rates_batch(
+    years: list[int],
+    pop_dfs: dict[int, pd.DataFrame] | None = None,
     smooth_s: int = 5,
     smooth_k: int = 2,
 ) -> pd.DataFrame:
@@ -384,89 +445,119 @@ def get_death_rates(
 
     Smoothing is applied to the combined CDC and scaled UN DESA dataset.
 
+    Death rates are built for all requested years at once, with a single
+    scaling and smoothing pass over every (year, sex, race) series. Only the
+    San Diego County population substitution for years >= SD_POPULATION_YEAR
+    requires the projected population, and is applied per year where a
+    population is provided.
+
     Args:
-        yr: Increment year.
-        pop_df (pd.DataFrame): Population data for the year.
+        years (list[int]): Increment years.
+        pop_dfs (dict[int, pd.DataFrame] | None): Population data by year.
+            Defaults to None.
         smooth_s (int): Smoothing factor for spline interpolation. Defaults to 5.
         smooth_k (int): Degree of spline polynomial (1-5). Defaults to 2.
 
     Returns:
-        pd.DataFrame: Death rates broken down by race, sex, and single year
-            of age.
+        pd.DataFrame: Death rates broken down by year, race, sex, and single
+            year of age.
     """
-    # Load mortality data for this specific year
-    cdc_data = load_local_files(pop_df=pop_df, year=yr)[["race", "sex", "age", "rates"]]
+    # Load mortality data for all years
+    cdc_data = load_local_files_batch(years=years, pop_dfs=pop_dfs)[
+        ["year", "race", "sex", "age", "rates"]
+    ]
 
     # Load UNDESA data for ages 85-99
-    with utils.SQL_ENGINE.connect() as con:
-        with open(utils.SQL_FOLDER / "mortality" / "undesa_survivors.sql") as file:
-            undesa_rates = pd.read_sql_query(
-                sql=sql.text(file.read()), con=con, params={"year": yr}
+    undesa_rates = []
+    for yr in years:
+        df = utils.read_sql_file("mortality/undesa_survivors.sql", params={"year": yr})
+
+        # Use the latest available year from UNDESA data
+        max_undesa_year = df["year"].max()
+        if yr > max_undesa_year:
+            logger.warning(
+                f"UN DESA data unavailable for {yr}. Using {max_undesa_year} data for "
+                f"ages 85-99."
             )
-            logger.info("UN DESA loaded from database:")
-
-    # Use the latest available year from UNDESA data
-    max_undesa_year = undesa_rates["year"].max()
-    if yr > max_undesa_year:
-        logger.warning(
-            f"UN DESA data unavailable for {yr}. Using {max_undesa_year} data for "
-            f"ages 85-99."
-        )
-
-    # Expand UNDESA rates to include all race categories
-    # UN DESA life table doesn't have race breakdown, so apply same rates to all
-    race_categories = cdc_data["race"].unique()
-    undesa_expanded = []
-    for race in race_categories:
-        undesa_race = undesa_rates.copy()
-        undesa_race["race"] = race
-        undesa_expanded.append(undesa_race)
-    undesa_rates = pd.concat(undesa_expanded, ignore_index=True)
+        undesa_rates.append(df.assign(year=yr))
+    undesa_rates = pd.concat(undesa_rates, ignore_index=True)
+    logger.info("UN DESA loaded from database:")
 
     # Get CDC mortality rate for age 85 (from TYA 85+ group)
-    cdc_rate_85plus = cdc_data[cdc_data["age"] == 85][["race", "sex", "rates"]].rename(
-        columns={"rates": "cdc_rate"}
-    )
+    cdc_rate_85plus = cdc_data[cdc_data["age"] == 85][
+        ["year", "race", "sex", "rates"]
+    ].rename(columns={"rates": "cdc_rate"})
 
     # Get UN DESA mortality rate for age 85+ (aggregate of ages 85-99)
+    # Broadcast to all race categories by merging on year and sex
     undesa_rate_85plus = undesa_rates[undesa_rates["age"] == "85+"][
-        ["race", "sex", "rates"]
+        ["year", "sex", "rates"]
     ].rename(columns={"rates": "undesa_rate"})
 
     # Calculate scaling factor
     scaling_df = cdc_rate_85plus.merge(
         undesa_rate_85plus,
-        on=["sex", "race"],
+        on=["year", "sex"],
         how="left",
     ).assign(scaling_factor=lambda x: x["cdc_rate"] / x["undesa_rate"])
 
+    # Expand UNDESA rates to include all race categories of each year
+    # UN DESA life table doesn't have race breakdown, so apply same rates to all
     # Merge scaling factor and apply to UNDESA mortality rates
     undesa_rates = (
-        undesa_rates[undesa_rates["age"] != "85+"]
+        cdc_data[["year", "race"]]
+        .drop_duplicates()
+        .merge(undesa_rates[undesa_rates["age"] != "85+"], on="year")
         .assign(age=lambda x: x["age"].astype(int))
         .merge(
-            scaling_df[["sex", "race", "scaling_factor"]],
-            on=["sex", "race"],
+            scaling_df[["year", "sex", "race", "scaling_factor"]],
+            on=["year", "sex", "race"],
             how="left",
         )
         .assign(rates=lambda x: x["rates"] * x["scaling_factor"])
         .drop(columns=["scaling_factor"])
-    )[["sex", "age", "race", "rates"]]
+    )[["year", "sex", "age", "race", "rates"]]
 
     cdc_rates = cdc_data[cdc_data["age"] < 85]
 
     # Combine CDC rates (ages 0-84) with scaled UNDESA rates (ages 85-99)
     combined_rates = pd.concat([cdc_rates, undesa_rates], ignore_index=True)
 
-    # Apply smoothing to the combined dataset (ages 0-99)
+    # Apply smoothing to every series of the combined dataset (ages 0-99)
     if smooth_s is not None and smooth_k is not None:
-        # Prepare combined DataFrame for smooth_rates function
-        combined_rates["year"] = yr
-
-        # Apply smoothing to full age range
         combined_rates = smooth_rates(combined_rates, s=smooth_s, k=smooth_k)
 
     # Rename to final column name
     rates = combined_rates.rename(columns={"rates": "rate_death"})
 
+    return rates[["year", "race", "sex", "age", "rate_death"]]
+
+
+def get_death_rates(
+    yr: int,
+    pop_df: pd.DataFrame,
+    smooth_s: int = 5,
+    smooth_k: int = 2,
+) -> pd.DataFrame:
+    """Create death rates broken down by race, sex, and single year of age.
+
+    The increment year slice of get_death_rates_batch.
+
+    Args:
+        yr: Increment year.
+        pop_df (pd.DataFrame): Population data for the year.
+        smooth_s (int): Smoothing factor for spline interpolation. Defaults to 5.
+        smooth_k (int): Degree of spline polynomial (1-5). Defaults to 2.
+
+    Returns:
+        pd.DataFrame: Death rates broken down by race, sex, and single year
+            of age.
+    """
+    rates = get_death_rates_batch(
+        years=[yr],
+        pop_dfs={yr: pop_df},
+        smooth_s=smooth_s,
+        smooth_k=smooth_k,
+    )
+
     return rates[["race", "sex", "age", "rate_death"]]
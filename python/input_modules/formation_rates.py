@@ -5,22 +5,22 @@
 import logging
 
 import pandas as pd
-import sqlalchemy as sql
 
 import python.utils as utils
 
 logger = logging.getLogger(__name__)
 
 
-def get_formation_rates(yr: int) -> pd.DataFrame:
+def get_formation_rates_batch(
+    years: list[int], replicates: bool = False
+) -> pd.DataFrame:
     """Generate group quarters and household formation rates broken
-    down by race, sex, and single year of age.
+    down by race, sex, and single year of age for multiple increment years.
 
     Group quarter and household formation rates are calculated using the
     5-year ACS PUMS persons. Prior to calculation, the total number of
-    households, group quarters, and population are scaled to match SANDAG
-    Estimates for the increment year from the vintage associated with the
-    launch year.
+    households and group quarters are scaled to match SANDAG Estimates for the
+    increment year from the vintage associated with the launch year.
 
     Note that formation rates for persons over 70 are calculated as a
     single composite rate for all persons over 70, where group quarters rates
@@ -28,98 +28,114 @@ def get_formation_rates(yr: int) -> pd.DataFrame:
     sex. These rates are then applied uniformly to all single year of age
     categories above 70.
 
+    All increment years are calculated at once, using year as an additional
+    grouping key for the control scaling, the distribution of excess
+    population, and the over 70 composite rates. If replicates are requested,
+    replicate is a further grouping key, such that each ACS PUMS replicate
+    weight (see utils.read_pums_sql) is scaled to the same control totals.
+
     Args:
-        yr: Increment year
+        years (list[int]): Increment years
+        replicates (bool): If True, calculate rates for each ACS PUMS replicate
+            weight. Defaults to False
 
     Returns:
         pd.DataFrame: Group quarters and household formation rates broken down
-            by race, sex, and single year of age
-    """
-    if yr <= utils.LAUNCH_YEAR:
-        # Load SQL queries and apply checks to datasets
-        with utils.SQL_ENGINE.connect() as connection:
-            # Load ACS PUMS persons
-            with open(utils.SQL_FOLDER / "pums_persons.sql", "r") as file:
-                pums_persons_df = pd.read_sql_query(
-                    sql.text(file.read()), connection, params={"yr": yr}
-                )
-        if len(pums_persons_df.index) == 0:
-            raise ValueError(str(yr) + ": not in ACS 5-year PUMS")
-
-        # Take total households/group quarters/population and apply scaling factor
-        # Matching the SANDAG Estimates Program for the increment year
-        # From the vintage associated with the chosen launch year
-        control_map = {
-            "households": {"col": "pop_hh_head", "control": "hh"},
-            "population": {"col": "pop", "control": "pop"},
-            "population": {"col": "pop_gq", "control": "gq"},
-        }
-
-        for k, v in control_map.items():
-            control = utils.CONTROLS[str(utils.LAUNCH_YEAR)][str(yr)][k][v["control"]]
-            if control is not None:
-                scale_pct = control / pums_persons_df[v["col"]].sum()
-                pums_persons_df[v["col"]] = pums_persons_df[v["col"]] * scale_pct
-            else:
-                logger.warning(
-                    "No " + v["control"] + " control total provided.", UserWarning
-                )
-
-        # Distribute excess head of household and group quarters population
-        # This is done to avoid formation rates > 1
-        pums_persons_df["pop_gq"] = utils.distribute_excess(
-            df=pums_persons_df, subset="pop_gq", total="pop"
-        )
-        pums_persons_df["pop_hh_head"] = utils.distribute_excess(
-            df=pums_persons_df, subset="pop_hh_head", total="pop_hh"
-        )
+            by year, race, sex, and single year of age, and by replicate (0
+            being the person weight) if replicates are requested
 
-        # Calculate the over 70 Group Quarters Formation Rate by Sex
-        rates_70plus_gq = (
-            pums_persons_df[pums_persons_df["age"] > 70]
-            .groupby(["sex"])[["pop_gq", "pop"]]
-            .sum()
-            .reset_index()
-            .assign(rate_gq=lambda x: x["pop_gq"] / x["pop"])[["sex", "rate_gq"]]
-        )
+    Raises:
+        ValueError: If an increment year is after the launch year
+    """
+    # Formation rates are not calculated after the launch year
+    if max(years) > utils.LAUNCH_YEAR:
+        raise ValueError("Formation rates not calculated past launch year")
 
-        # Calculate the over 70 Household Formation Rate by Race and Sex
-        rates_70plus_hh_head = (
-            pums_persons_df[pums_persons_df["age"] > 70]
-            .groupby(["race", "sex"])[["pop_hh_head", "pop_hh"]]
-            .sum()
-            .reset_index()
-            .assign(rate_hh=lambda x: x["pop_hh_head"] / x["pop_hh"])[
-                ["race", "sex", "rate_hh"]
-            ]
+    # Load ACS PUMS persons and apply checks to dataset
+    pums_persons_df = utils.read_pums_persons(years=years, replicates=replicates)
+
+    # Rates are calculated within year and, if requested, replicate
+    keys = ["year", "replicate"] if replicates else ["year"]
+
+    # Take total households/group quarters and apply scaling factor
+    # Matching the SANDAG Estimates Program for the increment year
+    # From the vintage associated with the chosen launch year
+    control_map = {
+        ("households", "hh"): "pop_hh_head",
+        ("population", "gq"): "pop_gq",
+    }
+
+    controls = {
+        category: utils.get_controls(years=years, category=category)
+        for category in ["households", "population"]
+    }
+
+    for (category, control), col in control_map.items():
+        control_total = pums_persons_df["year"].map(controls[category][control])
+        scale_pct = control_total / pums_persons_df.groupby(keys)[col].transform("sum")
+        pums_persons_df[col] = (pums_persons_df[col] * scale_pct).where(
+            control_total.notna(), pums_persons_df[col]
         )
+        for yr in controls[category].index[controls[category][control].isna()]:
+            logger.warning(f"{yr}: No {control} control total provided.")
+
+    # Distribute excess head of household and group quarters population
+    # This is done to avoid formation rates > 1
+    pums_persons_df["pop_gq"] = utils.distribute_excess(
+        df=pums_persons_df, subset="pop_gq", total="pop", by=keys
+    )
+    pums_persons_df["pop_hh_head"] = utils.distribute_excess(
+        df=pums_persons_df, subset="pop_hh_head", total="pop_hh", by=keys
+    )
+
+    # Calculate the Group Quarters and Household Formation Rates
+    pums_persons_df["rate_gq"] = pums_persons_df["pop_gq"] / pums_persons_df["pop"]
+    pums_persons_df["rate_hh"] = (
+        pums_persons_df["pop_hh_head"] / pums_persons_df["pop_hh"]
+    )
+
+    # For age categories over 70, assign the over 70 Group Quarters Formation
+    # Rate by Sex and the over 70 Household Formation Rate by Race and Sex
+    over_70 = pums_persons_df["age"] > 70
+    gq_70plus = (
+        pums_persons_df[over_70]
+        .groupby([*keys, "sex"])[["pop_gq", "pop"]]
+        .transform("sum")
+    )
+    hh_70plus = (
+        pums_persons_df[over_70]
+        .groupby([*keys, "race", "sex"])[["pop_hh_head", "pop_hh"]]
+        .transform("sum")
+    )
+    pums_persons_df.loc[over_70, "rate_gq"] = gq_70plus["pop_gq"] / gq_70plus["pop"]
+    pums_persons_df.loc[over_70, "rate_hh"] = (
+        hh_70plus["pop_hh_head"] / hh_70plus["pop_hh"]
+    )
+
+    # Adjust categories where sum of formation rates > 1
+    rates = (
+        pums_persons_df[[*keys, "race", "sex", "age", "rate_gq", "rate_hh"]]
+        .fillna(0)
+        .sort_values(by=[*keys, "race", "sex", "age"], ignore_index=True)
+    )
+    rates[["rate_gq", "rate_hh"]] = utils.adjust_sum(
+        df=rates, cols=["rate_gq", "rate_hh"], sum=1, option="exceeds"
+    )
+
+    return rates
 
-        # For age categories over 70, assign all over 70 Formation rates
-        # To all race, sex, and single year of age categories
-        rates_70plus = (
-            pums_persons_df[pums_persons_df["age"] > 70]
-            .merge(right=rates_70plus_gq, how="left", on="sex")
-            .merge(right=rates_70plus_hh_head, how="left", on=["race", "sex"])
-            .fillna(0)[["race", "sex", "age", "rate_gq", "rate_hh"]]
-        )
 
-        # Calculate the <=70 Group Quarters and Household Formation Rates
-        rates_70under = (
-            pums_persons_df[pums_persons_df["age"] <= 70]
-            .assign(rate_gq=lambda x: x["pop_gq"] / x["pop"])
-            .assign(rate_hh=lambda x: x["pop_hh_head"] / x["pop_hh"])
-            .fillna(0)[["race", "sex", "age", "rate_gq", "rate_hh"]]
-        )
+def get_formation_rates(yr: int) -> pd.DataFrame:
+    """Generate group quarters and household formation rates broken
+    down by race, sex, and single year of age.
 
-        # Combine Formation Rates
-        # Adjust categories where sum of formation rates > 1
-        rates = pd.concat([rates_70under, rates_70plus], ignore_index=True)
-        rates[["rate_gq", "rate_hh"]] = utils.adjust_sum(
-            df=rates, cols=["rate_gq", "rate_hh"], sum=1, option="exceeds"
-        )
+    See get_formation_rates_batch for the calculation of formation rates.
 
-        return rates
+    Args:
+        yr: Increment year
 
-    # Formation rates are not calculated after the launch year
-    else:
-        raise ValueError("Formation rates not calculated past launch year")
+    Returns:
+        pd.DataFrame: Group quarters and household formation rates broken down
+            by race, sex, and single year of age
+    """
+    return get_formation_rates_batch(years=[yr]).drop(columns="year")
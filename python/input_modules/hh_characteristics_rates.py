@@ -6,16 +6,38 @@ import logging
 
 import numpy as np
 import pandas as pd
-import sqlalchemy as sql
 
 import python.utils as utils
 
 logger = logging.getLogger(__name__)
 
 
-def get_hh_characteristic_rates(yr: int) -> pd.DataFrame:
+# Lower bounds of the aggregate age groups used when households are < 20
+# Note maximum age of 99 in defining age groups
+AGE_GROUP_BREAKS = [0, 16, 18, 25, 35, 50, 60, 71]
+
+# Mapping of household attributes to ACS PUMS columns and SANDAG Estimates
+# Include whether attribute is controlled and whether to create crude rate
+HH_ATTRIBUTES = {
+    "hh": {"col": "pop_hh_head", "control": "total", "rate": None},
+    "laborforce": {"col": "hh_head_lf", "control": None, "rate": "rate_hh_head_lf"},
+    "size1": {"col": "size1", "control": "size1", "rate": "rate_size1"},
+    "size2": {"col": "size2", "control": "size2", "rate": "rate_size2"},
+    "size3": {"col": "size3", "control": "size3", "rate": "rate_size3"},
+    "child1": {"col": "child1", "control": "child1", "rate": "rate_child1"},
+    "senior1": {"col": "senior1", "control": None, "rate": "rate_senior1"},
+    "workers0": {"col": "workers0", "control": "workers0", "rate": "rate_workers0"},
+    "workers1": {"col": "workers1", "control": "workers1", "rate": "rate_workers1"},
+    "workers2": {"col": "workers2", "control": "workers2", "rate": "rate_workers2"},
+    "workers3": {"col": "workers3", "control": "workers3", "rate": "rate_workers3"},
+}
+
+
+def get_hh_characteristic_rates_batch(
+    years: list[int], replicates: bool = False
+) -> pd.DataFrame:
     """Generate household characteristics rates broken down by race, sex, and
-    single year of age.
+    single year of age for multiple increment years.
 
     Household characteristic rates are calculated using the 5-year ACS PUMS
     persons. Prior to calculation, the total number of households and all
@@ -28,158 +50,122 @@ def get_hh_characteristic_rates(yr: int) -> pd.DataFrame:
     households, household characteristic rates within race, sex, and more
     aggregate age categories are used.
 
+    All increment years are calculated at once, using year as an additional
+    grouping key for the control scaling, the distribution of excess
+    households, and the aggregate age category rates. If replicates are
+    requested, replicate is a further grouping key, such that each ACS PUMS
+    replicate weight (see utils.read_pums_sql) is scaled to the same household
+    control totals.
+
     Args:
-        yr: Increment year
+        years (list[int]): Increment years
+        replicates (bool): If True, calculate rates for each ACS PUMS replicate
+            weight. Defaults to False
 
     Returns:
-        pd.DataFrame: Household characteristics rates broken down by race,
-            sex, and single year of age
+        pd.DataFrame: Household characteristics rates broken down by year,
+            race, sex, and single year of age, and by replicate (0 being the
+            person weight) if replicates are requested
+
+    Raises:
+        ValueError: If an increment year is after the launch year
     """
-    if yr <= utils.LAUNCH_YEAR:
-        # Load SQL queries and apply checks to datasets
-        with utils.SQL_ENGINE.connect() as connection:
-            # Load ACS PUMS persons
-            with open(utils.SQL_FOLDER / "pums_persons.sql", "r") as file:
-                pums_persons_df = pd.read_sql_query(
-                    sql.text(file.read()), connection, params={"yr": yr}
-                )
-        if len(pums_persons_df.index) == 0:
-            raise ValueError(str(yr) + ": not in ACS 5-year PUMS")
-
-        # Get SANDAG Estimates household controls for the increment
-        # Year from the vintage associated with the launch year
-        controls = utils.CONTROLS[str(utils.LAUNCH_YEAR)][str(yr)]["households"]
-
-        # Create mapping of household attributes to ACS PUMS columns and SANDAG Estimates
-        # Include whether attribute is controlled and whether to create crude rate
-        hh_attributes = {
-            "hh": {"col": "pop_hh_head", "control": "total", "rate": None},
-            "laborforce": {
-                "col": "hh_head_lf",
-                "control": None,
-                "rate": "rate_hh_head_lf",
-            },
-            "size1": {"col": "size1", "control": "size1", "rate": "rate_size1"},
-            "size2": {"col": "size2", "control": "size2", "rate": "rate_size2"},
-            "size3": {"col": "size3", "control": "size3", "rate": "rate_size3"},
-            "child1": {"col": "child1", "control": "child1", "rate": "rate_child1"},
-            "senior1": {"col": "senior1", "control": None, "rate": "rate_senior1"},
-            "workers0": {
-                "col": "workers0",
-                "control": "workers0",
-                "rate": "rate_workers0",
-            },
-            "workers1": {
-                "col": "workers1",
-                "control": "workers1",
-                "rate": "rate_workers1",
-            },
-            "workers2": {
-                "col": "workers2",
-                "control": "workers2",
-                "rate": "rate_workers2",
-            },
-            "workers3": {
-                "col": "workers3",
-                "control": "workers3",
-                "rate": "rate_workers3",
-            },
-        }
-
-        # Apply total households scaling factor to all household attributes
-        control_hh = controls["hh"]
-        if control_hh is not None:
-            scale_hh_pct = control_hh / pums_persons_df["pop_hh_head"].sum()
-            for k, v in hh_attributes.items():
-                pums_persons_df[v["col"]] = pums_persons_df[v["col"]] * scale_hh_pct
-        else:
-            logger.warning("No household control total provided.")
-
-        # Apply household characteristics scaling factors and calculate crude rates
-        # Assumed that control totals are consistent with total households control
-        for k, v in hh_attributes.items():
-            if k != "hh":
-                if v["control"] is not None:
-                    control = controls[k]
-                    if control is not None:
-                        scale_pct = control / pums_persons_df[v["col"]].sum()
-                        pums_persons_df[v["col"]] = (
-                            pums_persons_df[v["col"]] * scale_pct
-                        )
-                        # Distribute excess if any characteristic exceeds total households
-                        pums_persons_df[v["col"]] = utils.distribute_excess(
-                            df=pums_persons_df, subset=v["col"], total="pop_hh_head"
-                        )
-                if v["rate"] is not None:
-                    pums_persons_df[v["rate"]] = (
-                        pums_persons_df[v["col"]] / pums_persons_df["pop_hh_head"]
-                    )
-
-        # Calculate rates within age groups to apply when households are < 20 (excluding 0s)
-        age_groups = pd.concat(
-            [
-                pd.DataFrame(data={"age_group": 1, "age": list(range(0, 16))}),
-                pd.DataFrame(data={"age_group": 2, "age": list(range(16, 18))}),
-                pd.DataFrame(data={"age_group": 3, "age": list(range(18, 25))}),
-                pd.DataFrame(data={"age_group": 4, "age": list(range(25, 35))}),
-                pd.DataFrame(data={"age_group": 5, "age": list(range(35, 50))}),
-                pd.DataFrame(data={"age_group": 6, "age": list(range(50, 60))}),
-                pd.DataFrame(data={"age_group": 7, "age": list(range(60, 71))}),
-                # Note maximum age of 99 in defining age groups
-                pd.DataFrame(data={"age_group": 8, "age": list(range(71, 100))}),
-            ],
-            ignore_index=True,
+    # Household characteristics rates are not calculated after the launch year
+    if max(years) > utils.LAUNCH_YEAR:
+        raise ValueError(
+            "Household characteristics rates not calculated past launch year"
         )
 
-        age_rates = (
-            pums_persons_df.merge(right=age_groups, how="left", on="age")
-            .groupby(["race", "sex", "age_group"])
-            .sum()
+    # Load ACS PUMS persons and apply checks to dataset
+    pums_persons_df = utils.read_pums_persons(years=years, replicates=replicates)
+
+    # Rates are calculated within year and, if requested, replicate
+    keys = ["year", "replicate"] if replicates else ["year"]
+
+    # Get SANDAG Estimates household controls for the increment
+    # Years from the vintage associated with the launch year
+    controls = utils.get_controls(years=years, category="households")
+    cols = [v["col"] for v in HH_ATTRIBUTES.values()]
+    rate_map = {v["col"]: v["rate"] for v in HH_ATTRIBUTES.values() if v["rate"]}
+    rates = list(rate_map.values())
+
+    # Apply total households scaling factor to all household attributes
+    control_hh = pums_persons_df["year"].map(controls["hh"])
+    scale_hh_pct = control_hh / pums_persons_df.groupby(keys)["pop_hh_head"].transform(
+        "sum"
+    )
+    pums_persons_df[cols] = pums_persons_df[cols].mul(
+        scale_hh_pct.fillna(1), axis="index"
+    )
+    for yr in controls.index[controls["hh"].isna()]:
+        logger.warning(f"{yr}: No household control total provided.")
+
+    # Apply household characteristics scaling factors
+    # Assumed that control totals are consistent with total households control
+    controlled = [
+        v["col"]
+        for k, v in HH_ATTRIBUTES.items()
+        if k != "hh" and v["control"] is not None and controls[k].notna().any()
+    ]
+    if len(controlled) > 0:
+        control = controls.loc[pums_persons_df["year"], controlled].to_numpy()
+        scale_pct = control / pums_persons_df.groupby(keys)[controlled].transform("sum")
+        pums_persons_df[controlled] = (pums_persons_df[controlled] * scale_pct).where(
+            ~np.isnan(control), pums_persons_df[controlled]
         )
 
-        for k, v in hh_attributes.items():
-            if k != "hh":
-                age_rates[v["rate"] + "_age"] = (
-                    age_rates[v["col"]] / age_rates["pop_hh_head"]
-                )
-
-        # Merge Age Group Rates into the Rate DataFrame
-        pums_persons_df = pums_persons_df.merge(
-            right=age_groups, how="left", on="age"
-        ).merge(right=age_rates, on=["race", "sex", "age_group"], suffixes=["", "_y"])
-
-        # Set Rate to Age Group Rate if households < 20 (excluding 0s)
-        for k, v in hh_attributes.items():
-            if k != "hh":
-                if v["rate"] is not None:
-                    pums_persons_df[v["rate"]] = np.where(
-                        (pums_persons_df["pop_hh_head"] > 0)
-                        & (pums_persons_df["pop_hh_head"] < 20),
-                        pums_persons_df[v["rate"] + "_age"],
-                        pums_persons_df[v["rate"]],
-                    )
-
-        # Ensure rates do not sum > 1 within logical groupings (size and workers)
-        groupings = [
-            ["rate_size1", "rate_size2", "rate_size3"],
-            ["rate_workers0", "rate_workers1", "rate_workers2", "rate_workers3"],
-        ]
-
-        for group in groupings:
-            pums_persons_df[group] = utils.adjust_sum(
-                df=pums_persons_df, cols=group, sum=1, option="equals"
-            )
-
-        # Return crude household characteristics rates
-        rates = []
-        for k, v in hh_attributes.items():
-            if v["rate"] is not None:
-                rates.append(v["rate"])
-
-        return pums_persons_df[["race", "sex", "age", *rates]]
+        # Distribute excess if any characteristic exceeds total households
+        pums_persons_df[controlled] = utils.distribute_excess(
+            df=pums_persons_df, subset=controlled, total="pop_hh_head", by=keys
+        )
 
-    # Household characteristics rates are not calculated after the launch year
-    else:
-        raise ValueError(
-            "Household characteristics rates not calculated past launch year"
+    # Calculate crude rates
+    crude = pums_persons_df[list(rate_map)].div(
+        pums_persons_df["pop_hh_head"], axis="index"
+    )
+
+    # Calculate rates within age groups to apply when households are < 20 (excluding 0s)
+    pums_persons_df["age_group"] = np.digitize(pums_persons_df["age"], AGE_GROUP_BREAKS)
+    age_totals = pums_persons_df.groupby([*keys, "race", "sex", "age_group"])[
+        cols
+    ].transform("sum")
+    crude_age = age_totals[list(rate_map)].div(age_totals["pop_hh_head"], axis="index")
+
+    # Set Rate to Age Group Rate if households < 20 (excluding 0s)
+    small = (pums_persons_df["pop_hh_head"] > 0) & (pums_persons_df["pop_hh_head"] < 20)
+    pums_persons_df[rates] = np.where(
+        small.to_numpy()[:, np.newaxis], crude_age.to_numpy(), crude.to_numpy()
+    )
+
+    # Ensure rates do not sum > 1 within logical groupings (size and workers)
+    groupings = [
+        ["rate_size1", "rate_size2", "rate_size3"],
+        ["rate_workers0", "rate_workers1", "rate_workers2", "rate_workers3"],
+    ]
+
+    for group in groupings:
+        pums_persons_df[group] = utils.adjust_sum(
+            df=pums_persons_df, cols=group, sum=1, option="equals"
         )
+
+    # Return crude household characteristics rates
+    return pums_persons_df[[*keys, "race", "sex", "age", *rates]].sort_values(
+        by=[*keys, "race", "sex", "age"], ignore_index=True
+    )
+
+
+def get_hh_characteristic_rates(yr: int) -> pd.DataFrame:
+    """Generate household characteristics rates broken down by race, sex, and
+    single year of age.
+
+    See get_hh_characteristic_rates_batch for the calculation of household
+    characteristics rates.
+
+    Args:
+        yr: Increment year
+
+    Returns:
+        pd.DataFrame: Household characteristics rates broken down by race,
+            sex, and single year of age
+    """
+    return get_hh_characteristic_rates_batch(years=[yr]).drop(columns="year")
@@ -2,12 +2,18 @@
 
 # TODO: (5-feature) Potentially implement smoothing function within race and sex categories.
 
+import logging
+
 import numpy as np
 import pandas as pd
-import sqlalchemy as sql
 
 import python.utils as utils
 
+logger = logging.getLogger(__name__)
+
+# Launch year migration rates held for the post-launch increments
+_LAUNCH_YEAR_RATES = {}
+
 
 def get_migration_rates(yr: int, pop_df: pd.DataFrame) -> pd.DataFrame:
     """Create migration rates broken down by race, sex, and single year of age.
@@ -18,8 +24,11 @@ def get_migration_rates(yr: int, pop_df: pd.DataFrame) -> pd.DataFrame:
     rates at 20% within each category removing active-duty military population
     from the calculation.
 
-    Post launch year, the launch year migration rates are scaled to match
-    asserted migration control totals for ins/outs if they are provided.
+    Post launch year, the launch year migration rates are returned. The
+    launch year migration rates are calculated once, in the launch year
+    increment, and held for all post-launch increments. If migration control
+    totals for ins/outs are provided, the held rates are solved to the
+    control totals within the annual cycle (see solve_migration_rates).
 
     Args:
         yr: Increment year
@@ -38,53 +47,92 @@ def get_migration_rates(yr: int, pop_df: pd.DataFrame) -> pd.DataFrame:
             cap_rates=0.2,
         )
 
+        # Hold the launch year migration rates for the post-launch increments
+        if yr == utils.LAUNCH_YEAR:
+            _LAUNCH_YEAR_RATES[yr] = rates.copy()
+
     # Migration rates are not calculated after the launch year
-    # Post-launch rates are controlled to annual in/out totals if provided
-    # TODO: Re-calculating every increment post launch is inefficient
+    # Post-launch rates are solved to annual in/out totals in the annual cycle
     else:
-
-        if utils.MIGRATION_CONTROLS is not None:
-            rates = calculate_migration_rates(
+        if utils.LAUNCH_YEAR not in _LAUNCH_YEAR_RATES:
+            logger.warning(
+                "Launch year migration rates not held, calculating from the "
+                + str(yr)
+                + " population"
+            )
+            _LAUNCH_YEAR_RATES[utils.LAUNCH_YEAR] = calculate_migration_rates(
                 yr=utils.LAUNCH_YEAR,
                 pop_df=pop_df,
                 cap_rates=0.2,
             )
 
-            rates = control_migration_rates(yr=yr, pop_df=pop_df, rates=rates)
+        rates = _LAUNCH_YEAR_RATES[utils.LAUNCH_YEAR].copy()
 
     return rates
 
 
+def hold_launch_year_rates(rates: pd.DataFrame) -> None:
+    """Hold migration rates as the launch year migration rates.
+
+    Used when the annual cycle starts after the launch year (e.g. from a rates
+    bundle) so the launch year migration rates are not re-calculated.
+
+    Args:
+        rates (pd.DataFrame): Launch year migration rates by race, sex, and
+            age
+    """
+    _LAUNCH_YEAR_RATES[utils.LAUNCH_YEAR] = rates.copy()
+
+
+def get_launch_year_rates() -> pd.DataFrame | None:
+    """Get the held launch year migration rates, None if not yet held."""
+    if utils.LAUNCH_YEAR in _LAUNCH_YEAR_RATES:
+        return _LAUNCH_YEAR_RATES[utils.LAUNCH_YEAR].copy()
+    else:
+        return None
+
+
 def calculate_migration_rates(
     yr: int,
     pop_df: pd.DataFrame,
     cap_rates: float,
+    replicates: bool = False,
 ) -> pd.DataFrame:
     """Calculate migration rates for a specific source year.
 
+    If replicates are requested, the migrants of each ACS PUMS replicate
+    weight (see utils.read_pums_sql) are divided by the same population.
+
     Args:
         yr: Source year for ACS PUMS migrants query
         pop_df (pd.DataFrame): Population data by race, sex, and age
         cap_rates (float): Maximum allowed migration rate (e.g., 0.2 for 20%)
+        replicates (bool): If True, calculate rates for each ACS PUMS replicate
+            weight. Defaults to False
 
     Returns:
-        pd.DataFrame: Migration rates by race, sex, and age
+        pd.DataFrame: Migration rates by race, sex, and age, and by replicate
+            (0 being the person weight) if replicates are requested
     """
     if cap_rates <= 0 or cap_rates >= 1:
         raise ValueError("cap_rates parameter must be between 0 and 1")
 
-    with utils.SQL_ENGINE.connect() as connection:
-        with open(utils.SQL_FOLDER / "pums_migrants.sql", "r") as file:
-            pums_migrants_df = pd.read_sql_query(sql.text(file.read()), connection, 
-                                                 params={"yr": yr})
-        if len(pums_migrants_df.index) == 0:
-            raise ValueError(str(yr) + ": not in ACS PUMS in/out migrants")
+    pums_migrants_df = utils.read_pums_sql(
+        "pums_migrants.sql", yr=yr, replicates=replicates
+    )
+    if len(pums_migrants_df.index) == 0:
+        raise ValueError(str(yr) + ": not in ACS PUMS in/out migrants")
+
+    # Rates are calculated within replicate if requested
+    keys = ["replicate", "race", "sex", "age"] if replicates else ["race", "sex", "age"]
+    if replicates:
+        pop_df = utils.expand_replicates(pop_df)
 
     df = (
         pop_df.merge(
             right=pums_migrants_df,
             how="left",
-            on=["race", "sex", "age"],
+            on=keys,
         )
         .assign(pop_civ=lambda x: x["pop"] - x["pop_mil"])
         .assign(
@@ -113,64 +161,122 @@ def calculate_migration_rates(
     df["rate_in"] = np.where(df["rate_in"] > cap_rates, cap_rates, df["rate_in"])
     df["rate_out"] = np.where(df["rate_out"] > cap_rates, cap_rates, df["rate_out"])
 
-    return df[["race", "sex", "age", "rate_in", "rate_out"]]
+    return df[[*keys, "rate_in", "rate_out"]]
 
 
-def control_migration_rates(
+def solve_migration_rates(
     yr: int,
     pop_df: pd.DataFrame,
     rates: pd.DataFrame,
     cap_rates: float = 0.2,
-) -> pd.DataFrame:
-    """Control migration rates to in/out migration control totals.
-
-    Calculates the total in/out migrants from input rates and population and
-    scales migration rates to match input in/out migration control totals.
-    Note this uses the civilian population as opposed to the survived civilian
-    population whereas migration rates are applied to the survived civilian
-    population to get true in/out migrants. This difference, combined with
-    capping maximum rates within age/sex/ethnicity categories post-scaling
-    will lead to a discrepancy between the controlled rates and the actual
-    in/migrants control totals.
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Solve migration rates matching in/out migration control totals exactly.
+
+    Rates are controlled against the survived civilian population they are
+    applied to, where the survived civilian population ages +1 and is assigned
+    the migration rates of the next single year of age. Within in and out
+    migration, the uncapped rates are scaled by a single factor and capped at
+    cap_rates, where the factor is chosen such that the expected in/out
+    migrants equal the control totals. This is the result of iteratively
+    capping rates and re-scaling the uncapped rates until no rate exceeds the
+    cap, which is solved in a single pass by utils.distribute_excess_2d.
+
+    If a control total exceeds the migrants possible with every non-zero rate
+    capped, all non-zero rates are set to the cap and the control total is not
+    reached.
 
     Args:
         yr: Increment year
-        pop_df (pd.DataFrame): Population data by race, sex, and age
+        pop_df (pd.DataFrame): Population data broken down by race, sex, and
+            single year of age with the military population broken out from
+            the total population and calculated deaths (see calculate_deaths)
         rates (pd.DataFrame): Migration rates by race, sex, and age
         cap_rates (float): Maximum allowed migration rate (e.g., 0.2 for 20%)
 
     Returns:
-        pd.DataFrame: Migration rates controlled to in/out migrant totals by
-            race, sex, and age
+        tuple[pd.DataFrame, pd.DataFrame]: Migration rates controlled to
+            in/out migrant totals by race, sex, and age, and a convergence
+            report with the control total, expected total, number of capped
+            categories, number of iterations the iterative approach requires,
+            and whether the expected total is within one person of the control
+            total for ins and outs
     """
     if cap_rates <= 0 or cap_rates >= 1:
         raise ValueError("cap_rates parameter must be between 0 and 1")
 
-    # Check the controls DataFrame is valid and return controls for the given year
-    controls = utils.MIGRATION_CONTROLS.loc[utils.MIGRATION_CONTROLS["year"] == yr]
+    # Look up the in/out control totals for the given year
+    controls = utils.MIGRATION_CONTROLS.loc[yr, ["ins", "outs"]].to_numpy(
+        dtype=np.float64
+    )
 
-    # Calculate the total in/out migrants from the rates and population
-    # Note this uses the civilian population as opposed to the survived civilian population
-    # Migration rates are applied to the survived civilian population to get true in/out migrants
-    # Therefore this, along with the capped rates, will lead to a discrepancy
-    # between the controlled rates and the actual in/out migrants
-    df = (
-        pop_df[["race", "sex", "age", "pop", "pop_mil"]]
-        .merge(rates, how="left", on=["race", "sex", "age"])
-        .fillna(0)
+    # Survived civilian population assigned the migration rates of each
+    # Race, sex, and single year of age category after aging +1
+    exposure = (
+        pop_df[["race", "sex", "age", "pop", "pop_mil", "deaths"]]
         .assign(
-            pop_civ=lambda x: x["pop"] - x["pop_mil"],
-            ins=lambda x: x["rate_in"] * x["pop_civ"],
-            outs=lambda x: x["rate_out"] * x["pop_civ"],
+            pop_civ_surv=lambda x: x["pop"] - x["pop_mil"] - x["deaths"],
+            age=lambda x: np.clip(a=(x["age"] + 1), a_min=None, a_max=99),
         )
+        .groupby(["race", "sex", "age"], as_index=False)["pop_civ_surv"]
+        .sum()
+    )
+    df = rates[["race", "sex", "age", "rate_in", "rate_out"]].merge(
+        right=exposure, how="left", on=["race", "sex", "age"]
+    )
+    pop_civ_surv = df["pop_civ_surv"].fillna(0).to_numpy(dtype=np.float64)
+    values = df[["rate_in", "rate_out"]].fillna(0).to_numpy(dtype=np.float64)
+
+    # Scale the expected ins/outs to the control totals and cap the migrants
+    # At the cap_rates value, distributing the excess to the uncapped categories
+    # Categories able to receive migrants are capped if the control totals
+    # Exceed their capacity
+    migrants = values * pop_civ_surv[:, np.newaxis]
+    capacity = np.where(migrants > 0, cap_rates * pop_civ_surv[:, np.newaxis], 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        migrants = np.nan_to_num(migrants * (controls / migrants.sum(axis=0)))
+    feasible = (capacity.sum(axis=0) > controls) | np.isclose(
+        capacity.sum(axis=0), controls
+    )
+    migrants[:, ~feasible] = capacity[:, ~feasible]
+    migrants, iterations = utils.distribute_excess_2d(
+        subset=migrants, total=cap_rates * pop_civ_surv
     )
 
-    # Scale the rates such that the ins/outs match the control totals
-    df["rate_in"] = df["rate_in"] * (controls["ins"].sum() / df["ins"].sum())
-    df["rate_out"] = df["rate_out"] * (controls["outs"].sum() / df["outs"].sum())
+    # Convert the controlled migrants back to rates
+    # Keeping the rates of categories with no survived civilian population
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(
+            pop_civ_surv[:, np.newaxis] > 0,
+            migrants / pop_civ_surv[:, np.newaxis],
+            values,
+        )
+    values = np.minimum(values, cap_rates)
+
+    # Report the convergence of the expected ins/outs to the control totals
+    exposed = pop_civ_surv[:, np.newaxis] > 0
+    report = pd.DataFrame(
+        data={
+            "control": controls,
+            "total": (values * pop_civ_surv[:, np.newaxis]).sum(axis=0),
+            "capped": ((values >= cap_rates) & exposed).sum(axis=0),
+            "iterations": iterations,
+        },
+        index=pd.Index(["ins", "outs"], name="component"),
+    ).assign(converged=lambda x: (x["total"] - x["control"]).abs() <= 1)
+
+    for component, row in report.iterrows():
+        message = (
+            f"{yr} {component}: control={row['control']:,.0f}, "
+            f"expected={row['total']:,.1f}, capped={row['capped']}, "
+            f"iterations={row['iterations']}"
+        )
+        if row["converged"]:
+            logger.info("Migration controls solved for " + message)
+        else:
+            logger.warning("Migration controls not reached for " + message)
 
-    # Cap crude migration rates at the specified cap_rates value
-    df["rate_in"] = np.where(df["rate_in"] > cap_rates, cap_rates, df["rate_in"])
-    df["rate_out"] = np.where(df["rate_out"] > cap_rates, cap_rates, df["rate_out"])
+    rates = df[["race", "sex", "age"]].assign(
+        rate_in=values[:, 0], rate_out=values[:, 1]
+    )
 
-    return df[["race", "sex", "age", "rate_in", "rate_out"]]
+    return rates, report
@@ -0,0 +1,334 @@
+"""Monte Carlo replicates of the post-launch annual cycle.
+
+Replicates are run from the checkpoints of a completed run, applying the rates
+of each post-launch increment with random draws for deaths, births, and
+migration (see annual_cycle.increment_replicates). Replicates are run in
+batches, vectorized within a batch, spread over a pool of worker processes,
+and summarized as batches complete (see aggregation.StreamingSummary).
+
+Run after a completed run of the model using:
+    python -m python.monte_carlo --replicates 1000
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import logging
+import multiprocessing.shared_memory
+import os
+import shutil
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+import python.utils as utils
+
+from python.aggregation import QUANTILES, StreamingSummary
+from python.annual_cycle import increment_replicates
+from python.checkpoint import load_completed_run
+from python.cohort_engine import CohortGrid
+
+logger = logging.getLogger(__name__)
+
+# Monte Carlo outputs are stored next to the model outputs
+MONTE_CARLO_FOLDER = utils.OUTPUT_FOLDER / "monte_carlo"
+
+# Number of replicates vectorized within each worker task
+BATCH_SIZE = 100
+
+# Maximum number of worker processes
+MAX_WORKERS = os.cpu_count() or 1
+
+# Components of change and population recorded for each replicate
+OUTPUTS = ["pop", "deaths", "births", "ins", "outs"]
+
+# Outputs with quantile estimates in the summary tables
+# Quantiles of the components of change are not estimated as updating the
+# Quantile estimates is the most expensive step of the summaries
+QUANTILE_OUTPUTS = ["pop"]
+
+# Rates applied in each increment by rate type
+RATES = {
+    "deaths": ["rate_death"],
+    "births": ["rate_birth"],
+    "migration": ["rate_in", "rate_out"],
+}
+
+# Read-only arrays shared with the worker processes, set by _attach_arrays
+_SHARED = {}
+
+
+def _share_arrays(
+    arrays: dict[str, np.ndarray],
+) -> tuple[multiprocessing.shared_memory.SharedMemory, dict]:
+    """Copy arrays into a single block of shared memory.
+
+    Returns the shared memory block, which must be closed and unlinked by the
+    caller, and the offset, shape, and data type of each array in the block.
+    """
+    shm = multiprocessing.shared_memory.SharedMemory(
+        create=True, size=max(sum(x.nbytes for x in arrays.values()), 1)
+    )
+
+    spec = {}
+    offset = 0
+    for k, v in arrays.items():
+        np.ndarray(v.shape, dtype=v.dtype, buffer=shm.buf, offset=offset)[:] = v
+        spec[k] = (offset, v.shape, v.dtype.str)
+        offset += v.nbytes
+
+    return shm, spec
+
+
+def _attach_arrays(name: str, spec: dict, grid: CohortGrid) -> None:
+    """Attach a worker process to the arrays in shared memory, exposing them
+    read-only through _SHARED."""
+    shm = multiprocessing.shared_memory.SharedMemory(name=name)
+
+    _SHARED.clear()
+    _SHARED["shm"] = shm
+    _SHARED["grid"] = grid
+    for k, (offset, shape, dtype) in spec.items():
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        _SHARED[k] = array
+
+
+def _run_batch(seed: np.random.SeedSequence, replicates: int) -> dict[str, np.ndarray]:
+    """Run a batch of replicates through the post-launch increments.
+
+    Args:
+        seed (np.random.SeedSequence): Independent seed of the batch
+        replicates (int): Number of replicates in the batch
+
+    Returns:
+        dict[str, np.ndarray]: Population entering each increment ("pop") and
+            the components of change of each increment ("deaths", "births",
+            "ins", "outs") of shape (replicate, year, race, sex, age)
+    """
+    grid = _SHARED["grid"]
+    generator = np.random.default_rng(seed)
+    n_years = _SHARED["rate_death"].shape[0]
+
+    pop = np.repeat(_SHARED["pop"][np.newaxis], replicates, axis=0)
+    pop_mil = np.repeat(_SHARED["pop_mil"][np.newaxis], replicates, axis=0)
+
+    results = {
+        k: np.empty((replicates, n_years, *grid.shape), dtype=np.int32) for k in OUTPUTS
+    }
+    for i in range(n_years):
+        increment = increment_replicates(
+            grid=grid,
+            pop=pop,
+            pop_mil=pop_mil,
+            rates={k: _SHARED[k][i] for v in RATES.values() for k in v},
+            generator=generator,
+        )
+
+        results["pop"][:, i] = pop
+        for k in OUTPUTS[1:]:
+            results[k][:, i] = increment[k]
+        pop, pop_mil = increment["pop"], increment["pop_mil"]
+
+    return results
+
+
+def run_replicates(
+    pop_df: pd.DataFrame,
+    rates: dict[int, dict],
+    replicates: int,
+    batch_size: int = BATCH_SIZE,
+    max_workers: int = MAX_WORKERS,
+    seed: int = utils.RANDOM_SEED,
+) -> Iterator[tuple[int, dict[str, np.ndarray]]]:
+    """Run Monte Carlo replicates of the post-launch annual cycle.
+
+    The population and rates are copied once into shared memory and attached
+    read-only by each worker process rather than being sent with each batch.
+    Each batch draws from an independent stream spawned from a SeedSequence
+    of the seed, so results are reproducible for a given seed and batch size.
+    Batches are yielded in replicate order and the number of batches in
+    flight is bounded, such that memory use does not grow with the number of
+    replicates.
+
+    Args:
+        pop_df (pd.DataFrame): Population entering the first post-launch
+            increment broken down by race, sex, and single year of age with
+            the military population broken out from the total population
+        rates (dict[int, dict]): Dictionary containing death, birth, and
+            migration rates by race, sex, and single year of age for each
+            post-launch increment year
+        replicates (int): Number of replicates
+        batch_size (int): Number of replicates vectorized within each worker
+            task. Defaults to BATCH_SIZE
+        max_workers (int): Maximum number of worker processes. Defaults to
+            MAX_WORKERS
+        seed (int): Seed of the SeedSequence. Defaults to utils.RANDOM_SEED
+
+    Yields:
+        tuple[int, dict[str, np.ndarray]]: Index of the first replicate of a
+            batch and its results (see _run_batch), in replicate order
+    """
+    grid = CohortGrid.from_df(pop_df)
+    years = sorted(rates)
+
+    arrays = {
+        "pop": grid.to_array(pop_df, "pop").astype(np.int64),
+        "pop_mil": grid.to_array(pop_df, "pop_mil").astype(np.int64),
+    }
+    for rate, cols in RATES.items():
+        for col in cols:
+            arrays[col] = np.stack(
+                [grid.to_array(rates[yr][rate], col) for yr in years]
+            ).astype(np.float64)
+
+    # Split replicates into batches with an independent seed for each batch
+    sizes = [min(batch_size, replicates - x) for x in range(0, replicates, batch_size)]
+    firsts = list(range(0, replicates, batch_size))
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    logger.info(
+        f"Running {replicates} replicates for {len(years)} years in "
+        f"{len(sizes)} batches using {max_workers} processes"
+    )
+    shm, spec = _share_arrays(arrays)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_attach_arrays,
+            initargs=(shm.name, spec, grid),
+        ) as executor:
+            # Batches are yielded in replicate order, keeping at most two
+            # Batches in flight per worker process
+            batches = iter(zip(firsts, seeds, sizes))
+            pending = collections.deque()
+            while True:
+                for first, batch_seed, size in batches:
+                    future = executor.submit(
+                        _run_batch, seed=batch_seed, replicates=size
+                    )
+                    pending.append((first, future))
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if len(pending) == 0:
+                    break
+
+                first, future = pending.popleft()
+                yield first, future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def summarize_replicates(
+    summaries: dict[str, StreamingSummary], grid: CohortGrid, years: list[int]
+) -> dict[str, pd.DataFrame]:
+    """Create the summary tables of the Monte Carlo replicates.
+
+    Args:
+        summaries (dict[str, StreamingSummary]): Running summaries of each
+            output (see OUTPUTS) of shape (year, race, sex, age)
+        grid (CohortGrid): Race, sex, and single year of age grid
+        years (list[int]): Increment years of the summaries
+
+    Returns:
+        dict[str, pd.DataFrame]: Population ("population") and components of
+            change ("components") summaries by year, race, sex, and single
+            year of age, with the mean ("_mean"), standard deviation ("_sd"),
+            and for the population quantile estimates (e.g. "_p05") of each
+            output
+    """
+    index = grid.index.to_frame(index=False)
+    index = pd.concat([index.assign(year=yr) for yr in years], ignore_index=True)
+    index = index[["year", "race", "sex", "age"]]
+
+    tables = {}
+    for name, cols in {
+        "population": ["pop"],
+        "components": ["deaths", "births", "ins", "outs"],
+    }.items():
+        df = index.copy()
+        for col in cols:
+            df[col + "_mean"] = summaries[col].mean().reshape(-1)
+            df[col + "_sd"] = summaries[col].std().reshape(-1)
+            if col in QUANTILE_OUTPUTS:
+                for q, values in zip(QUANTILES, summaries[col].quantiles()):
+                    df[f"{col}_p{round(q * 100):02d}"] = values.reshape(-1)
+        tables[name] = df
+
+    return tables
+
+
+def run_monte_carlo(
+    replicates: int, batch_size: int = BATCH_SIZE, max_workers: int = MAX_WORKERS
+) -> None:
+    """Run Monte Carlo replicates from the checkpoints of the completed run
+    and write their summary tables to the Monte Carlo output folder.
+
+    Args:
+        replicates (int): Number of replicates
+        batch_size (int): Number of replicates vectorized within each worker
+            task. Defaults to BATCH_SIZE
+        max_workers (int): Maximum number of worker processes. Defaults to
+            MAX_WORKERS
+    """
+    pop_df, rates = load_completed_run()
+    grid = CohortGrid.from_df(pop_df)
+    years = sorted(rates)
+
+    # Summaries are updated as batches complete, so only the summary tables
+    # Are held in memory and written regardless of the number of replicates
+    summaries = {
+        k: StreamingSummary(
+            shape=(len(years), *grid.shape),
+            quantiles=QUANTILES if k in QUANTILE_OUTPUTS else [],
+        )
+        for k in OUTPUTS
+    }
+    for _, results in run_replicates(
+        pop_df=pop_df,
+        rates=rates,
+        replicates=replicates,
+        batch_size=batch_size,
+        max_workers=max_workers,
+    ):
+        for k, summary in summaries.items():
+            summary.update(results[k])
+        logger.info(f"Completed {summaries['pop'].count} of {replicates} replicates")
+
+    shutil.rmtree(MONTE_CARLO_FOLDER, ignore_errors=True)
+    MONTE_CARLO_FOLDER.mkdir(parents=True)
+    for name, df in summarize_replicates(
+        summaries=summaries, grid=grid, years=years
+    ).items():
+        df.to_csv(MONTE_CARLO_FOLDER / (name + "_summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run Monte Carlo replicates of the post-launch annual cycle."
+    )
+    parser.add_argument(
+        "--replicates", type=int, required=True, help="number of replicates"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="number of replicates vectorized within each worker task",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="maximum number of worker processes",
+    )
+    args = parser.parse_args()
+
+    run_monte_carlo(
+        replicates=args.replicates,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+    )
+    logger.info("Completed")
@@ -17,8 +17,9 @@ class InputParser:
         comments (str): Any comments associated with the current run
         controls (dict): Mapping of control totals for each year
         migration_controls (pd.DataFrame | None): Optional migration control totals (ins/outs)
-            for each post-launch increment year. If not provided, set to None.
+            indexed by each post-launch increment year. If not provided, set to None.
         load_to_database (bool): Whether to load the run results into a database.
+        query_cache (dict): Settings of the on-disk SQL query results cache
 
     Methods:
         parse_config(): Control function
@@ -29,6 +30,8 @@ class InputParser:
             sets the controls attribute
         _parse_migration_controls(): Parses the migration controls mapping from the
             configuration file and sets the migration_controls attribute
+        _parse_query_cache(): Parses the query cache settings from the
+            configuration file and sets the query_cache attribute
     """
 
     def __init__(self, config: dict) -> None:
@@ -42,13 +45,15 @@ class InputParser:
         self.controls = {}
         self.migration_controls = None
         self.load_to_database = None
+        self.query_cache = {}
 
     def parse_config(self) -> None:
         """Control flow to parse the runtime configuration.
 
         First, the contents of the configuration file are validated. Then, the
         base, launch, and horizon years are set along with the software version
-        and any comments. Finally, the controls totals and optional migration control totals are parsed and set."""
+        and any comments. Finally, the controls totals, optional migration control totals,
+        and query cache settings are parsed and set."""
         self._validate_config()
         _interval = self._parse_interval()
         self.base_year = _interval["base_year"]
@@ -61,6 +66,7 @@ class InputParser:
         self.load_to_database = self._config.get("sql", {}).get(
             "load_to_database", False
         )
+        self.query_cache = self._parse_query_cache()
 
     def _validate_config(self) -> None:
         """Validate the contents of the configuration dictionary."""
@@ -88,7 +94,19 @@ class InputParser:
             },
             "sql": {
                 "type": "dict",
-                "schema": {"load_to_database": {"type": "boolean"}},
+                "schema": {
+                    "load_to_database": {"type": "boolean"},
+                    "cache": {
+                        "type": "dict",
+                        "schema": {
+                            "enabled": {"type": "boolean"},
+                            "folder": {"type": "string"},
+                            "max_age": {"type": "number", "min": 0, "nullable": True},
+                            "offline": {"type": "boolean"},
+                            "refresh": {"type": "boolean"},
+                        },
+                    },
+                },
             },
         }
 
@@ -188,4 +206,26 @@ class InputParser:
         ):
             raise ValueError("Migration controls must contain all post-launch years")
 
-        return migration_controls
+        # Index the controls by year to look up the control totals of a year
+        return migration_controls.set_index("year").sort_index()
+
+    def _parse_query_cache(self) -> dict:
+        """Parse the query cache settings from the configuration file."""
+        query_cache = dict(self._config["sql"]["cache"])
+
+        # Resolve the cache folder relative to the project root
+        folder = pathlib.Path(query_cache["folder"])
+        if not folder.is_absolute():
+            folder = pathlib.Path(__file__).resolve().parent.parent / folder
+        query_cache["folder"] = folder
+
+        # Offline mode reads from the cache only and never connects to SQL
+        if query_cache["offline"]:
+            if not query_cache["enabled"]:
+                raise ValueError("Offline mode requires the query cache be enabled")
+            if query_cache["refresh"]:
+                raise ValueError("Offline mode cannot refresh the query cache")
+            if self._config["sql"]["load_to_database"]:
+                raise ValueError("Offline mode cannot load to database")
+
+        return query_cache
@@ -0,0 +1,123 @@
+"""Prefetch model inputs that do not depend on the projected population."""
+
+import concurrent.futures
+import logging
+
+import pandas as pd
+
+import python.utils as utils
+
+from python.input_modules.active_duty_military import load_military_controls
+from python.input_modules.birth_rates import get_birth_rates
+from python.input_modules.death_rates import SD_POPULATION_YEAR, get_death_rates_batch
+from python.input_modules.formation_rates import get_formation_rates_batch
+from python.input_modules.hh_characteristics_rates import (
+    get_hh_characteristic_rates_batch,
+)
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of threads used to prefetch inputs
+# Kept below the default size of the SQLAlchemy connection pool (5)
+MAX_WORKERS = 4
+
+
+def prefetch_inputs(
+    years: list[int], max_workers: int = MAX_WORKERS, base_yr: bool = True
+) -> dict[int, dict[str, pd.DataFrame]]:
+    """Prefetch the inputs for the base year up to the launch year that do not
+    depend on the projected population.
+
+    Birth rates are calculated for each year, formation and household
+    characteristics rates are built in a single batch for all years, death
+    rates are built in a single batch for years prior to SD_POPULATION_YEAR,
+    the active-duty military control sources are loaded and validated, and
+    the SQL queries used by the population dependent inputs (base year
+    population, CDC WONDER and UN DESA mortality, and ACS PUMS migrants) are
+    run, on a bounded thread pool using pooled SQL connections. Query results
+    are memoized by utils.read_sql_file, such that the annual cycle only waits
+    on the calculations that depend on the projected population.
+
+    Args:
+        years (list[int]): Increment years up to the launch year
+        max_workers (int): Maximum number of threads. Defaults to MAX_WORKERS
+        base_yr (bool): Whether to run the SQL queries of the base year
+            population, set to False when re-using a stored base year.
+            Defaults to True
+
+    Returns:
+        dict[int, dict[str, pd.DataFrame]]: Birth ("births"), formation
+            ("formation_gq_hh"), and household characteristics
+            ("hh_characteristics") rates for each increment year, and death
+            ("deaths") rates for years not requiring the projected population
+    """
+    # SQL queries warmed for the population dependent inputs
+    queries = []
+    if base_yr:
+        queries += [
+            ("dof_estimates.sql", None, None),
+            ("dof_projections.sql", None, None),
+            ("census_p5.sql", None, None),
+        ]
+    for yr in years:
+        queries += [
+            ("pums_persons.sql", {"yr": yr, "replicates": 0}, None),
+            ("pums_migrants.sql", {"yr": yr, "replicates": 0}, None),
+            ("mortality/cdc_wonder_mortality.sql", {"year": yr}, 1),
+            ("mortality/cdc_wonder_mortality_inflation.sql", {"year": yr}, 1),
+            ("mortality/undesa_survivors.sql", {"year": yr}, None),
+        ]
+
+    # Rates calculated in a single batch for all years
+    batch_functions = {
+        "formation_gq_hh": get_formation_rates_batch,
+        "hh_characteristics": get_hh_characteristic_rates_batch,
+    }
+
+    logger.info(
+        f"Prefetching inputs for {len(years)} years using {max_workers} threads"
+    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Submit the rate calculations first as they take the longest
+        batch_futures = {
+            k: executor.submit(v, years=years) for k, v in batch_functions.items()
+        }
+        birth_futures = {yr: executor.submit(get_birth_rates, yr=yr) for yr in years}
+        military_future = executor.submit(load_military_controls, years=years)
+        death_years = [yr for yr in years if yr < SD_POPULATION_YEAR]
+        if len(death_years) > 0:
+            death_future = executor.submit(get_death_rates_batch, years=death_years)
+        query_futures = [
+            executor.submit(
+                utils.read_sql_file,
+                file_name=file_name,
+                params=params,
+                max_lookback=max_lookback,
+            )
+            for file_name, params, max_lookback in queries
+        ]
+
+        # Raise any exception encountered while prefetching
+        for future in [*query_futures, military_future]:
+            future.result()
+
+        rates = {
+            yr: {"births": future.result()} for yr, future in birth_futures.items()
+        }
+
+        # Slice the batches of rates by year
+        batches = {k: (years, future) for k, future in batch_futures.items()}
+        if len(death_years) > 0:
+            batches["deaths"] = (death_years, death_future)
+        for k, (batch_years, future) in batches.items():
+            batch = future.result()
+            for yr in batch_years:
+                rates[yr][k] = (
+                    batch[batch["year"] == yr]
+                    .drop(columns="year")
+                    .reset_index(drop=True)
+                )
+
+    logger.info("Prefetched inputs")
+
+    return rates
@@ -1,9 +1,14 @@
 """This module contains generic utilities."""
 
+import hashlib
+import json
 import logging
 import math
+import multiprocessing
 import os.path
 import pathlib
+import threading
+import time
 import yaml
 
 import numpy as np
@@ -35,8 +40,11 @@ _console_handler = logging.StreamHandler()
 _console_handler.setLevel(logging.INFO)
 
 # Create a file handler
+# Worker processes append to the log file of the main process
 _file_handler = logging.FileHandler(
-    filename=ROOT_FOLDER / "log.txt", mode="w", encoding="utf-8"
+    filename=ROOT_FOLDER / "log.txt",
+    mode="w" if multiprocessing.parent_process() is None else "a",
+    encoding="utf-8",
 )
 _file_handler.setLevel(logging.DEBUG)
 
@@ -53,29 +61,6 @@ logger = logging.getLogger(__name__)
 logger.info("Initialize log file")
 
 
-#####################
-# SQL CONFIGURATION #
-#####################
-
-# Load secrets YAML file
-try:
-    with open(ROOT_FOLDER / "secrets.yml", "r") as file:
-        _secrets = yaml.safe_load(file)
-except IOError:
-    raise IOError("secrets.yml does not exist, see README.md")
-
-# Create SQLAlchemy engine(s)
-SQL_ENGINE = sql.create_engine(
-    "mssql+pyodbc://@"
-    + _secrets["sql"]["server"]
-    + "/"
-    + _secrets["sql"]["database"]
-    + "?trusted_connection=yes"
-    + "&driver=ODBC Driver 18 for SQL Server"
-    + "&TrustServerCertificate=yes",
-    fast_executemany=True,
-)
-
 #########################
 # RUNTIME CONFIGURATION #
 #########################
@@ -101,6 +86,7 @@ COMMENTS = input_parser.comments
 CONTROLS = input_parser.controls
 MIGRATION_CONTROLS = input_parser.migration_controls
 LOAD_TO_DATABASE = input_parser.load_to_database
+QUERY_CACHE = input_parser.query_cache
 
 logger.info(
     f"Runtime configuration loaded: launch_year={LAUNCH_YEAR}, horizon_year={HORIZON_YEAR}"
@@ -110,12 +96,53 @@ if MIGRATION_CONTROLS is not None:
     logger.info("Migration controls loaded from configuration file")
 
 
+#####################
+# SQL CONFIGURATION #
+#####################
+
+# In offline mode query results are only read from the query cache
+# Such that no secrets or SQL engine are required
+if QUERY_CACHE["offline"]:
+    SQL_ENGINE = None
+    logger.info("Offline mode: SQL queries are read from the query cache only")
+else:
+    # Load secrets YAML file
+    try:
+        with open(ROOT_FOLDER / "secrets.yml", "r") as file:
+            _secrets = yaml.safe_load(file)
+    except IOError:
+        raise IOError("secrets.yml does not exist, see README.md")
+
+    # Create SQLAlchemy engine(s)
+    SQL_ENGINE = sql.create_engine(
+        "mssql+pyodbc://@"
+        + _secrets["sql"]["server"]
+        + "/"
+        + _secrets["sql"]["database"]
+        + "?trusted_connection=yes"
+        + "&driver=ODBC Driver 18 for SQL Server"
+        + "&TrustServerCertificate=yes",
+        fast_executemany=True,
+    )
+
+
 ##############################
 # UTILITY LISTS AND MAPPINGS #
 ##############################
 
 RANDOM_SEED = 42  # Seed for random number generation to ensure reproducibility
 
+# Number of ACS PUMS replicate weights (PWGTP1-PWGTP80)
+# Replicate 0 denotes the full sample person weight (PWGTP)
+PUMS_REPLICATES = 80
+
+# Results of SQL queries keyed by SQL file name and query parameters
+# Shared by all input modules (and threads) for the duration of a model run
+# Each query has its own lock so different queries can run concurrently
+_QUERY_CACHE = {}
+_QUERY_LOCKS = {}
+_QUERY_CACHE_LOCK = threading.Lock()
+
 
 #####################
 # UTILITY FUNCTIONS #
@@ -183,47 +210,160 @@ def _adjust_weights(x: list[float | int], w: list[float | int]) -> list[list]:
 
 
 def adjust_sum(
-    df: pd.DataFrame, cols: list[str], sum: float, option: str
-) -> pd.DataFrame:
+    df: pd.DataFrame | np.ndarray,
+    cols: list[str] | None,
+    sum: float,
+    option: str,
+) -> pd.DataFrame | np.ndarray:
     """Adjust row values for columns such that sum equals or does not exceed
     specified value. Use for positive values only.
 
+    Row sums are calculated once and rows are rescaled using broadcasting.
+
     Args:
-        df (pd.DataFrame): Input DataFrame
-        cols (list[str]): List of column names
+        df (pd.DataFrame | np.ndarray): Input DataFrame or 2-dimensional array
+            of shape (rows, columns)
+        cols (list[str] | None): List of column names, ignored if an array is
+            provided
         sum (float): Asserted value
         option (str): Set to 'equals' or 'exceeds'
 
     Returns:
-        pd.DataFrame: Returns adjusted input DataFrame columns
+        pd.DataFrame | np.ndarray: Returns adjusted input DataFrame columns,
+            or the adjusted array if an array is provided
     """
+    if sum <= 0:
+        raise ValueError("Parameter: 'sum': must be > 0")
+
+    values = df if isinstance(df, np.ndarray) else df[cols]
+
     # Check columns are integer or floating point data types
-    if sum > 0:
-        if all(x.kind in "if" for x in df[cols].dtypes.tolist()):
-            # Convert columns to float64 data type for added precision
-            # This minimizes floating point errors in scaling
-            df[cols] = df[cols].astype(np.float64)
-
-            if option == "equals":
-                return df[cols].apply(
-                    lambda x: x * (sum / x.sum()) if x.sum() > 0 else x, axis=1
-                )  # type: ignore
-            elif option == "exceeds":
-                return df[cols].apply(
-                    lambda x: x * (sum / x.sum()) if x.sum() > sum else x,
-                    axis=1,
-                )  # type: ignore
-            else:
-                raise ValueError(
-                    "Parameter 'option': must be one of 'equals' or 'exceeds'."
-                )
-        else:
-            raise ValueError("All columns must be integer or floating point.")
+    if isinstance(df, np.ndarray):
+        numeric = values.dtype.kind in "if"
     else:
-        raise ValueError("Parameter: 'sum': must be > 0")
+        numeric = all(x.kind in "if" for x in values.dtypes.tolist())
+    if not numeric:
+        raise ValueError("All columns must be integer or floating point.")
 
+    # Convert columns to float64 data type for added precision
+    # This minimizes floating point errors in scaling
+    values = np.asarray(values, dtype=np.float64)
+    row_sum = values.sum(axis=1, keepdims=True)
 
-def distribute_excess(df: pd.DataFrame, subset: str, total: str) -> pd.Series:
+    if option == "equals":
+        adjust = row_sum > 0
+    elif option == "exceeds":
+        adjust = row_sum > sum
+    else:
+        raise ValueError("Parameter 'option': must be one of 'equals' or 'exceeds'.")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(adjust, values * (sum / row_sum), values)
+
+    if isinstance(df, np.ndarray):
+        return values
+    else:
+        return pd.DataFrame(data=values, index=df.index, columns=cols)
+
+
+def distribute_excess_2d(
+    subset: np.ndarray, total: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Distribute excess numeric values using a water-filling solver.
+
+    Records where the subset exceeds the total are clamped to the total and
+    the excess is distributed to the remaining records in proportion to their
+    subset values, clamping any record that then exceeds its total, until no
+    excess remains. The final result of this process is the subset scaled by
+    a single factor (l) within each column and clamped to the total, where l
+    preserves the column sum. Instead of iterating, records are sorted by the
+    ratio of total to subset and l is found in one cumulative pass as the
+    first point where the next record in the sort no longer requires
+    clamping.
+
+    If the excess exceeds the total of the records able to receive it, every
+    receiving record is clamped to its total and the remaining excess is
+    dropped, as in the iterative approach.
+
+    Args:
+        subset (np.ndarray): Subset numeric values of shape (rows,) or
+            (rows, columns), where each column is distributed independently
+        total (np.ndarray): Total numeric values of shape (rows,), applied to
+            every column, or of shape (rows, columns)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The subset values with excess value
+            re-distributed and the number of clamp then re-distribute
+            iterations the iterative approach requires for each column
+    """
+    subset = np.asarray(subset, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)
+    values = subset.reshape(subset.shape[0], -1)
+    total = np.broadcast_to(total.reshape(total.shape[0], -1), values.shape)
+    n_rows, n_cols = values.shape
+
+    # Sort records by the ratio of total to subset, records with no subset
+    # Value are unable to receive excess and are sorted last
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(values > 0, total / values, np.inf)
+    order = np.argsort(ratio, axis=0, kind="stable")
+    ratio = np.take_along_axis(ratio, order, axis=0)
+    cum_total = np.cumsum(np.take_along_axis(total, order, axis=0), axis=0)
+    cum_subset = np.cumsum(np.take_along_axis(values, order, axis=0), axis=0)
+    cum_total = np.vstack([np.zeros((1, n_cols)), cum_total])
+    cum_subset = np.vstack([np.zeros((1, n_cols)), cum_subset])
+
+    # For each number of clamped records (k) the scaling factor (l) of the
+    # Remaining records preserving the column sum
+    column_sum = values.sum(axis=0)
+    remaining = column_sum - cum_subset
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = (column_sum - cum_total) / remaining
+
+    # Select the first k where the next record does not require clamping
+    # Once all records able to receive are clamped the total of the clamped
+    # Records must cover the column sum
+    next_ratio = np.vstack([ratio, np.full((1, n_cols), np.inf)])
+    k_range = np.arange(n_rows + 1)[:, np.newaxis]
+    receivers = (values > 0).sum(axis=0)
+    full = (receivers, np.arange(n_cols))
+    scale[full] = np.inf
+    valid = np.where(k_range < receivers, scale <= next_ratio, k_range == receivers)
+    valid[full] &= (cum_total[full] > column_sum) | np.isclose(
+        cum_total[full], column_sum
+    )
+    # Clamp every receiving record where no k preserves the column sum
+    scale = np.where(
+        valid.any(axis=0), scale[np.argmax(valid, axis=0), np.arange(n_cols)], np.inf
+    )
+
+    with np.errstate(invalid="ignore"):
+        result = np.where(values > 0, np.minimum(total, values * scale), 0.0)
+
+    # Count the clamp then re-distribute iterations of the iterative approach
+    # Each iteration clamps records with a ratio at or below the current
+    # Scaling factor and re-scales the remaining records, continuing while
+    # Re-scaling causes additional records to exceed their total
+    iterations = np.zeros(n_cols, dtype=int)
+    for col in range(n_cols):
+        current, clamped = 1.0, 0
+        while np.searchsorted(ratio[:, col], current, side="left") > clamped:
+            clamped = np.searchsorted(ratio[:, col], current, side="right")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                current = (column_sum[col] - cum_total[clamped, col]) / remaining[
+                    clamped, col
+                ]
+            iterations[col] += 1
+
+    return result.reshape(subset.shape), iterations
+
+
+def distribute_excess(
+    df: pd.DataFrame,
+    subset: str | list[str],
+    total: str,
+    by: str | list[str] | None = None,
+) -> pd.Series | pd.DataFrame:
     """Distribute excess numeric values.
 
     Distribute excess value from records where numeric value contained in a
@@ -231,50 +371,82 @@ def distribute_excess(df: pd.DataFrame, subset: str, total: str) -> pd.Series:
     the same input DataFrame.
 
     Excess value is distributed to records using the distribution of existing
-    numeric values in the column.
+    numeric values in the column. See distribute_excess_2d for the
+    water-filling solver used. If the excess exceeds the total of the records
+    able to receive it, those records are clamped to their total, the
+    remaining excess is dropped, and a warning is logged.
 
     Args:
         df (pd.DataFrame): Input DataFrame
-        subset (str): Column name containing subset of numeric value of
-            column identified as the total numerical value
+        subset (str | list[str]): Column name(s) containing subset of numeric
+            value of column identified as the total numerical value. If a
+            list is provided each column is distributed independently against
+            the same total in a single call
         total (str): Column name containing total numerical value
+        by (str | list[str] | None): Column name(s) defining groups of records
+            (e.g. year) within which excess value is distributed
+            independently. Defaults to None, distributing across all records
 
     Returns:
-        pd.Series: Records with excess value re-distributed
+        pd.Series | pd.DataFrame: Records with excess value re-distributed, a
+            DataFrame if a list of subset columns is provided
     """
-    df = df[[subset, total]].copy()
+    cols = subset if isinstance(subset, list) else [subset]
 
     # Check columns are integer or floating point data types
-    if df[subset].dtype.kind in "if" and df[total].dtype.kind in "if":
+    if all(x.kind in "if" for x in df[[*cols, total]].dtypes.tolist()):
         # Convert columns to float64 data type for added precision
         # This minimizes floating point errors in scaling
-        df[[subset, total]] = df[[subset, total]].astype(np.float64)
-
-        # Distribute excess numeric value from records where numeric values
-        # In the subset column exceed numeric values in the total column
-        # To records where the numeric value of the subset column
-        # Do not equal or exceed numeric values in the total column
-        # Using the distribution of subset column numeric values
-        excess = (
-            df[df[subset] > df[total]][subset].sum()
-            - df[df[subset] > df[total]][total].sum()
+        subset_values = df[cols].to_numpy(dtype=np.float64)
+        total_values = df[total].to_numpy(dtype=np.float64)
+
+        # Lay each group out as its own set of columns so all groups are
+        # Distributed in a single pass, padding groups with fewer records
+        # With zeros as records with no subset value never receive excess
+        if by is None:
+            group = np.zeros(len(df.index), dtype=int)
+        else:
+            group = df.groupby(by, sort=False).ngroup().to_numpy()
+        position = pd.Series(group).groupby(group).cumcount().to_numpy()
+        n_rows = position.max() + 1 if len(position) > 0 else 0
+        n_groups = group.max() + 1 if len(group) > 0 else 0
+
+        subset_3d = np.zeros((n_rows, n_groups, len(cols)))
+        subset_3d[position, group] = subset_values
+        total_2d = np.zeros((n_rows, n_groups))
+        total_2d[position, group] = total_values
+
+        values, iterations = distribute_excess_2d(
+            subset=subset_3d.reshape(n_rows, -1),
+            total=np.repeat(total_2d, len(cols), axis=1),
         )
-
-        while excess > 0:
-            df[subset] = np.where(df[subset] > df[total], df[total], df[subset])
-
-            condition = df[subset] < df[total]
-
-            df.loc[condition, subset] = df.loc[condition][subset] + (
-                excess * df.loc[condition][subset] / df.loc[condition][subset].sum()
+        values = values.reshape(n_rows, n_groups, len(cols))
+
+        # Warn of any excess dropped as the receiving records are clamped
+        dropped = subset_3d.sum(axis=0) - values.sum(axis=0)
+        for g, c in zip(*np.nonzero(~np.isclose(dropped, 0))):
+            where = ""
+            if by is not None:
+                row = df.iloc[np.flatnonzero(group == g)[0]]
+                where = " in " + ", ".join(
+                    f"{k}={row[k]}" for k in ([by] if isinstance(by, str) else by)
+                )
+            logger.warning(
+                f"Cannot Distribute: Excess of '{cols[c]}' over '{total}'{where} "
+                f"exceeds total of receiving records, dropped {dropped[g, c]:,.2f}"
             )
+        values = values[position, group]
 
-            excess = (
-                df[df[subset] > df[total]][subset].sum()
-                - df[df[subset] > df[total]][total].sum()
+        for col, n in zip(cols, iterations.reshape(n_groups, len(cols)).max(axis=0)):
+            logger.debug(
+                f"Distributed excess of '{col}' over '{total}' in a single pass "
+                f"replacing {n} iteration(s)"
             )
 
-        return df[subset]
+        if isinstance(subset, list):
+            return pd.DataFrame(data=values, index=df.index, columns=cols)
+        else:
+            return pd.Series(data=values[:, 0], index=df.index, name=subset)
 
     else:
         raise ValueError("All columns must be integer or floating point.")
@@ -386,13 +558,13 @@ def integerize_1d(
 
     # Override if control is zero
     if control == 0:
-        data.fill(0)
-        return data
+        return np.zeros(data.shape, dtype=int)
 
     # Override if control is not zero, but all input data is zero
     if control is not None and control != 0 and np.all(data == 0):
-        np.add.at(data, np.arange(control), 1)
-        return data
+        rounded_data = np.zeros(data.shape, dtype=int)
+        np.add.at(rounded_data, np.arange(control), 1)
+        return rounded_data
 
     # Scale data to match the control
     unrounded_data = data * control / np.sum(data)
@@ -455,11 +627,307 @@ def integerize_1d(
         return rounded_data.astype(int)
 
 
+def integerize_2d(
+    data: np.ndarray | pd.DataFrame,
+    control: np.ndarray | list | int | float | None = None,
+    methodology: str = "weighted_random",
+    generator: np.random.Generator | None = None,
+    legacy: bool = False,
+) -> np.ndarray:
+    """Safe rounding of the columns of 2-dimensional array-like structures.
+
+    Each column (e.g. a field or a replicate) is integerized independently in
+    a single vectorized call, following the same steps as integerize_1d. Data
+    is scaled to the control, every value is rounded up, and rounding error is
+    corrected using the chosen methodology. For the "largest", "smallest", and
+    "largest_difference" methodologies the results match integerize_1d. For
+    the "weighted_random" methodology, values to decrease are sampled without
+    replacement for all columns at once using the Gumbel top-k method, where
+    each value is given a key of log(weight) plus a standard Gumbel draw and
+    the values with the largest keys are chosen. This is equivalent to
+    sequential weighted sampling without replacement, but uses a different
+    random stream than integerize_1d.
+
+    Args:
+        data (np.ndarray | pd.DataFrame): A 2-dimensional structure of float
+            or integer values of shape (rows, columns)
+        control (np.ndarray | list | int | float | None): Optional control
+            values for each column, or a single control value for all columns,
+            to scale the input data such that the final sum of each column is
+            exactly the control value. If no value is provided, then the sum of
+            each column of the input data will be preserved
+        methodology (str): How to adjust for rounding error. Defaults to
+            "weighted_random". See integerize_1d for valid inputs
+        generator (np.random.Generator | None): A seeded random generator used to
+            select values to change. Required for the "weighted_random"
+            methodology
+        legacy (bool): If True, call integerize_1d on each column in turn
+            reproducing the random stream of per-column integerization.
+            Defaults to False
+
+    Returns:
+        np.ndarray: Integerized data preserving column sums or control values
+
+    Raises:
+        TypeError: If any of the input variables don't match the correct type
+        ValueError: If negative values are encountered in the input variables
+        ValueError: If no control value is provided and the input data columns
+            do not sum to integers
+    """
+    # Check rounding error methodology
+    allowed_methodology = [
+        "largest",
+        "smallest",
+        "largest_difference",
+        "weighted_random",
+    ]
+    if methodology not in allowed_methodology:
+        raise ValueError(
+            f"Input parameter 'methodology' must be one of {str(allowed_methodology)}"
+        )
+
+    # Check a random generator is passed if we are doing "weighted_random"
+    if methodology == "weighted_random" and type(generator) != np.random.Generator:
+        raise ValueError(
+            f"Input parameter 'generator' must be of type 'np.random.Generator' "
+            f"when the 'methodology' is '{methodology}', not {type(generator)}"
+        )
+
+    # Check class of input data. If not a np.ndarray, convert to one
+    if not isinstance(data, (np.ndarray, pd.DataFrame)):
+        raise TypeError(
+            f"Input parameter 'data' is of type {type(data)}, "
+            f"when it must be one of pd.DataFrame or np.ndarray"
+        )
+    data = np.array(data, dtype=np.float64)
+    if data.ndim != 2:
+        raise ValueError("Input parameter 'data' must be 2-dimensional")
+    n_rows, n_cols = data.shape
+
+    # Broadcast control values to each column
+    if control is not None:
+        control = np.broadcast_to(np.asarray(control, dtype=np.float64), (n_cols,))
+
+    # Reproduce per-column integerization if requested
+    if legacy:
+        result = np.zeros(data.shape, dtype=int)
+        for col in range(n_cols):
+            result[:, col] = integerize_1d(
+                data=data[:, col],
+                control=None if control is None else control[col],
+                methodology=methodology,
+                generator=generator,
+            )
+        return result
+
+    # Confirm no negative values are passed
+    if np.any(data < 0):
+        raise ValueError("Input parameter 'data' contains negative values")
+    if control is not None and np.any(control < 0):
+        raise ValueError(f"Input parameter 'control' is negative: {control}")
+
+    # If no control provided preserve current sums
+    if control is None:
+        control = data.sum(axis=0)
+
+    # Ensure controls are integers
+    if not np.allclose(control, np.round(control), rtol=1e-09, atol=0.0):
+        raise ValueError(f"Input parameter 'control' must be integer: {control}")
+    control = np.round(control).astype(int)
+
+    # Scale data to match the controls
+    # Columns with a zero control or all zero data are overridden below
+    column_sum = data.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unrounded_data = np.where(column_sum > 0, data * control / column_sum, 0.0)
+
+    # Round every value up
+    rounded_data = np.ceil(unrounded_data).astype(int)
+
+    # Get difference between controls and post-rounding sums
+    diff = rounded_data.sum(axis=0) - control
+    diff = np.where(column_sum > 0, diff, 0)
+
+    # Rank values within columns such that the first diff values are decreased
+    if diff.any():
+        rounding_difference = rounded_data - unrounded_data
+
+        # Decrease the n largest data points, ties to the last occurrence
+        if methodology == "largest":
+            key = -rounded_data[::-1]
+        # Decrease the n smallest non-zero data points, ties to the first occurrence
+        elif methodology == "smallest":
+            key = np.where(rounded_data > 0, rounded_data, np.inf)
+        # Decrease the n data points with the largest change after rounding
+        elif methodology == "largest_difference":
+            key = -rounding_difference[::-1]
+        # Decrease n random data points weighted on which had the largest change
+        # After rounding using Gumbel top-k sampling without replacement
+        elif methodology == "weighted_random":
+            gumbel = generator.gumbel(size=data.shape)
+            with np.errstate(divide="ignore"):
+                key = -(np.log(rounding_difference) + gumbel)
+
+        order = np.argsort(key, axis=0, kind="stable")
+        to_decrease = np.zeros(data.shape, dtype=bool)
+        np.put_along_axis(
+            to_decrease, order, np.arange(n_rows)[:, np.newaxis] < diff, axis=0
+        )
+
+        # Reversed keys rank the last occurrence of ties first
+        if methodology in ["largest", "largest_difference"]:
+            to_decrease = to_decrease[::-1]
+
+        rounded_data = rounded_data - to_decrease
+
+    # Override if control is zero
+    rounded_data[:, control == 0] = 0
+
+    # Override if control is not zero, but all input data is zero
+    for col in np.flatnonzero((control != 0) & (column_sum == 0)):
+        np.add.at(rounded_data[:, col], np.arange(control[col]), 1)
+
+    # Double check no negatives are present
+    if np.any(rounded_data < 0):
+        raise ValueError("Negative values encountered in integerized data")
+
+    return rounded_data
+
+
+def _level_receivers(capacity: np.ndarray, k: int, passes: int) -> np.ndarray:
+    """Give one unit to each of the k receivers with the largest capacity for
+    a number of passes, with ties going to the first record.
+
+    The result is computed in closed form rather than pass by pass. Each
+    receiver receives its capacity above a level (L) up to one unit per pass,
+    where L is the lowest level such that no more than k units per pass are
+    received. The remaining units of the passes go to the first records left
+    at the level able to receive another unit.
+
+    Args:
+        capacity (np.ndarray): Integer capacity of each receiver to receive,
+            where at least k receivers have a positive capacity entering every
+            pass
+        k (int): Number of receivers receiving a unit in each pass
+        passes (int): Number of passes
+
+    Returns:
+        np.ndarray: Capacity of each receiver remaining after the passes
+    """
+    units = k * passes
+
+    # Find the lowest level such that the units received do not exceed the
+    # Units of the passes using a binary search over integer levels
+    low, high = int(capacity.min()) - passes - 1, int(capacity.max())
+    while high - low > 1:
+        mid = (low + high) // 2
+        if np.clip(capacity - mid, 0, passes).sum() <= units:
+            high = mid
+        else:
+            low = mid
+    received = np.clip(capacity - high, 0, passes)
+
+    # Give the remaining units to the first records left at the level
+    remainder = units - int(received.sum())
+    level = np.flatnonzero((capacity - received == high) & (received < passes))
+    received[level[:remainder]] += 1
+
+    return capacity - received
+
+
+def reallocate_integers_1d(subset: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """Adjust a 1-dimensional subset array such that it does not exceed an
+    array identified as the total numerical value. Use for positive integer
+    values only.
+
+    Records where the subset exceeds the total (givers) give their excess to
+    records where the total exceeds a non-zero subset (receivers) over a
+    series of passes. In each pass one unit is moved from each of the first
+    n givers to each of the n receivers with the largest difference between
+    total and subset, where n is the smaller of the number of givers and
+    receivers, with ties going to the first record. Rather than moving units
+    pass by pass, passes are solved in closed form in phases between the
+    passes where a giver has given all its excess or n changes.
+
+    Args:
+        subset (np.ndarray): Integer subset of numeric value of the array
+            identified as the total numerical value
+        total (np.ndarray): Integer total numerical value
+
+    Returns:
+        np.ndarray: Subset with excess value re-allocated maintaining integer
+            data type and sum
+
+    Raises:
+        ValueError: If the arrays are not of integer type or contain negative
+            values
+        ValueError: If receivers are unable to absorb the excess
+    """
+    subset = np.asarray(subset)
+    total = np.asarray(total)
+
+    # Check arrays are integer data types
+    if subset.dtype.kind != "i" or total.dtype.kind != "i":
+        raise ValueError("All columns must be integer type.")
+    # Ensure arrays contain positive values only
+    elif (subset < 0).any() or (total < 0).any():
+        raise ValueError("Columns must contain only positive values.")
+
+    # Records able to give and their excess over the total
+    give = np.flatnonzero(subset > total)
+    excess = (subset - total)[give]
+    if excess.sum() == 0:
+        return subset.copy()
+
+    # Records able to receive and their capacity to receive
+    receive = np.flatnonzero((total > subset) & (subset > 0))
+    capacity = (total - subset)[receive]
+    if capacity.sum() < excess.sum():
+        raise ValueError("Cannot Reallocate: Inconsistent Rates or Controls")
+
+    while excess.sum() > 0:
+        givers = np.flatnonzero(excess > 0)
+        receivers = np.flatnonzero(capacity > 0)
+        n = min(givers.size, receivers.size)
+
+        # Every giver gives a unit in each pass until the first giver has
+        # Given all its excess, while at least n receivers are able to receive
+        if givers.size <= receivers.size:
+            passes = int(excess[givers].min())
+            low, high = 1, passes
+            while low < high:
+                mid = (low + high + 1) // 2
+                remaining = _level_receivers(capacity[receivers], k=n, passes=mid - 1)
+                if (remaining > 0).sum() >= n:
+                    low = mid
+                else:
+                    high = mid - 1
+            passes = low
+            excess[givers] -= passes
+
+        # Every receiver receives a unit in each pass from the first givers
+        # Until a receiver is full or one of the first givers is empty
+        else:
+            givers = givers[:n]
+            passes = int(min(excess[givers].min(), capacity[receivers].min()))
+            excess[givers] -= passes
+
+        capacity[receivers] = _level_receivers(capacity[receivers], k=n, passes=passes)
+
+    result = subset.copy()
+    result[give] = total[give]
+    result[receive] = total[receive] - capacity
+
+    return result
+
+
 def reallocate_integers(df: pd.DataFrame, subset: str, total: str) -> pd.Series:
     """Adjust subset column such that the columns does not exceed a column
     identified as the total numerical value. Use for positive integer values
     only.
 
+    See reallocate_integers_1d for the reallocation methodology.
+
     Args:
         df (pd.DataFrame): Input DataFrame
         subset (str): Column name containing subset of numeric value of
@@ -470,74 +938,254 @@ def reallocate_integers(df: pd.DataFrame, subset: str, total: str) -> pd.Series:
         pd.Series: Records with excess value re-allocated maintaining
             integer data type
     """
-    df = df[[subset, total]].copy()
+    return pd.Series(
+        data=reallocate_integers_1d(
+            subset=df[subset].to_numpy(), total=df[total].to_numpy()
+        ),
+        index=df.index,
+        name=subset,
+    )
+
+
+def reallocate_group_integers_2d(values: np.ndarray, total: np.ndarray) -> np.ndarray:
+    """Adjust a 2-dimensional group of subset columns such that the row-wise
+    values of the columns equal the array identified as the total numerical
+    value. Use for positive integer values only.
+
+    Reallocation is done in a few batched passes rather than one unit at a
+    time. Rows where the columns sum to more than the total (givers) remove
+    their surplus one unit at a time from their largest column, ties going to
+    the first column, which is computed for all givers at once by leveling the
+    largest columns of each row. The removed units are then passed in row
+    order to rows where the columns sum to less than the total (receivers),
+    each receiver taking units into the columns they were removed from such
+    that the column sums are preserved. Any surplus not taken by a receiver is
+    removed and any deficit not covered by a giver is added to the largest
+    column of the receiving row.
+
+    Args:
+        values (np.ndarray): Integer subset columns of shape (rows, columns)
+        total (np.ndarray): Integer row totals of shape (rows,)
+
+    Returns:
+        np.ndarray: Subset columns with row sums matching the total,
+            maintaining integer data type
+
+    Raises:
+        ValueError: If the arrays are not of integer type or contain negative
+            values
+    """
+    values = np.asarray(values)
+    total = np.asarray(total)
 
-    # Check columns are integer data types
-    if df[subset].dtype.kind != "i" or df[total].dtype.kind != "i":
+    # Check arrays are integer data types
+    if values.dtype.kind != "i" or total.dtype.kind != "i":
         raise ValueError("All columns must be integer type.")
-    # Ensure columns contain positive values only
-    elif (df[subset] < 0).any() or (df[total] < 0).any():
+    # Ensure arrays contain positive values only
+    elif (values < 0).any() or (total < 0).any():
         raise ValueError("Columns must contain only positive values.")
-    else:
-        # Set condition requiring reallocation
-        condition = (df[subset] > df[total]).any()
-
-        # While condition requiring reallocation exists
-        while condition:
-            # Create Balancer DataFrame
-            # Identifying records able to give and records able to receive
-            # Including largest differences between total and subset for receivers
-            balancer = pd.DataFrame(
-                data={
-                    "give": df[total] < df[subset],
-                    "receive": (df[total] > df[subset]) & (df[subset] > 0),
-                    "diff": df[total] - df[subset],
-                },
-                index=df.index,
-            )
 
-            # Number of rows able to be adjusted
-            rows = min(balancer["give"].sum(), balancer["receive"].sum())
-
-            # Adjustable rows should be > 0 unless mismatch between subset and total
-            if rows > 0:
-                # Subtract one from records able to give units
-                # Add one to records able to receive units
-                # Addition prioritizes records with largest differences
-                size = len(balancer.index)
-                minuses = [-1 if i < rows else 0 for i in range(size)]
-                pluses = [1 if i < rows else 0 for i in range(size)]
-
-                balancer = (
-                    balancer.sort_values(by="give", ascending=False)
-                    .assign(subtract=minuses)  # type: ignore
-                    .sort_values(by=["receive", "diff"], ascending=False)
-                    .assign(add=pluses)  # type: ignore
-                )
+    result = values.copy()
+    n_cols = values.shape[1]
+    surplus = values.sum(axis=1) - total
+
+    # Remove the surplus of each giving row from its largest columns
+    # Sort columns within rows descending keeping column order within ties
+    # Then find the number of largest columns (n) that are leveled to
+    # Absorb the surplus and the level (q) they are reduced to
+    givers = np.flatnonzero(surplus > 0)
+    if givers.size > 0:
+        giving = values[givers]
+        order = np.argsort(-giving, axis=1, kind="stable")
+        ranked = np.take_along_axis(giving, order, axis=1)
+        cum_ranked = np.cumsum(ranked, axis=1)
+        next_ranked = np.append(ranked[:, 1:], np.zeros((givers.size, 1), int), axis=1)
+        absorbed = cum_ranked - np.arange(1, n_cols + 1) * next_ranked
+        n = np.argmax(absorbed >= surplus[givers, np.newaxis], axis=1) + 1
+        q, e = np.divmod(cum_ranked[np.arange(givers.size), n - 1] - surplus[givers], n)
+
+        # The n largest columns are set to q + 1 excepting the first n - e
+        # Columns, which are set to q
+        leveled = np.zeros(giving.shape, dtype=bool)
+        np.put_along_axis(leveled, order, np.arange(n_cols) < n[:, np.newaxis], axis=1)
+        position = np.cumsum(leveled, axis=1)
+        result[givers] = np.where(
+            leveled,
+            np.where(
+                position <= (n - e)[:, np.newaxis],
+                q[:, np.newaxis],
+                q[:, np.newaxis] + 1,
+            ),
+            giving,
+        )
+
+    # Pass removed units to receiving rows in row order
+    # Receivers take units into the columns they were removed from
+    receivers = np.flatnonzero(surplus < 0)
+    if receivers.size > 0:
+        removed = (values[givers] - result[givers]).reshape(-1)
+        labels = np.repeat(np.tile(np.arange(n_cols), givers.size), removed)
+        receiving = np.repeat(receivers, -surplus[receivers])
+        paired = min(labels.size, receiving.size)
+        np.add.at(result, (receiving[:paired], labels[:paired]), 1)
+
+        # Add any deficit not covered by givers to the largest column
+        rows, deficit = np.unique(receiving[paired:], return_counts=True)
+        if rows.size > 0:
+            result[rows, np.argmax(result[rows], axis=1)] += deficit
 
-                df = df.join(balancer[["subtract", "add"]])
-                df[subset] = df[subset] + df["subtract"] + df["add"]
-                df = df.drop(labels=["subtract", "add"], axis=1)
+    return result
 
-                # Reset condition requiring reallocation
-                condition = (df[subset] > df[total]).any()
 
-            else:
-                raise ValueError("Cannot Reallocate: Inconsistent Rates or Controls")
+def integerize_capped_2d(
+    values: np.ndarray,
+    cap: np.ndarray,
+    generator: np.random.Generator,
+) -> np.ndarray:
+    """Integerize columns preserving their sums such that no value exceeds an
+    integer cap within its row.
 
-        # Return adjusted subset column
-        return df[subset]
+    Excess over the cap is first distributed to records below the cap using
+    distribute_excess_2d. Values are then split into their integer and
+    fractional parts, and only the fractional parts are integerized using
+    integerize_2d. As a fractional part is rounded to at most one, and only
+    values below the (integer) cap have a fractional part, rounding can never
+    breach the cap.
+
+    Args:
+        values (np.ndarray): Non-negative subset columns of shape
+            (rows, columns) with integer column sums
+        cap (np.ndarray): Integer row caps of shape (rows,)
+        generator (np.random.Generator): A seeded random generator used by
+            integerize_2d to select values to change
+
+    Returns:
+        np.ndarray: Integer subset columns not exceeding the cap
+
+    Raises:
+        ValueError: If the column sums exceed the total of the caps
+    """
+    cap = np.asarray(cap)[:, np.newaxis]
+    distributed = distribute_excess_2d(subset=values, total=cap[:, 0])[0]
+    if not np.allclose(distributed.sum(axis=0), np.sum(values, axis=0)):
+        raise ValueError("Cannot Distribute: Excess exceeds total of receiving records")
+    values = np.minimum(distributed, cap)
+
+    # Snap values within floating point error of an integer
+    whole = np.floor(values + 1e-9)
+    fraction = np.clip(values - whole, 0, None)
+
+    # Integerize the fractional parts to the remaining column sums
+    return whole.astype(int) + integerize_2d(
+        data=fraction, control=fraction.sum(axis=0), generator=generator
+    )
+
+
+def integerize_group_2d(
+    values: np.ndarray,
+    total: np.ndarray,
+    generator: np.random.Generator,
+    max_iterations: int = 100,
+    tolerance: float = 1e-6,
+) -> np.ndarray:
+    """Controlled rounding of a group of columns to integer row totals.
+
+    The group is first fit to the row totals while keeping the column sums
+    using iterative proportional fitting (raking), alternately scaling rows to
+    the row totals and columns to their original sums (rescaled to the sum of
+    the row totals) until the column sums converge. Rows without any values
+    but a non-zero total are seeded with the distribution of the column sums.
+    Each row is then integerized to its total in a single call to
+    integerize_2d, such that the integer row sums match the totals exactly.
+
+    The fitted column sums are rounded to integer column totals summing to the
+    row totals, giving the largest fractional parts the remaining units, and
+    the column totals are then restored. Units are moved within rows from
+    columns above their total to columns below their total, keeping the row
+    sums, prioritizing the rows where the column giving a unit was rounded up
+    the most and the column receiving a unit was rounded down the most.
+
+    Args:
+        values (np.ndarray): Non-negative subset columns of shape
+            (rows, columns)
+        total (np.ndarray): Integer row totals of shape (rows,)
+        generator (np.random.Generator): A seeded random generator used by
+            integerize_2d to select values to change
+        max_iterations (int): Maximum number of raking iterations. Defaults to
+            100
+        tolerance (float): Maximum absolute difference between the fitted and
+            original column sums at which raking stops. Defaults to 1e-6
+
+    Returns:
+        np.ndarray: Integer subset columns with row sums matching the total
+            and column sums matching the rounded fitted column sums
+    """
+    values = np.array(values, dtype=np.float64)
+    total = np.asarray(total)
+
+    # Column targets use the distribution of the column sums
+    column_sum = values.sum(axis=0)
+    if column_sum.sum() > 0:
+        shares = column_sum / column_sum.sum()
+    else:
+        shares = np.full(values.shape[1], 1 / values.shape[1])
+    target = shares * total.sum()
+
+    # Seed rows without values that must match a non-zero total
+    values[(values.sum(axis=1) == 0) & (total > 0)] = shares
+
+    # Alternately fit rows and columns finishing with the rows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max_iterations):
+            row_sum = values.sum(axis=1)
+            values *= np.where(row_sum > 0, total / row_sum, 0)[:, np.newaxis]
+
+            column_sum = values.sum(axis=0)
+            if np.abs(column_sum - target).max() <= tolerance:
+                break
+            values *= np.where(column_sum > 0, target / column_sum, 1)
+
+        row_sum = values.sum(axis=1)
+        values *= np.where(row_sum > 0, total / row_sum, 0)[:, np.newaxis]
+
+    # Integerize each row to its total
+    result = integerize_2d(data=values.T, control=total, generator=generator).T
+
+    # Round the fitted column sums to integer column totals summing to the
+    # Row totals, snapping values within floating point error of an integer
+    column_total = np.floor(target + 1e-9)
+    remaining = int(total.sum() - column_total.sum())
+    column_total[np.argsort(-(target - column_total), kind="stable")[:remaining]] += 1
+
+    # Move units within rows from the column most above its total to the
+    # Column most below its total until all column totals are matched
+    residual = result.sum(axis=0) - column_total.astype(int)
+    while (residual != 0).any():
+        give, receive = int(np.argmax(residual)), int(np.argmin(residual))
+        rows = np.flatnonzero(result[:, give] > 0)
+        priority = (result[rows, give] - values[rows, give]) + (
+            values[rows, receive] - result[rows, receive]
+        )
+        n = min(residual[give], -residual[receive], rows.size)
+        rows = rows[np.argsort(-priority, kind="stable")[:n]]
+        result[rows, give] -= 1
+        result[rows, receive] += 1
+        residual[give] -= n
+        residual[receive] += n
+
+    return result
 
 
 def reallocate_group_integers(
     df: pd.DataFrame, cols: list[str], total: str
-) -> pd.Series:
+) -> pd.DataFrame:
     """Adjust group of subset columns such that the row-wise values of the
     columns equal the value of the column identified as the total numerical
     value. Use for positive integer values only.
 
     The sum across all rows within each subset column is preserved excepting
-    for cases where preservation is inconsistent with the provided total.
+    for cases where preservation is inconsistent with the provided total. See
+    reallocate_group_integers_2d for the reallocation methodology.
 
     Args:
         df (pd.DataFrame): Input DataFrame
@@ -545,89 +1193,112 @@ def reallocate_group_integers(
         total (str): Column name containing total numerical value
 
     Returns:
-        pd.Series: Records with excess value re-allocated maintaining
+        pd.DataFrame: Records with excess value re-allocated maintaining
             integer data type
     """
-    df = df[[*cols, total]].copy()
+    return pd.DataFrame(
+        data=reallocate_group_integers_2d(
+            values=df[cols].to_numpy(), total=df[total].to_numpy()
+        ),
+        index=df.index,
+        columns=cols,
+    )
 
-    if any(x.kind != "i" for x in df.dtypes.tolist()):
-        raise ValueError("All columns must be integer type.")
-    # Ensure columns contain positive values only
-    elif (df < 0).any().any():
-        raise ValueError("Columns must contain only positive values.")
-    else:
-        # Set condition requiring reallocation
-        condition = (df[cols].sum(axis=1) != df[total]).any()
-        while condition:
-            balancer = pd.DataFrame(
-                data={
-                    "give": df[cols].sum(axis=1) > df[total],
-                    "receive": df[cols].sum(axis=1) < df[total],
-                    "col_adj": df[cols].idxmax(axis=1),
-                },
-                index=df.index,
-            )
 
-            # Adjustable rows should be > 0 unless mismatch between subset columns and total
-            if min(balancer["give"].sum(), balancer["receive"].sum()) > 0:
-                # Subtract one from records able to give units
-                # Add one to records able to receive units
-                size = len(balancer.index)
-                rows = min(balancer["give"].sum(), balancer["receive"].sum())
-                minuses = [-1 if i < rows else 0 for i in range(size)]
-                pluses = [1 if i < rows else 0 for i in range(size)]
-            # If only records are able to give then subtract only
-            elif balancer["give"].sum() > balancer["receive"].sum():
-                # Subtract one from records able to give units
-                # No units are added as no records are able to receive
-                size = len(balancer.index)
-                rows = balancer["give"].sum()
-                minuses = [-1 if i < rows else 0 for i in range(size)]
-                pluses = [0 for i in range(size)]
-            # If only records are able to receive then add only
-            elif balancer["give"].sum() < balancer["receive"].sum():
-                # Subtract one from records able to give units
-                # No units are added as no records are able to receive
-                size = len(balancer.index)
-                rows = balancer["receive"].sum()
-                minuses = [0 for i in range(size)]
-                pluses = [1 if i < rows else 0 for i in range(size)]
-
-            balancer = (
-                balancer.sort_values(by="give", ascending=False)
-                .assign(subtract=minuses)  # type: ignore
-                .sort_values(by="receive", ascending=False)
-                .assign(add=pluses)  # type: ignore
-            )
+def resolve_geography(
+    df: pd.DataFrame,
+    index: list[str],
+    value: str,
+    hierarchy: list[str],
+    overrides: dict[str, dict[str, list[str]]] | None = None,
+    impute: str | None = None,
+    location: str = "location",
+) -> pd.DataFrame:
+    """Resolve values using the first valid geography of a geography hierarchy.
 
-            # If there are adjustable rows then
-            # Subtraction taken from field with highest value within giving rows
-            # While also ensuring balance of +/- within fields
-            if min(balancer["give"].sum(), balancer["receive"].sum()) > 0:
-                balancer.loc[balancer["add"] > 0, "col_adj"] = balancer[
-                    balancer["subtract"] < 0
-                ]["col_adj"].tolist()
-            # Otherwise add/subtract to/from highest value within rows
-            else:
-                pass
+    Data broken down by location is reshaped such that each geography is a
+    column using set_index/unstack. For each record the value is taken from
+    the first geography of the hierarchy where the value is non-null and
+    greater than zero. Records can follow their own hierarchy through
+    overrides (e.g. NHPI rates use State > National). If no geography of the
+    hierarchy is valid, the optional imputed value of the last geography of
+    the record's hierarchy is used.
 
-            for col in cols:
-                balancer[col] = np.where(
-                    balancer["col_adj"] == col,
-                    balancer["add"] + balancer["subtract"],
-                    0,
-                )
+    Args:
+        df (pd.DataFrame): Long data with one record per index and location
+        index (list[str]): Columns uniquely identifying a record within a
+            location
+        value (str): Column containing the values to resolve
+        hierarchy (list[str]): Ordered geographies, from most to least
+            preferred
+        overrides (dict[str, dict[str, list[str]]] | None): Ordered
+            geographies for records where an index column matches a value,
+            e.g. {"race": {"NHPI": ["California", "United States"]}}.
+            Defaults to None
+        impute (str | None): Optional column containing imputed values used
+            from the last geography of the hierarchy when no geography is
+            valid. Defaults to None
+        location (str): Column containing the geography. Defaults to
+            "location"
+
+    Returns:
+        pd.DataFrame: The index columns, the resolved value, and a "source"
+            column with the geography used ("<geography> (imputed)" for
+            imputed values and None if unresolved)
+
+    Raises:
+        ValueError: If a record appears more than once within a location
+    """
+    overrides = {} if overrides is None else overrides
+    cols = [value] if impute is None else [value, impute]
+
+    # Reshape such that each geography is a column
+    wide = df.set_index([*index, location])[cols].unstack(location)
+
+    # All geographies used by the hierarchy and its overrides
+    geographies = list(
+        dict.fromkeys(
+            hierarchy + [g for v in overrides.values() for h in v.values() for g in h]
+        )
+    )
+    values = wide[value].reindex(columns=geographies).to_numpy(dtype=np.float64)
 
-            df = df.join(balancer[cols], rsuffix="_adj")
-            for col in cols:
-                df[col] = df[col] + df[col + "_adj"]
-                df = df.drop(labels=col + "_adj", axis=1)
+    # Priority of each geography within the hierarchy of each record
+    def _priority(order: list[str]) -> list[float]:
+        return [order.index(g) if g in order else np.inf for g in geographies]
 
-            # Reset condition requiring reallocation
-            condition = (df[cols].sum(axis=1) != df[total]).any()
+    priority = np.tile(
+        np.array(_priority(hierarchy), dtype=np.float64), (len(wide.index), 1)
+    )
+    last = np.full(len(wide.index), geographies.index(hierarchy[-1]))
+    for col, mapping in overrides.items():
+        for key, order in mapping.items():
+            rows = wide.index.get_level_values(col) == key
+            priority[rows] = _priority(order)
+            last[rows] = geographies.index(order[-1])
+
+    # Take the valid geography with the highest priority
+    priority = np.where(values > 0, priority, np.inf)
+    choice = priority.argmin(axis=1)
+    resolved = np.isfinite(priority.min(axis=1))
+    rows = np.arange(len(wide.index))
+
+    result = np.where(resolved, values[rows, choice], np.nan)
+    source = np.where(resolved, np.array(geographies, dtype=object)[choice], None)
+
+    # Use imputed values of the last geography for unresolved records
+    if impute is not None:
+        imputed = wide[impute].reindex(columns=geographies).to_numpy(np.float64)
+        imputed = imputed[rows, last]
+        use_imputed = ~resolved & ~np.isnan(imputed)
+        result = np.where(resolved, result, imputed)
+        source = np.where(
+            use_imputed,
+            np.array(geographies, dtype=object)[last] + " (imputed)",
+            source,
+        )
 
-        # Return adjusted subset columns
-        return df[cols]  # type: ignore
+    return wide.index.to_frame(index=False).assign(**{value: result, "source": source})
 
 
 def weighted_moving_average(
@@ -777,3 +1448,261 @@ def read_sql_query_fallback(max_lookback: int = 1, **kwargs: dict) -> pd.DataFra
     raise ValueError(
         f"Data not found for year={original_year} within max_lookback={max_lookback}."
     )
+
+
+def query_fingerprint(
+    file_name: str, params: dict | None = None, max_lookback: int | None = None
+) -> str:
+    """Get a hash of the contents of a SQL file and its query parameters.
+
+    Args:
+        file_name (str): Path of the SQL file relative to the SQL folder
+        params (dict | None): Query parameters. Defaults to None
+        max_lookback (int | None): Maximum number of years to look back if
+            the query is run using read_sql_query_fallback. Defaults to None
+
+    Returns:
+        str: SHA-256 hex digest of the SQL file contents and query parameters
+    """
+    params = {} if params is None else params
+    with open(SQL_FOLDER / file_name, "rb") as file:
+        digest = hashlib.sha256(file.read())
+    digest.update(
+        json.dumps(
+            {"params": params, "max_lookback": max_lookback},
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    )
+
+    return digest.hexdigest()
+
+
+def _query_cache_path(
+    file_name: str, params: dict, max_lookback: int | None
+) -> pathlib.Path:
+    """Get the query cache file of a SQL file and its query parameters.
+
+    The cache file name contains a hash of the SQL file contents and the query
+    parameters, such that editing the SQL file or changing the parameters
+    invalidates the cached results.
+    """
+    digest = query_fingerprint(file_name, params, max_lookback)
+
+    return QUERY_CACHE["folder"] / (
+        pathlib.Path(file_name).stem + "_" + digest[:16] + ".parquet"
+    )
+
+
+def _run_sql_file(
+    file_name: str, params: dict, max_lookback: int | None
+) -> pd.DataFrame:
+    """Run a SQL file on the server, optionally using read_sql_query_fallback."""
+    with SQL_ENGINE.connect() as connection:
+        with open(SQL_FOLDER / file_name, "r") as file:
+            query = sql.text(file.read())
+
+        if max_lookback is None:
+            return pd.read_sql_query(query, connection, params=params)
+        else:
+            return read_sql_query_fallback(
+                max_lookback=max_lookback,
+                sql=query,
+                con=connection,
+                params=dict(params),
+            )
+
+
+def _load_sql_file(
+    file_name: str, params: dict, max_lookback: int | None
+) -> pd.DataFrame:
+    """Load the results of a SQL file from the query cache or the server."""
+    if not QUERY_CACHE["enabled"]:
+        return _run_sql_file(file_name, params, max_lookback)
+
+    fp = _query_cache_path(file_name, params, max_lookback)
+    if fp.exists() and not QUERY_CACHE["refresh"]:
+        age = (time.time() - fp.stat().st_mtime) / 86400
+        if QUERY_CACHE["max_age"] is None or age <= QUERY_CACHE["max_age"]:
+            logger.info(f"Loaded {file_name} for {params} from query cache")
+            return pd.read_parquet(fp)
+        elif QUERY_CACHE["offline"]:
+            logger.warning(
+                f"Cached results of {file_name} for {params} are {age:.1f} days old, "
+                f"exceeding max_age, but are used in offline mode"
+            )
+            return pd.read_parquet(fp)
+
+    if QUERY_CACHE["offline"]:
+        raise FileNotFoundError(
+            f"Results of {file_name} for {params} not in query cache: {fp}"
+        )
+
+    df = _run_sql_file(file_name, params, max_lookback)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(fp, index=False)
+    logger.info(f"Stored {file_name} for {params} in query cache")
+
+    return df
+
+
+def read_sql_file(
+    file_name: str, params: dict | None = None, max_lookback: int | None = None
+) -> pd.DataFrame:
+    """Read the results of a SQL file, running each query once per model run.
+
+    Results are memoized by the SQL file name and query parameters, such that
+    input modules requesting the same query (e.g. the ACS PUMS persons for an
+    increment year) only run it on the server once. Each call returns a copy
+    of the memoized results so callers are free to modify them. Calls are
+    thread-safe, with concurrent requests for the same query waiting on a
+    single run of the query.
+
+    If the query cache is enabled in the configuration file, results are also
+    stored as Parquet files in the query cache folder and re-used across model
+    runs until the SQL file or its parameters change, the cached results
+    exceed the max_age, or a refresh is requested. In offline mode results are
+    only read from the query cache and the server is never accessed.
+
+    Args:
+        file_name (str): Path of the SQL file relative to the SQL folder
+        params (dict | None): Query parameters. Defaults to None
+        max_lookback (int | None): If provided, the query is run using
+            read_sql_query_fallback with the given maximum number of years to
+            look back. Defaults to None
+
+    Returns:
+        pd.DataFrame: Result of the SQL query
+
+    Raises:
+        FileNotFoundError: If in offline mode and the results are not in the
+            query cache
+    """
+    params = {} if params is None else params
+    key = (file_name, tuple(sorted(params.items())), max_lookback)
+
+    with _QUERY_CACHE_LOCK:
+        lock = _QUERY_LOCKS.setdefault(key, threading.Lock())
+
+    with lock:
+        if key not in _QUERY_CACHE:
+            _QUERY_CACHE[key] = _load_sql_file(file_name, params, max_lookback)
+        else:
+            logger.debug(f"Using memoized results of {file_name} for {params}")
+
+        return _QUERY_CACHE[key].copy()
+
+
+def clear_query_cache(disk: bool = False) -> int:
+    """Remove all memoized SQL query results.
+
+    Args:
+        disk (bool): If True, also delete all results stored in the query cache
+            folder. Defaults to False
+
+    Returns:
+        int: Number of query cache files deleted
+    """
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE.clear()
+        _QUERY_LOCKS.clear()
+
+        deleted = 0
+        if disk and QUERY_CACHE["folder"].exists():
+            for fp in QUERY_CACHE["folder"].glob("*.parquet"):
+                fp.unlink()
+                deleted += 1
+
+    return deleted
+
+
+def read_pums_sql(file_name: str, yr: int, replicates: bool = False) -> pd.DataFrame:
+    """Read a 5-year ACS PUMS extract (pums_persons.sql or pums_migrants.sql).
+
+    Args:
+        file_name (str): ACS PUMS SQL file
+        yr (int): Increment year
+        replicates (bool): If True, aggregate each of the 80 ACS PUMS replicate
+            weights in addition to the person weight in the same query,
+            returned with a replicate column (0 being the person weight).
+            Defaults to False
+
+    Returns:
+        pd.DataFrame: ACS PUMS extract broken down by race, sex, and single
+            year of age, with a replicate column if replicates are requested
+    """
+    df = read_sql_file(file_name, params={"yr": yr, "replicates": int(replicates)})
+    if not replicates:
+        df = df.drop(columns="replicate")
+
+    return df
+
+
+def expand_replicates(df: pd.DataFrame) -> pd.DataFrame:
+    """Repeat a DataFrame for the person weight and each ACS PUMS replicate
+    weight.
+
+    Args:
+        df (pd.DataFrame): Data without a replicate column
+
+    Returns:
+        pd.DataFrame: Data with a leading replicate column (0 being the person
+            weight), repeated for each replicate
+    """
+    return df.merge(
+        pd.DataFrame({"replicate": range(PUMS_REPLICATES + 1)}), how="cross"
+    )[["replicate", *df.columns]]
+
+
+def read_pums_persons(years: list[int], replicates: bool = False) -> pd.DataFrame:
+    """Read the 5-year ACS PUMS persons for multiple increment years.
+
+    Args:
+        years (list[int]): Increment years
+        replicates (bool): If True, include the 80 ACS PUMS replicate weights
+            (see read_pums_sql). Defaults to False
+
+    Returns:
+        pd.DataFrame: ACS PUMS persons broken down by race, sex, and single
+            year of age with an additional year column, and a replicate column
+            if replicates are requested
+
+    Raises:
+        ValueError: If an increment year is not in the 5-year ACS PUMS
+    """
+    dfs = []
+    for yr in years:
+        df = read_pums_sql("pums_persons.sql", yr=yr, replicates=replicates)
+        if len(df.index) == 0:
+            raise ValueError(str(yr) + ": not in ACS 5-year PUMS")
+        dfs.append(df.assign(year=yr))
+
+    return pd.concat(dfs, ignore_index=True)
+
+
+def get_controls(years: list[int], category: str) -> pd.DataFrame:
+    """Get SANDAG Estimates control totals for multiple increment years.
+
+    Control totals are taken from the vintage associated with the launch year.
+
+    Args:
+        years (list[int]): Increment years
+        category (str): Control category, one of 'population' or 'households'
+
+    Returns:
+        pd.DataFrame: Control totals indexed by year with a column for each
+            control, where controls not provided are NaN
+
+    Raises:
+        ValueError: If controls are not provided for an increment year
+    """
+    vintage = CONTROLS[str(LAUNCH_YEAR)]
+    missing = [yr for yr in years if str(yr) not in vintage]
+    if len(missing) > 0:
+        raise ValueError(f"No controls provided for increment year(s): {missing}")
+
+    return pd.DataFrame.from_dict(
+        {yr: vintage[str(yr)][category] for yr in years},
+        orient="index",
+        dtype=np.float64,
+    ).rename_axis("year")
@@ -8,6 +8,9 @@ The purpose of this script is to count migration in and out of San Diego County
 */
 SET NOCOUNT ON;
 
+-- Aggregate the 80 ACS PUMS replicate weights in addition to the person weight (1/0)
+DECLARE @replicates bit = :replicates;
+
 -- Select ACS PUMS data based on input survey year this is done to lower original runtime of approximately 20 minutes to 1-4 minutes
 DECLARE @year integer = :yr;
 DECLARE @pums_qry nvarchar(max) =
@@ -26,6 +29,17 @@ DECLARE @pums_qry nvarchar(max) =
          WHEN @year = 2022 THEN 'SELECT [ST], NULL AS [PUMA00], [PUMA10], [PUMA20], [AGEP], [SEX], [HISP], [RAC1P], [MIL], [MIG], [MIGSP], NULL AS [MIGPUMA00], [MIGPUMA10], [MIGPUMA20], [PWGTP] FROM [acs].[pums].[5y_2018_2022_persons] WHERE [MIL] != ''1'' AND [MIG] IN (''2'', ''3'')'
     ELSE NULL END;
 
+-- Add the 80 ACS PUMS replicate weights (PWGTP1-PWGTP80) to the query if requested
+-- Otherwise the replicate weights are NULL and only the person weight is aggregated
+DECLARE @replicate_cols nvarchar(max) = (
+    SELECT STRING_AGG(
+        CASE WHEN @replicates = 1 THEN CONCAT('[PWGTP', [n], ']') ELSE CONCAT('NULL AS [PWGTP', [n], ']') END,
+        ', '
+    ) WITHIN GROUP (ORDER BY [n])
+    FROM (SELECT TOP 80 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS [n] FROM [sys].[all_objects]) AS [tt]
+);
+SET @pums_qry = REPLACE(@pums_qry, '[PWGTP] FROM', '[PWGTP], ' + @replicate_cols + ' FROM');
+
 -- Declare temporary table to insert results of ACS PUMS query
 DROP TABLE IF EXISTS [#pums_tbl]
 CREATE TABLE [#pums_tbl] (
@@ -43,7 +57,17 @@ CREATE TABLE [#pums_tbl] (
     [MIGPUMA00] varchar(5) NULL,
     [MIGPUMA10] varchar(5) NULL,
     [MIGPUMA20] varchar(5) NULL,
-    [PWGTP] float NOT NULL
+    [PWGTP] float NOT NULL,
+    [PWGTP1] float NULL, [PWGTP2] float NULL, [PWGTP3] float NULL, [PWGTP4] float NULL, [PWGTP5] float NULL, [PWGTP6] float NULL, [PWGTP7] float NULL, [PWGTP8] float NULL,
+    [PWGTP9] float NULL, [PWGTP10] float NULL, [PWGTP11] float NULL, [PWGTP12] float NULL, [PWGTP13] float NULL, [PWGTP14] float NULL, [PWGTP15] float NULL, [PWGTP16] float NULL,
+    [PWGTP17] float NULL, [PWGTP18] float NULL, [PWGTP19] float NULL, [PWGTP20] float NULL, [PWGTP21] float NULL, [PWGTP22] float NULL, [PWGTP23] float NULL, [PWGTP24] float NULL,
+    [PWGTP25] float NULL, [PWGTP26] float NULL, [PWGTP27] float NULL, [PWGTP28] float NULL, [PWGTP29] float NULL, [PWGTP30] float NULL, [PWGTP31] float NULL, [PWGTP32] float NULL,
+    [PWGTP33] float NULL, [PWGTP34] float NULL, [PWGTP35] float NULL, [PWGTP36] float NULL, [PWGTP37] float NULL, [PWGTP38] float NULL, [PWGTP39] float NULL, [PWGTP40] float NULL,
+    [PWGTP41] float NULL, [PWGTP42] float NULL, [PWGTP43] float NULL, [PWGTP44] float NULL, [PWGTP45] float NULL, [PWGTP46] float NULL, [PWGTP47] float NULL, [PWGTP48] float NULL,
+    [PWGTP49] float NULL, [PWGTP50] float NULL, [PWGTP51] float NULL, [PWGTP52] float NULL, [PWGTP53] float NULL, [PWGTP54] float NULL, [PWGTP55] float NULL, [PWGTP56] float NULL,
+    [PWGTP57] float NULL, [PWGTP58] float NULL, [PWGTP59] float NULL, [PWGTP60] float NULL, [PWGTP61] float NULL, [PWGTP62] float NULL, [PWGTP63] float NULL, [PWGTP64] float NULL,
+    [PWGTP65] float NULL, [PWGTP66] float NULL, [PWGTP67] float NULL, [PWGTP68] float NULL, [PWGTP69] float NULL, [PWGTP70] float NULL, [PWGTP71] float NULL, [PWGTP72] float NULL,
+    [PWGTP73] float NULL, [PWGTP74] float NULL, [PWGTP75] float NULL, [PWGTP76] float NULL, [PWGTP77] float NULL, [PWGTP78] float NULL, [PWGTP79] float NULL, [PWGTP80] float NULL
 );
 
 -- Insert ACS PUMS query results into temporary table
@@ -64,6 +88,7 @@ with [transformed_tbl] AS (
              WHEN [RAC1P] = '7' THEN 'Native Hawaiian or Other Pacific Islander alone'
              WHEN [RAC1P] = '9' THEN 'Two or More Races'
              ELSE NULL END AS [race],
+        [weights].[replicate],  -- Person weight (0) or replicate weight (1-80)
 
         -- Identify in-migrants into San Diego County       
         CASE  
@@ -81,13 +106,13 @@ with [transformed_tbl] AS (
                             AND [ST] = '06' AND [PUMA10] IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2012_households_sd]) -- Currently reside in San Diego County, defined by state being California and PUMA of residence being in a list of San Diego County PUMAs
                         )
                 )
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
              -- The ACS 5-years from 2012-2016 to 2017-2021 solely use Census 2010 geographies
              WHEN @year BETWEEN 2016 AND 2021
                 AND ([MIGSP] NOT IN ('006', '6') OR ([MIGSP] IN ('006', '6') AND [MIGPUMA10] != '07300')) -- Migrated from outside California, or from within California but from outside San Diego County (note the code for SD County changed to 07300 in Census 2010)
                 AND [ST] = '06' AND [PUMA10] IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2012_households_sd]) -- Currently reside in San Diego County, defined by state being California and PUMA of residence being in a list of San Diego County PUMAs
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
             -- The ACS 5-years from 2008-2012 to 2011-2015 mix both Census 2000 and 2010 geographies
              WHEN @year BETWEEN 2012 AND 2015
@@ -103,13 +128,13 @@ with [transformed_tbl] AS (
                             AND [ST] = '06' AND [PUMA00] IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2010_households_sd]) -- Currently reside in San Diego County, defined by state being California and PUMA of residence being in a list of San Diego County PUMAs
                         )
                 )
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
             -- The ACS 5-years from 2006-2010 to 2007-2011 solely use Census 2000 geographies
              WHEN @year BETWEEN 2010 AND 2011
                 AND ([MIGSP] NOT IN ('006', '6') OR ([MIGSP] IN ('006', '6') AND [MIGPUMA00] != '081')) -- Migrated from outside California, or from within California but from outside San Diego County (note the code for SD County was 81 in Census 2000)
                 AND [ST] = '06' AND [PUMA00] IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2010_households_sd]) -- Currently reside in San Diego County, defined by state being California and PUMA of residence being in a list of San Diego County PUMAs
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
              ELSE 0 END AS [in],  -- Create table, called in, for count of in-migrants to San Diego County
 
         -- Identify out-migrants from San Diego County
@@ -128,13 +153,13 @@ with [transformed_tbl] AS (
                             AND ([ST] != '06' OR ([ST] = '06' AND [PUMA10] NOT IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2012_households_sd]))) -- Currently reside not in San Diego County, defined by state being not California and PUMA of residence being not in a list of San Diego County PUMAs
                         )
                 )
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
              -- The ACS 5-years from 2012-2016 to 2017-2021 solely use Census 2010 geographies
              WHEN @year BETWEEN 2016 AND 2021
                 AND [MIGSP] IN ('006', '6') AND [MIGPUMA10] = '07300' -- Migrated from San Diego County, defined by migration state being California and migration PUMA being the code for San Diego County (07300)
                 AND ([ST] != '06' OR ([ST] = '06' AND [PUMA10] IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2012_households_sd]))) -- Currently reside not in San Diego County, defined by state being not California and PUMA of residence being not in a list of San Diego County PUMAs
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
             -- The ACS 5-years from 2008-2012 to 2011-2015 mix both Census 2000 and 2010 geographies
              WHEN @year BETWEEN 2012 AND 2015
@@ -150,23 +175,38 @@ with [transformed_tbl] AS (
                             AND ([ST] != '06' OR ([ST] = '06' AND [PUMA00] NOT IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2010_households_sd]))) -- Currently reside not in San Diego County, defined by state being not California and PUMA of residence being not in a list of San Diego County PUMAs
                         )
                 )
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
 
             -- The ACS 5-years from 2006-2010 to 2007-2011 solely uses Census 2000 geographies
              WHEN @year BETWEEN 2010 AND 2011
                 AND [MIGSP] IN ('006', '6') AND [MIGPUMA00] = '081' -- Migrated from San Diego County,  defined by migration state being California and migration PUMA being the code for San Diego County (081)
                 AND ([ST] != '06' OR ([ST] = '06' AND [PUMA00] NOT IN (SELECT DISTINCT PUMA FROM [acs].[pums].[vi_1y_2010_households_sd]))) -- Currently reside not in San Diego County,  defined by state being not California and PUMA of residence being not in a list of San Diego County PUMAs
-                THEN [PWGTP] -- Count persons using the person weight variable
+                THEN [weight] -- Count persons using the person or replicate weight variable
              ELSE 0 END AS [out] -- Create table, called out, for count of out-migrants from San Diego County
     FROM [#pums_tbl]
+    -- One record per person for the person weight (replicate 0) and each replicate weight
+    CROSS APPLY (
+        VALUES
+            (0, [PWGTP]), (1, [PWGTP1]), (2, [PWGTP2]), (3, [PWGTP3]), (4, [PWGTP4]), (5, [PWGTP5]), (6, [PWGTP6]), (7, [PWGTP7]), (8, [PWGTP8]),
+            (9, [PWGTP9]), (10, [PWGTP10]), (11, [PWGTP11]), (12, [PWGTP12]), (13, [PWGTP13]), (14, [PWGTP14]), (15, [PWGTP15]), (16, [PWGTP16]), (17, [PWGTP17]),
+            (18, [PWGTP18]), (19, [PWGTP19]), (20, [PWGTP20]), (21, [PWGTP21]), (22, [PWGTP22]), (23, [PWGTP23]), (24, [PWGTP24]), (25, [PWGTP25]), (26, [PWGTP26]),
+            (27, [PWGTP27]), (28, [PWGTP28]), (29, [PWGTP29]), (30, [PWGTP30]), (31, [PWGTP31]), (32, [PWGTP32]), (33, [PWGTP33]), (34, [PWGTP34]), (35, [PWGTP35]),
+            (36, [PWGTP36]), (37, [PWGTP37]), (38, [PWGTP38]), (39, [PWGTP39]), (40, [PWGTP40]), (41, [PWGTP41]), (42, [PWGTP42]), (43, [PWGTP43]), (44, [PWGTP44]),
+            (45, [PWGTP45]), (46, [PWGTP46]), (47, [PWGTP47]), (48, [PWGTP48]), (49, [PWGTP49]), (50, [PWGTP50]), (51, [PWGTP51]), (52, [PWGTP52]), (53, [PWGTP53]),
+            (54, [PWGTP54]), (55, [PWGTP55]), (56, [PWGTP56]), (57, [PWGTP57]), (58, [PWGTP58]), (59, [PWGTP59]), (60, [PWGTP60]), (61, [PWGTP61]), (62, [PWGTP62]),
+            (63, [PWGTP63]), (64, [PWGTP64]), (65, [PWGTP65]), (66, [PWGTP66]), (67, [PWGTP67]), (68, [PWGTP68]), (69, [PWGTP69]), (70, [PWGTP70]), (71, [PWGTP71]),
+            (72, [PWGTP72]), (73, [PWGTP73]), (74, [PWGTP74]), (75, [PWGTP75]), (76, [PWGTP76]), (77, [PWGTP77]), (78, [PWGTP78]), (79, [PWGTP79]), (80, [PWGTP80])
+    ) AS [weights] ([replicate], [weight])
+    WHERE [weights].[weight] IS NOT NULL
 )
 -- Output final result set of in/out migrants by age/sex/ethnicity
 SELECT
     [age],
     [sex],
     [race],
+    [replicate],
     SUM([in]) AS [in],
     SUM([out]) AS [out]
 FROM [transformed_tbl]  
-GROUP BY [age], [sex], [race]
-ORDER BY [age], [sex], [race]
\ No newline at end of file
+GROUP BY [replicate], [age], [sex], [race]
+ORDER BY [replicate], [age], [sex], [race]
\ No newline at end of file
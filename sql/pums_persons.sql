@@ -2,7 +2,10 @@
 -- Household characteristics assigned to head of household record
 SET NOCOUNT ON;
 
--- Create shell table of required race, sex, and age variables with necessary categories: Age: 0-99; Sex: F, M; Race: 7 Options
+-- Aggregate the 80 ACS PUMS replicate weights in addition to the person weight (1/0)
+DECLARE @replicates bit = :replicates;
+
+-- Create shell table of required race, sex, age, and replicate variables with necessary categories: Age: 0-99; Sex: F, M; Race: 7 Options; Replicate: 0 (person weight) and 1-80 if requested
 DROP TABLE IF EXISTS [#tt_shell];
 WITH [age] AS (
     SELECT 0 AS [age]  -- Begin with zero
@@ -23,12 +26,18 @@ WITH [age] AS (
           ('Native Hawaiian or Other Pacific Islander alone'),
           ('Two or More Races')
     ) AS [tt] ([race])
+),
+[replicate] AS (
+    SELECT 0 AS [replicate]  -- Person weight
+        UNION ALL
+    SELECT [replicate] + 1 FROM [replicate] WHERE @replicates = 1 AND [replicate] < 80  -- Add each replicate weight up to 80
 )
-SELECT [age], [sex], [race]
+SELECT [age], [sex], [race], [replicate]
 INTO [#tt_shell]
 FROM [age]
 CROSS JOIN [sex]
 CROSS JOIN [race]
+CROSS JOIN [replicate]
 OPTION (MAXRECURSION 100);  -- Stop at 99
 
 
@@ -50,6 +59,17 @@ DECLARE @pums_qry nvarchar(max) =
 		 WHEN @year = 2022 THEN 'SELECT [SERIALNO], [ST], [AGEP], [SEX], [HISP], [RAC1P], [MIL], [RELSHIPP], NULL AS [RELP], [SPORDER], [ESR], [PWGTP] FROM [acs].[pums].[vi_5y_2018_2022_persons_sd]'
 	ELSE NULL END;
 
+-- Add the 80 ACS PUMS replicate weights (PWGTP1-PWGTP80) to the query if requested
+-- Otherwise the replicate weights are NULL and only the person weight is aggregated
+DECLARE @replicate_cols nvarchar(max) = (
+    SELECT STRING_AGG(
+        CASE WHEN @replicates = 1 THEN CONCAT('[PWGTP', [n], ']') ELSE CONCAT('NULL AS [PWGTP', [n], ']') END,
+        ', '
+    ) WITHIN GROUP (ORDER BY [n])
+    FROM (SELECT TOP 80 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS [n] FROM [sys].[all_objects]) AS [tt]
+);
+SET @pums_qry = REPLACE(@pums_qry, '[PWGTP] FROM', '[PWGTP], ' + @replicate_cols + ' FROM');
+
 -- Declare temporary table to receive results of ACS PUMS query (@pums_qry)
 DROP TABLE IF EXISTS #pums_tbl
 CREATE TABLE #pums_tbl (
@@ -64,7 +84,17 @@ CREATE TABLE #pums_tbl (
     [RELP] varchar(2) NULL,  
     [SPORDER] float NOT NULL,
     [ESR] varchar(1) NULL,
-    [PWGTP] float NOT NULL
+    [PWGTP] float NOT NULL,
+    [PWGTP1] float NULL, [PWGTP2] float NULL, [PWGTP3] float NULL, [PWGTP4] float NULL, [PWGTP5] float NULL, [PWGTP6] float NULL, [PWGTP7] float NULL, [PWGTP8] float NULL,
+    [PWGTP9] float NULL, [PWGTP10] float NULL, [PWGTP11] float NULL, [PWGTP12] float NULL, [PWGTP13] float NULL, [PWGTP14] float NULL, [PWGTP15] float NULL, [PWGTP16] float NULL,
+    [PWGTP17] float NULL, [PWGTP18] float NULL, [PWGTP19] float NULL, [PWGTP20] float NULL, [PWGTP21] float NULL, [PWGTP22] float NULL, [PWGTP23] float NULL, [PWGTP24] float NULL,
+    [PWGTP25] float NULL, [PWGTP26] float NULL, [PWGTP27] float NULL, [PWGTP28] float NULL, [PWGTP29] float NULL, [PWGTP30] float NULL, [PWGTP31] float NULL, [PWGTP32] float NULL,
+    [PWGTP33] float NULL, [PWGTP34] float NULL, [PWGTP35] float NULL, [PWGTP36] float NULL, [PWGTP37] float NULL, [PWGTP38] float NULL, [PWGTP39] float NULL, [PWGTP40] float NULL,
+    [PWGTP41] float NULL, [PWGTP42] float NULL, [PWGTP43] float NULL, [PWGTP44] float NULL, [PWGTP45] float NULL, [PWGTP46] float NULL, [PWGTP47] float NULL, [PWGTP48] float NULL,
+    [PWGTP49] float NULL, [PWGTP50] float NULL, [PWGTP51] float NULL, [PWGTP52] float NULL, [PWGTP53] float NULL, [PWGTP54] float NULL, [PWGTP55] float NULL, [PWGTP56] float NULL,
+    [PWGTP57] float NULL, [PWGTP58] float NULL, [PWGTP59] float NULL, [PWGTP60] float NULL, [PWGTP61] float NULL, [PWGTP62] float NULL, [PWGTP63] float NULL, [PWGTP64] float NULL,
+    [PWGTP65] float NULL, [PWGTP66] float NULL, [PWGTP67] float NULL, [PWGTP68] float NULL, [PWGTP69] float NULL, [PWGTP70] float NULL, [PWGTP71] float NULL, [PWGTP72] float NULL,
+    [PWGTP73] float NULL, [PWGTP74] float NULL, [PWGTP75] float NULL, [PWGTP76] float NULL, [PWGTP77] float NULL, [PWGTP78] float NULL, [PWGTP79] float NULL, [PWGTP80] float NULL
 );
 
 -- Insert ACS PUMS query results into table
@@ -94,8 +124,23 @@ WITH [persons] AS (
              ELSE 0 END AS [gq],
         [SPORDER],
         [ESR],
-        [PWGTP]
+        [weights].[replicate],
+        [weights].[weight]
     FROM #pums_tbl
+    -- One record per person for the person weight (replicate 0) and each replicate weight
+    CROSS APPLY (
+        VALUES
+            (0, [PWGTP]), (1, [PWGTP1]), (2, [PWGTP2]), (3, [PWGTP3]), (4, [PWGTP4]), (5, [PWGTP5]), (6, [PWGTP6]), (7, [PWGTP7]), (8, [PWGTP8]),
+            (9, [PWGTP9]), (10, [PWGTP10]), (11, [PWGTP11]), (12, [PWGTP12]), (13, [PWGTP13]), (14, [PWGTP14]), (15, [PWGTP15]), (16, [PWGTP16]), (17, [PWGTP17]),
+            (18, [PWGTP18]), (19, [PWGTP19]), (20, [PWGTP20]), (21, [PWGTP21]), (22, [PWGTP22]), (23, [PWGTP23]), (24, [PWGTP24]), (25, [PWGTP25]), (26, [PWGTP26]),
+            (27, [PWGTP27]), (28, [PWGTP28]), (29, [PWGTP29]), (30, [PWGTP30]), (31, [PWGTP31]), (32, [PWGTP32]), (33, [PWGTP33]), (34, [PWGTP34]), (35, [PWGTP35]),
+            (36, [PWGTP36]), (37, [PWGTP37]), (38, [PWGTP38]), (39, [PWGTP39]), (40, [PWGTP40]), (41, [PWGTP41]), (42, [PWGTP42]), (43, [PWGTP43]), (44, [PWGTP44]),
+            (45, [PWGTP45]), (46, [PWGTP46]), (47, [PWGTP47]), (48, [PWGTP48]), (49, [PWGTP49]), (50, [PWGTP50]), (51, [PWGTP51]), (52, [PWGTP52]), (53, [PWGTP53]),
+            (54, [PWGTP54]), (55, [PWGTP55]), (56, [PWGTP56]), (57, [PWGTP57]), (58, [PWGTP58]), (59, [PWGTP59]), (60, [PWGTP60]), (61, [PWGTP61]), (62, [PWGTP62]),
+            (63, [PWGTP63]), (64, [PWGTP64]), (65, [PWGTP65]), (66, [PWGTP66]), (67, [PWGTP67]), (68, [PWGTP68]), (69, [PWGTP69]), (70, [PWGTP70]), (71, [PWGTP71]),
+            (72, [PWGTP72]), (73, [PWGTP73]), (74, [PWGTP74]), (75, [PWGTP75]), (76, [PWGTP76]), (77, [PWGTP77]), (78, [PWGTP78]), (79, [PWGTP79]), (80, [PWGTP80])
+    ) AS [weights] ([replicate], [weight])
+    WHERE [weights].[weight] IS NOT NULL
 ),
 -- Aggregate persons data to household level to get household size, number of workers, presence of children, presence of seniors
 [hh_info] AS (
@@ -103,30 +148,31 @@ WITH [persons] AS (
         [SERIALNO],
         COUNT([SERIALNO]) AS [size],
         SUM(CASE WHEN [ESR] IN (1,2,4,5) THEN 1 ELSE 0 END) AS [workers],  -- Exclude unemployed (3) or not in labor force (6)
-        MAX(CASE WHEN [AGE] < 18 THEN 1 ELSE 0 END) AS [children],
-        MAX(CASE WHEN [AGE] >= 65 THEN 1 ELSE 0 END) AS [seniors]
-    FROM [persons]
+        MAX(CASE WHEN [AGEP] < 18 THEN 1 ELSE 0 END) AS [children],
+        MAX(CASE WHEN [AGEP] >= 65 THEN 1 ELSE 0 END) AS [seniors]
+    FROM #pums_tbl  -- One record per person
     GROUP BY [SERIALNO]
 )
 SELECT
     [#tt_shell].[age],
     [#tt_shell].[sex],
     [#tt_shell].[race],
-    ISNULL(SUM([PWGTP]), 0) AS [pop],  -- Total population
-    SUM(CASE WHEN [MIL] = '1' THEN [PWGTP] ELSE 0 END) AS [pop_mil],  -- Active-duty military 
-    SUM(CASE WHEN [gq] = 1 THEN [PWGTP] ELSE 0 END) AS [pop_gq],  -- Group quarters population 
-    SUM(CASE WHEN [gq] = 0 THEN [PWGTP] ELSE 0 END) AS [pop_hh],  -- Household population 
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 THEN [PWGTP] ELSE 0 END) AS [pop_hh_head],  -- Head of household population
-    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [ESR] IN (1,2,3,4,5) THEN [PWGTP] ELSE 0 END) AS [hh_head_lf],  -- Head of household in labor force population
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] = 1 THEN [PWGTP] ELSE 0 END) AS [size1],  -- Household size one
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] = 2 THEN [PWGTP] ELSE 0 END) AS [size2],  -- Household size two
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] >= 3 THEN [PWGTP] ELSE 0 END) AS [size3],  -- Household size three+
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 0 THEN [PWGTP] ELSE 0 END) AS [workers0],  -- Household workers 0
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 1 THEN [PWGTP] ELSE 0 END) AS [workers1],  -- Household workers 1
-	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 2 THEN [PWGTP] ELSE 0 END) AS [workers2],  -- Household workers 2
-    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] >= 3 THEN [PWGTP] ELSE 0 END) AS [workers3],  -- Household workers 3+
-    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [children] = 1  THEN [PWGTP] ELSE 0 END) AS [child1],  -- Household children 1+
-    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [seniors] = 1  THEN [PWGTP] ELSE 0 END) AS [senior1]  -- Household seniors 1+
+    [#tt_shell].[replicate],  -- Person weight (0) or replicate weight (1-80)
+    ISNULL(SUM([weight]), 0) AS [pop],  -- Total population
+    SUM(CASE WHEN [MIL] = '1' THEN [weight] ELSE 0 END) AS [pop_mil],  -- Active-duty military 
+    SUM(CASE WHEN [gq] = 1 THEN [weight] ELSE 0 END) AS [pop_gq],  -- Group quarters population 
+    SUM(CASE WHEN [gq] = 0 THEN [weight] ELSE 0 END) AS [pop_hh],  -- Household population 
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 THEN [weight] ELSE 0 END) AS [pop_hh_head],  -- Head of household population
+    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [ESR] IN (1,2,3,4,5) THEN [weight] ELSE 0 END) AS [hh_head_lf],  -- Head of household in labor force population
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] = 1 THEN [weight] ELSE 0 END) AS [size1],  -- Household size one
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] = 2 THEN [weight] ELSE 0 END) AS [size2],  -- Household size two
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [size] >= 3 THEN [weight] ELSE 0 END) AS [size3],  -- Household size three+
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 0 THEN [weight] ELSE 0 END) AS [workers0],  -- Household workers 0
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 1 THEN [weight] ELSE 0 END) AS [workers1],  -- Household workers 1
+	SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] = 2 THEN [weight] ELSE 0 END) AS [workers2],  -- Household workers 2
+    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [workers] >= 3 THEN [weight] ELSE 0 END) AS [workers3],  -- Household workers 3+
+    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [children] = 1  THEN [weight] ELSE 0 END) AS [child1],  -- Household children 1+
+    SUM(CASE WHEN [gq] = 0 AND [SPORDER] = 1 AND [seniors] = 1  THEN [weight] ELSE 0 END) AS [senior1]  -- Household seniors 1+
 FROM [persons]
 INNER JOIN [hh_info]
     ON [persons].[serialno] = [hh_info].[serialno]
@@ -134,5 +180,6 @@ RIGHT OUTER JOIN [#tt_shell]
     ON [persons].[age] = [#tt_shell].[age]
     AND [persons].[sex] = [#tt_shell].[sex]
     AND [persons].[race] = [#tt_shell].[race]
-GROUP BY [#tt_shell].[age], [#tt_shell].[sex], [#tt_shell].[race]
-ORDER BY [#tt_shell].[age], [#tt_shell].[sex], [#tt_shell].[race]
\ No newline at end of file
+    AND [persons].[replicate] = [#tt_shell].[replicate]
+GROUP BY [#tt_shell].[replicate], [#tt_shell].[age], [#tt_shell].[sex], [#tt_shell].[race]
+ORDER BY [#tt_shell].[replicate], [#tt_shell].[age], [#tt_shell].[sex], [#tt_shell].[race]
\ No newline at end of file